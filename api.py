@@ -0,0 +1,156 @@
+# HTTP routes with the case data for analysts, answered by the dashboard's own query engine (query.py):
+#
+#   GET <prefix>api/cases?region=NCR&region=CAR&years=2016-2018&group_by=region,year&format=csv
+#
+#   region, island  names to keep (repeat the parameter or separate with commas), all when left out
+#   years           'first-last' or a single year, all when left out
+#   group_by        any of region, island, year, month (comma separated), nothing gives one row with the totals
+#   format          json (default): {"version", "columns", "data"}, pd.DataFrame(body['data'], columns=body['columns'])
+#                   csv: header + one line per row, arrow: Arrow IPC stream (pyarrow.ipc.open_stream)
+#
+#   GET <prefix>api/cases/dimensions  the regions (with their island), islands and years to ask for
+#
+# Results over CHUNK_ROWS rows are streamed a chunk at a time (and go out uncompressed, see HttpCache); smaller ones
+# are sent in one piece. The ETag is the data version + query, so repeat requests get an empty 304.
+import csv
+import io
+import json
+
+import flask
+
+from data_version import mapping_hash
+from query import GROUPS, QueryError, signature
+
+CHUNK_ROWS = 10000
+FORMATS = {
+    'json': 'application/json',
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+
+def values_list(name):
+    # repeated and/or comma separated query parameter, None when it isn't there
+    values = [value.strip() for raw in flask.request.args.getlist(name) for value in raw.split(',')]
+    values = [value for value in values if value]
+    return values or None
+
+
+def year_range(raw):
+    if raw is None:
+        return None
+    first, _, last = raw.partition('-')
+    try:
+        return int(first), int(last or first)
+    except ValueError:
+        raise QueryError(f"years: {raw!r} (e.g. 2016-2018 or 2017)") from None
+
+
+def parse_query(cube):
+    # request arguments -> query() keyword arguments, QueryError for anything the data doesn't have
+    regions, islands = values_list('region'), values_list('island')
+    unknown = sorted(set(regions or ()) - set(cube.region_pos)) + sorted(set(islands or ()) - set(cube.islands))
+    if unknown:
+        raise QueryError(f"unknown region/island: {', '.join(unknown)} (see api/cases/dimensions)")
+    return dict(regions=regions, islands=islands, years=year_range(flask.request.args.get('years')),
+                group_by=tuple(group.lower() for group in values_list('group_by') or ()))
+
+
+def chunks(result):
+    for start in range(0, max(len(result), 1), CHUNK_ROWS):
+        yield [result.column(name)[start:start + CHUNK_ROWS] for name in result.names]
+
+
+def rows(columns):
+    return list(zip(*(column.tolist() for column in columns)))
+
+
+def json_body(result, version):
+    yield json.dumps({'version': version, 'columns': result.names})[:-1] + ', "data": ['
+    for i, columns in enumerate(chunks(result)):
+        chunk = json.dumps(rows(columns))[1:-1]
+        if chunk:
+            yield (', ' if i else '') + chunk
+    yield ']}'
+
+
+def csv_body(result, version):
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(result.names)
+    for columns in chunks(result):
+        writer.writerows(rows(columns))
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+
+
+def arrow_body(result, version):
+    import pyarrow as pa
+
+    sink = io.BytesIO()
+    schema = None
+    for columns in chunks(result):
+        batch = pa.record_batch([pa.array(column.tolist() if column.dtype == object else column)
+                                 for column in columns], names=result.names)
+        if schema is None:
+            schema = batch.schema.with_metadata({'version': version})
+            writer = pa.ipc.new_stream(sink, schema)
+        writer.write_batch(batch)
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    writer.close()
+    yield sink.getvalue()
+
+
+BODIES = {'json': json_body, 'csv': csv_body, 'arrow': arrow_body}
+
+
+def error(message, status=400):
+    return flask.Response(json.dumps({'error': message}), status=status, mimetype='application/json')
+
+
+class CaseApi:
+    # engine: query.QueryEngine (the one the callbacks use)
+    def __init__(self, engine):
+        self.engine = engine
+
+    def install(self, server, prefix='/'):
+        server.add_url_rule(prefix + 'api/cases', 'api_cases', self.cases)
+        server.add_url_rule(prefix + 'api/cases/dimensions', 'api_case_dimensions', self.dimensions)
+
+    def cases(self):
+        output = flask.request.args.get('format', 'json').lower()
+        if output not in BODIES:
+            return error(f"format: {output!r} (one of {', '.join(BODIES)})")
+        version = self.engine.version()
+        try:
+            query = parse_query(self.engine.cube())
+            result = self.engine.query(**query)
+        except QueryError as e:
+            return error(str(e))
+
+        etag = mapping_hash({'version': version, 'format': output, 'query': signature(**query)})
+        if flask.request.if_none_match.contains(etag):
+            response = flask.Response(status=304)
+        else:
+            # (werkzeug's make_conditional would read a streamed body to set its length)
+            body = BODIES[output](result, version)
+            if len(result) <= CHUNK_ROWS:
+                body = b''.join(part.encode() if isinstance(part, str) else part for part in body)
+            response = flask.Response(body, mimetype=FORMATS[output])
+        response.headers['X-Data-Version'] = version
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response
+
+    def dimensions(self):
+        cube = self.engine.cube()
+        return flask.jsonify({
+            'version': self.engine.version(),
+            'regions': [{'region': region, 'island': island} for region, island in zip(cube.regions, cube.islands)],
+            'islands': sorted(set(cube.islands)),
+            'years': [int(cube.first_year), int(cube.last_year)],
+            'group_by': list(GROUPS),
+        })
@@ -1,380 +1,192 @@
-from dash import Dash, html, dash_table, dcc, Output, Input, State
+from startup import PROFILING, lazy_import, phase, report  # first, so --profile-startup can time the imports below
+import functools
+import os
+from datetime import datetime, timezone
+import flask
+import dash
+from dash import Dash, DiskcacheManager, html, dash_table, dcc, Output, Input, State, ClientsideFunction, Patch, no_update
+from dash.exceptions import PreventUpdate
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import dash_bootstrap_components as dbc
 import numpy as np
-import geopandas as gpd
-
-# Load data
-df = pd.read_csv("Data/df_improved.csv")
-hospitals_and_clinics = pd.read_csv("Data/hospitals_and_clinics.csv")
-hospitals_per_island = pd.read_csv("Data/hospitals_per_island.csv")
-total_cases_and_deaths_with_region = gpd.read_file("Data/total_cases_and_deaths_with_region/total_cases_and_deaths_with_region.shp")
-total_cases_and_deaths_with_region['geometry'] = total_cases_and_deaths_with_region['geometry'].simplify(tolerance=0.01, preserve_topology=True)  # Simplify geometry for faster loading
-total_cases_and_deaths_with_region.set_crs(epsg=4326, inplace=True)
-
-# Define initial line graph
-total_per_year = df.groupby('Date')[['Dengue_Cases', 'Dengue_Deaths']].sum().reset_index()
-total_per_year_graph = px.line(
-    total_per_year,
-    x='Date',
-    y=['Dengue_Cases', 'Dengue_Deaths'],
-    labels={'value': 'Count', 'Date': 'Year'},
-    #title='Dengue Cases and Deaths Over Time',
-    color_discrete_map={'Dengue_Cases': '#C7E5FF', 'Dengue_Deaths': '#EC7777'}  # Updated colors
-)
-total_per_year_graph.update_layout(
-    paper_bgcolor='#393D3F',  # outside bg BLACK
-    plot_bgcolor='#393D3F',  # inside bg BLACK
-    font=dict(color='#FFFFFF'),  # font WHITE
-    #title=dict(font=dict(size=20, color='#FFFFFF')),  # Title 
+from api import CaseApi
+from coalesce import Coalescer
+from data_bundle import DEFAULT_BUNDLE_DIR, current_version, load_bundle
+from data_version import VersionWatcher, content_hash, mapping_hash
+from figure_cache import FigureCache
+from figures import ALERT_COLOR, AXIS, CASES_COLOR, DEATHS_COLOR, PX_LAYOUT, PX_XAXIS, PX_YAXIS, WHITE, axis_title, colorscale_color, empty_figure, figure, layout, line_traces, plain_figure, template, typed_array
+from forecasting import ForecastStore
+from hospital_index import HospitalIndex, viewport
+from http_cache import HttpCache, accepted_encoding, compress, parse_timestamp
+from instrumentation import CallbackMetrics
+from outbreaks import alert_text, update_signals
+from query import DEFAULT_BUDGET_MB as QUERY_BUDGET_MB, QueryEngine
+from spatial_join import RegionLocator, cached_locate
+from vector_tiles import RegionTiles, region_shapes
 
-    xaxis=dict( #x-axis properites
-        tickformat="%Y",
-        range=["2016-01-01", "2020-12-31"],
-        dtick="M12",
-        linecolor='#FFFFFF',  # Axis line color WHITE
-        gridcolor='#60B3F7',  # Gridline color YELLOW
-        zeroline=False,
-        title=dict(text='Year', font=dict(color='#FFFFFF'))  # X-axis title font WHITE
-    ),
-    yaxis=dict(
-        title=dict(text='Count', font=dict(color='#FFFFFF')),  # Y-axis title font WHITE
-        linecolor='#FFFFFF',  # Axis line color font WHITE
-        gridcolor='#60B3F7',  # Gridline color YELLOW
-        zeroline=False,
-    ),
-    legend=dict(
-        title=dict(text='Metric', font=dict(color='#FFFFFF')),  # title WHITE
-        font=dict(color='#FFFFFF')  # font color WHITE
-    ),
-    hovermode='x unified'  
-)
-#--------------------ACTUAL APP-------------------------------------------------------------------------------
-# External stylesheets
-external_stylesheets = [
-    dbc.themes.FLATLY, "https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0-beta3/css/all.min.css", #for the icons
-]
+# plotly is only needed once the first figure is built (first page load), not for the worker to come up
+px = lazy_import('plotly.express')
+# shapely only once load_data() builds the region shapes (spatial join, map anchors, tiles), so importing the app
+# module itself stays light (export_static.py, the benchmarks)
+shapely = lazy_import('shapely')
 
-app = Dash(__name__, external_stylesheets=external_stylesheets)
+BUNDLE_DIR = os.path.join("Data", DEFAULT_BUNDLE_DIR)
 
-# App Layout
-app.layout = html.Div(
-    style={
-        'backgroundColor': '#393D3F',  # layout bg BLACK
-        'color': '#FFFFFF',           # font WHITE
-        'padding': '10px',
-    },
-    children=[
-        dbc.Container([
-            # TITLE ROW
-            dbc.Row(
-                dbc.Col(
-                    html.H1("Philippine Dengue Cases and Deaths (2016-2020)", 
-                            className="text-center mt-4",
-                            style={'color': '#FFFFFF'}  # White font color
-                    )
-                )
-            ),
+# Region polygons on the map: 'geojson' (default) embeds the outlines in the figure (also needed without a server,
+# e.g. export_static.py); 'tiles' serves them as vector tiles from /tiles/regions/... and the figures only carry
+# the values per region. Tiles are much smaller but colour the regions in MAP_TILE_BINS steps instead of a continuous
+# scale, and the hover only fires near each region's anchor marker, not anywhere over the polygon
+MAP_SOURCE = os.environ.get('MAP_SOURCE', 'geojson')
+TILE_CACHE_DIR = os.path.join("Data", "tile_cache")
+JOIN_CACHE_DIR = os.path.join("Data", "join_cache")
+# fitted forecasts and Dash's background callback results (one diskcache shared by all workers)
+FORECAST_CACHE_DIR = os.path.join("Data", "forecast_cache")
+FORECAST_WORKERS = int(os.environ.get('FORECAST_WORKERS', 0)) or None  # pool size, default half the cores
 
-            # 4 INFO CARDS ROW
-            dbc.Row([
-                dbc.Col(
-                    dbc.Card(
-                        dbc.CardBody([
-                            html.H4([
-                                html.I(className="fas fa-viruses me-2"),
-                                "Total Cases across all years:"
-                            ], className="card-title", style={'color': '#FFFFFF'}),
-                            html.H2(f"{df['Dengue_Cases'].sum():,}", 
-                                    className="card-text", style={'color': '#FFFFFF'}),
-                        ]),
-                        color="#60B3F7",  # COLOR BLACK
-                        inverse=True,
-                        className="text-center shadow-sm",
-                    ),
-                    width=3
-                ),
-                dbc.Col(
-                    dbc.Card(
-                        dbc.CardBody([
-                            html.H4([
-                                html.I(className="fas fa-skull-crossbones me-2"),
-                                "Total Deaths across all years:"
-                            ], className="card-title", style={'color': '#FFFFFF'}),
-                            html.H2(f"{df['Dengue_Deaths'].sum():,}", 
-                                    className="card-text", style={'color': '#FFFFFF'}),
-                        ]),
-                        color="#EC7777",  # ORANGE
-                        inverse=True,
-                        className="text-center shadow-sm",
-                    ),
-                    width=3
-                ),
-                dbc.Col(
-                    dbc.Card(
-                        dbc.CardBody([
-                            html.H4([
-                                html.I(className="fas fa-chart-line me-2"),
-                                "Average Cases per Year:"
-                            ], className="card-title", style={'color': '#FFFFFF'}),
-                            html.H2(f"{(df['Dengue_Cases'].sum() / 5):,.0f}", 
-                                    className="card-text", style={'color': '#FFFFFF'}),
-                        ]),
-                        color="#60B3F7",  # BLUE
-                        inverse=True,
-                        className="text-center shadow-sm",
-                    ),
-                    width=3
-                ),
-                dbc.Col(
-                    dbc.Card(
-                        dbc.CardBody([
-                            html.H4([
-                                html.I(className="fas fa-heartbeat me-2"),
-                                "Average Deaths per Year:"
-                            ], className="card-title", style={'color': '#FFFFFF'}),
-                            html.H2(f"{(df['Dengue_Deaths'].sum() / 5):,.0f}", 
-                                    className="card-text", style={'color': '#FFFFFF'}),
-                        ]),
-                        color="#EC7777",  # YELLWO
-                        inverse=True,
-                        className="text-center shadow-sm",
-                    ),
-                    width=3
-                ),
-            ], className="mt-4 mb-2"),
-
-            # Line Chart
-            dbc.Row([
-                dbc.Col(
-                    dbc.Card([
-                        dbc.CardHeader(html.H4("Total Dengue Cases and Deaths Over Time", style={'color': '#FFFFFF'})),
-                        dbc.CardBody(dcc.Graph(figure=total_per_year_graph, id='total-cases-deaths-graph'))
-                    ], style={'backgroundColor': '#60B3F7'}),
-                    width=12
-                )
-            ], className="mt-4"),
 
-            # Pie Chart and Choropleth Map
-            dbc.Row([
-                dbc.Col(
-                    [   
-                        dbc.Card([
-                            dbc.CardHeader(html.H4("Number of Hospitals per Island", style={'color': '#FFFFFF'})),
-                            dbc.CardBody(
-                                [
-                                    dcc.Graph(id='hospitals_donut'),
-                                ],
-                                 
-                            )
-                        ], style={'backgroundColor': '#60B3F7', 'margin-bottom':'10px'}),
+# Hospitals per region and cases/deaths per hospital (NaN for regions without any)
+def per_hospital(values, hospitals):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(hospitals > 0, values / hospitals, np.nan)
 
-                        dbc.Card([
-                            dbc.CardHeader(html.H4(id='donut_title', children="Dengue Cases/Deaths per Island", style={'color': '#FFFFFF'})),
-                            dbc.CardBody([
-                                dcc.Graph(id='pie-graph'),
-                                dcc.Store(id='metric-store', data='Cases')
-                            ])
-                        ], style={'backgroundColor': '#60B3F7'}),
 
-    
-                    ],
-                    width=6,
-                    style={'height': '900px'}
-                ),
-                dbc.Col(
-                    dbc.Card([
-                        dbc.CardHeader(html.H4(id ='choro_title', children="Dengue Cases/Deaths by Region", style={'color': '#FFFFFF'})),
-                        dbc.CardBody(dcc.Graph(id='choropleth-with-hospitals', config={"scrollZoom": True} ))
-                    ], style={'backgroundColor': '#60B3F7'}),
-                    width=6
-                )
-            ], className="mt-4"),
-
-            # Buttons Row
-            dbc.Row(
-                dbc.Col(
-                    dbc.ButtonGroup([
-                        dbc.Button("Cases", color="warning", id='cases_button', n_clicks=0,
-                                   style={'backgroundColor': '#60B3F7', 'borderColor': '#FFFFFF', 'color': '#FFFFFF'}),
-                        dbc.Button("Deaths", color="danger", id='deaths_button', n_clicks=0,
-                                   style={'backgroundColor': '#EC7777', 'borderColor': '#FFFFFF', 'color': '#FFFFFF'}),
-                    ], size='lg'),
-                    width=12,
-                    className="d-flex justify-content-center mt-2"
-                )
-            ), 
-
-            # Bsr Bar Chart Section
-            dbc.Row(
-                dbc.Col(
-                    dbc.Card([
-                        dbc.CardHeader(html.H4("Cases and Deaths per Region and Year", style={'color': '#FFFFFF'})),
-                        dbc.CardBody([
-                            dcc.Checklist(
-                                options=[{'label': region, 'value': region} for region in df["Region"].unique()],
-                                id='stacked_region',
-                                inline=True,  # Keeps the checkboxes inline (horizontal)
-                                style={
-                                    'backgroundColor': '#393D3F',  # Dark 
-                                    'color': '#FFFFFF',  # White
-                                    'display': 'flex',  
-                                    'flexWrap': 'wrap', 
-                                    'padding': '10px',
-                                      
-                                  
-                                },
-                                inputStyle={"margin-right": "10px", "margin-bottom": "10px"},  # Space checkboxes
-                                labelStyle={'margin-right': '10px', 'margin-bottom': '10px'}  # Space labels
-                            ),
-                            dcc.Graph(
-                                    id='region-graph'
-                                ),
-                            dcc.RangeSlider(
-                                min=2016,
-                                max=2020,
-                                step=1,
-                                count=1,
-                                marks={i: {'label': str(i), 'style': {'color': '#FFFFFF'}} for i in range(2016, 2021)},
-                                value=[2016, 2020],
-                                id='stacked_slider'
-                            )
-                        ])
-                    ], style={'backgroundColor': '#60B3F7'}),
-                    width=12
-                ),
-                className="mt-4"
-            ),
+def add_hospital_metrics(regions, hospitals):
+    regions['Hospitals'] = hospitals
+    regions['Cases_per_Hospital'] = per_hospital(regions['Dengue_Cas'].to_numpy(), hospitals)
+    regions['Deaths_per_Hospital'] = per_hospital(regions['Dengue_Dea'].to_numpy(), hospitals)
 
-            # Specific Region Line Chart Section
-            dbc.Row(
-                dbc.Col(
-                    dbc.Card([
-                        dbc.CardHeader(html.H4("Cases and Deaths for Specific Region and Year", style={'color': '#FFFFFF'})),
-                        dbc.CardBody([
-                            dcc.Dropdown(
-                                options=[{'label': region, 'value': region} for region in df["Region"].unique()],
-                                multi=False,
-                                placeholder="Choose which region to display",
-                                id='specific_dropdown',
-                                style={'backgroundColor': '#FFFFFF', 'color': '#393D3F'}
-                            ),
-                            dcc.Graph(id='specific-region-graph'),
-                            dcc.RangeSlider(
-                                min=2016,
-                                max=2020,
-                                step=1,
-                                count=1,
-                                marks={i: {'label': str(i), 'style': {'color': '#FFFFFF'}} for i in range(2016, 2021)},
-                                value=[2016, 2020],
-                                id='specific_slider'
-                            )
-                        ])
-                    ], style={'backgroundColor': '#60B3F7'}),
-                    width=12
-                ),
-                className="mt-4 mb-4"
-            )
-        ]#,fluid=True
-        ),dcc.Interval(id='interval-trigger', interval=60000, n_intervals=0) #serve as input for the hospital donut
-    ]
-)
 
+# Outbreak signals of the loaded data version (see outbreaks.py), extended rather than recomputed when a new
+# version only adds months
+outbreaks = None
 
-# --------------------------Callbacks-------------------------------------------------------------------------------------------------------------------------
-#for updating the card headers for choropleth and donut chsart
-@app.callback(
-    [Output('donut_title', 'children'),
-     Output('choro_title', 'children')],
-    Input('metric-store', 'data')
-)
-def update_titles(metric):
-    if metric == "Cases":
-        donut_title = "Dengue Cases per Island"
-        choro_title = "Dengue Cases by Region and Hospital Locations"
-    else:  # metric == "Deaths"
-        donut_title = "Dengue Deaths per Island"
-        choro_title = "Dengue Deaths by Region and Hospital Locations"
-    
-    return donut_title, choro_title
+# State derived from only some of the bundle files (region outlines, facilities), kept across data versions that
+# don't change those files (e.g. ingested case reports, see ingest.py): name -> (content key, value)
+derived = {}
 
-#donut chart for number of hospitals per island
-@app.callback(
-    Output('hospitals_donut', 'figure'),
-    Input('interval-trigger', 'n_intervals'),
 
-)
-#HORIZONTAL HOSPITAL BAR, NOT DONUT ANYMORE
-def update_hospital_donut(_):
-    island_colors = {
-        "Luzon": '#FFD700',
-        "Visayas": "#FFD700",
-        "Mindanao" : "#FFD700"
-    }
-    
-    fig = px.bar(
-        hospitals_per_island,
-        x="Hospital_Count",
-        y="Island",
-        orientation='h',  # Horizontal bar chart
-        color='Island',
-        color_discrete_map=island_colors
-    )
+def reuse(name, key, build):
+    if name not in derived or derived[name][0] != key:
+        derived[name] = (key, build())
+    return derived[name][1]
 
-    fig.update_traces(
-        texttemplate='%{x}',  
-        textposition='outside'
-    )
 
-    fig.update_layout(
-        paper_bgcolor='#393D3F',
-        plot_bgcolor='#393D3F',
-        font=dict(color='#FFFFFF'),
-        title=dict(font=dict(size=20, color='#FFFFFF')),
-        #margin=dict(l=50, r=50, t=50, b=50),
-        yaxis=dict(title="Island",
-                   categoryorder="total ascending"),
-        xaxis=dict(title="Hospital Count",
-                   range=[0, max(hospitals_per_island['Hospital_Count']) + 50],
-                   autorange=False
-                   ),
-
-        #width=600,
-        #height=600,  
-        bargap=0.2,
-        showlegend=False 
-    )
+# Load data (preprocessed bundle from build_bundle.py, no CSV/shapefile parsing at startup).
+# Everything derived from the bundle is built here so a new data version can simply be loaded again.
+def load_data(version=None):
+    global bundle, df, hospitals_and_clinics, hospitals_per_island, total_cases_and_deaths_with_region
+    global region_geojson_tiers, region_tiles, region_anchors, cube, hospital_index, outbreaks, DATA_VERSION
 
-    return fig
+    with phase('load bundle'):
+        new_bundle = load_bundle(BUNDLE_DIR, version)
+        new_df = new_bundle.frame('cases')
+        new_hospitals = new_bundle.frame('hospitals')  # full facility registry
+        new_hospitals_per_island = new_bundle.frame('hospitals_per_island')
+        new_regions = new_bundle.frame('regions').drop(columns='geometry')  # values per region
+        geometry_key = new_bundle.geometry_key
+        hospitals_key = new_bundle.files_key(['hospitals.arrow'])
+        # region outlines at several levels of detail (coarsest first), the map picks one by zoom
+        new_geojson_tiers = reuse('geojson', geometry_key, lambda: [
+            new_bundle.region_geojson(tier) for tier in range(len(new_bundle.geometry_tiers))])
 
-# FOR PIE AND CHOROPLETH ROW
-    #BuTTONS
-@app.callback(
-    Output('metric-store', 'data'),
-    [Input('cases_button', 'n_clicks'),
-     Input('deaths_button', 'n_clicks')],
-    [State('metric-store', 'data')]
-)
-def update_metric(cases_n_clicks, deaths_n_clicks, last_clicked_metric):
-    # Default to 0 if clicks are None
-    clicks = {'Cases': cases_n_clicks or 0, 'Deaths': deaths_n_clicks or 0}
+    # Region x Year x Month cube for the filter callbacks (built by build_bundle.py, memory-mapped here)
+    with phase('load cube'):
+        new_cube = new_bundle.cube()
 
-    # Determine the metric with the most clicks
-    new_metric = max(clicks, key=clicks.get)
+    # Seasonal baselines, z-scores, EWMA and CUSUM for every region's monthly cases
+    with phase('outbreak signals'):
+        new_outbreaks = update_signals(outbreaks, new_cube.regions, new_cube.series('Dengue_Cases'))
 
-    # Update only if the new metric is different
-    return new_metric if new_metric != last_clicked_metric else last_clicked_metric
+    # Spatial index over the facilities so the map only gets clusters / the points in view
+    with phase('build hospital index'):
+        new_hospital_index = reuse('hospital_index', hospitals_key, lambda: HospitalIndex(
+            new_hospitals['name'], new_hospitals['lat'], new_hospitals['lon']))
 
+    with phase('region shapes'):
+        def shapes_and_anchors():
+            shapes = [region_shapes(geojson) for geojson in new_geojson_tiers]
+            # a point inside each region (finest outlines), where the map puts per-region markers / hover labels
+            anchors = shapely.point_on_surface(shapes[-1])
+            return shapes, {'lat': shapely.get_y(anchors), 'lon': shapely.get_x(anchors)}
 
+        new_region_shapes, new_region_anchors = reuse('region_shapes', geometry_key, shapes_and_anchors)
 
-# Update pie chart based on button
-@app.callback(
-    Output('pie-graph', 'figure'),
-    Input('metric-store', 'data')
-)
-def update_pie_chart(metric):
+    # Region of every facility (finest outlines), and the per-region hospital numbers that follow from it
+    with phase('hospital spatial join'):
+        join_key = mapping_hash({'geometry': geometry_key, 'hospitals': hospitals_key})
+        hospital_region = reuse('hospital_region', join_key, lambda: cached_locate(
+            RegionLocator(new_region_shapes[-1]), new_hospitals['lat'], new_hospitals['lon'],
+            os.path.join(JOIN_CACHE_DIR, f'{join_key}.npy')))
+        new_hospitals['region_id'] = hospital_region
+        add_hospital_metrics(new_regions, np.bincount(hospital_region[hospital_region >= 0], minlength=len(new_regions)))
+
+    # Vector tiles of the region outlines, cut on request (512px tiles, so one zoom finer for the tier) and
+    # cached on disk per geometry (new case data doesn't make them cold)
+    new_region_tiles = None
+    if MAP_SOURCE == 'tiles':
+        with phase('region tiles'):
+            new_region_tiles = reuse('region_tiles', geometry_key, lambda: RegionTiles(
+                new_region_shapes, lambda z: geometry_tier(z + 1), cache_dir=os.path.join(TILE_CACHE_DIR, geometry_key)))
+
+    # swap everything in together, the version last (it's part of every cache key)
+    bundle, df, hospitals_and_clinics, hospitals_per_island = new_bundle, new_df, new_hospitals, new_hospitals_per_island
+    total_cases_and_deaths_with_region, region_geojson_tiers = new_regions, new_geojson_tiers
+    cube, hospital_index, region_tiles, region_anchors = new_cube, new_hospital_index, new_region_tiles, new_region_anchors
+    outbreaks = new_outbreaks
+    DATA_VERSION = new_bundle.version
+
+
+load_data()
+
+# Figure cache for the callbacks that only see a handful of distinct inputs (keyed on inputs + data version)
+figure_cache = FigureCache(version=lambda: DATA_VERSION)
+
+# Cases/deaths aggregates for the callbacks and the /api/cases routes (query.py), cached per query + data version
+query_cache = FigureCache(int(float(os.environ.get('QUERY_CACHE_MB', QUERY_BUDGET_MB)) * 1024 * 1024),
+                          version=lambda: DATA_VERSION, size=lambda result: result.nbytes)
+query_engine = QueryEngine(lambda: cube, query_cache)
+
+# Watch the bundle pointer: a rebuilt bundle gets loaded and becomes the new data version.
+# Browsers only ask "has the version changed?" (see check_data_version) instead of refetching figures.
+DATA_WATCH_INTERVAL = float(os.environ.get('DATA_WATCH_INTERVAL', 5))
+data_watcher = VersionWatcher(lambda: current_version(BUNDLE_DIR), load_data, interval=DATA_WATCH_INTERVAL,
+                              initial=DATA_VERSION)
+
+
+# Define initial line graph (built on the first page load)
+TOTAL_PER_YEAR_LAYOUT = {
+    'xaxis': dict(PX_XAXIS, **AXIS,  #x-axis properites, line WHITE, grid BLUE
+        title=axis_title('Year'),
+        tickformat="%Y",
+        dtick="M12",
+        zeroline=False,
+    ),
+    'yaxis': dict(PX_YAXIS, **AXIS, title=axis_title('Count'), zeroline=False),
+    'legend': dict(title=axis_title('Metric'), tracegroupgap=0, font=dict(color=WHITE)),
+    **PX_LAYOUT,
+    #title='Dengue Cases and Deaths Over Time',
+    'hovermode': 'x unified',
+}
+
+
+@figure_cache.memoize
+def build_total_per_year_graph():
+    # monthly totals over every region = df.groupby('Date').sum()
+    totals = query_engine.query(group_by=('year', 'month'))
+    series = [
+        ('Dengue_Cases', totals.column('Dengue_Cases'), CASES_COLOR),
+        ('Dengue_Deaths', totals.column('Dengue_Deaths'), DEATHS_COLOR),
+    ]
+    xaxis = dict(TOTAL_PER_YEAR_LAYOUT['xaxis'], range=[f"{cube.first_year}-01-01", f"{cube.last_year}-12-31"])
+    return figure(line_traces(totals.dates(), series, 'variable', 'Year', 'Count'), layout(TOTAL_PER_YEAR_LAYOUT, xaxis=xaxis))
+
+
+# --------------------------Pie and choropleth figures (built once, switched in the browser)---------------------
+METRICS = ['Cases', 'Deaths']
+
+# Pie chart for the selected metric
+@figure_cache.memoize
+def build_pie_chart(metric):
     values = 'Dengue_Cases' if metric == 'Cases' else 'Dengue_Deaths'
     #title = f'Dengue {metric} per Island'
     
@@ -392,8 +204,11 @@ def update_pie_chart(metric):
         }
     
 
+    # one slice per island (plotly summed the rows per island anyway), islands in order of their first region
+    totals = query_engine.query(group_by=('island',))
+    order = np.argsort([np.flatnonzero(cube.islands == island)[0] for island in totals.column('Island')])
     fig = px.pie(
-        df,
+        pd.DataFrame({'Island': totals.column('Island')[order], values: totals.column(values)[order]}),
         names='Island',
         values=values,
         hole=0.5,
@@ -409,139 +224,901 @@ def update_pie_chart(metric):
         width=600,
         #height=600,
     )
-    return fig
+    return plain_figure(fig)
+
+# Map colouring per metric
+MAP_METRIC_COLUMNS = {'Cases': 'Dengue_Cas', 'Deaths': 'Dengue_Dea'}
+MAP_COLOR_SCALES = {
+    'Cases': [
+        [0.0, '#FFFFFF'],  # White for the minimum
+        [1.0, '#60B3F7']   # Blue for the maximum (Cases)
+    ],
+    'Deaths': [
+        [0.0, '#FFFFFF'],  # White for the minimum
+        [1.0, '#DC143C']   # Red for the maximum (Deaths)
+    ],
+}
+
+# Vector tile mode: plotly's map layers take a single colour each, so the regions are split into colour bins
+# (equal steps between the smallest and largest value, like the colour axis) and each bin is one fill layer
+# over a tile URL that only has that bin's regions. The colour bar comes from invisible markers at the regions
+# (which also carry the hover label)
+MAP_TILE_BINS = 9
+MAP_FILL_OPACITY = 0.7
+MAP_OUTLINE = dict(color='#444444', width=1)  # plotly.js's default choropleth outline
+
+
+def map_values(metric):
+    return total_cases_and_deaths_with_region[MAP_METRIC_COLUMNS[metric]].to_numpy()
+
+
+def map_bins(metric):
+    values = map_values(metric).astype(np.float64)
+    low, high = values.min(), values.max()
+    scaled = (values - low) / (high - low) if high > low else np.zeros_like(values)
+    return np.minimum((scaled * MAP_TILE_BINS).astype(int), MAP_TILE_BINS - 1)
+
+
+# Base of the tile URLs. mapbox-gl loads tiles in a web worker, so they need absolute URLs
+def tile_root():
+    if not flask.has_request_context():
+        return ''
+    return flask.request.host_url.rstrip('/') + app.config.requests_pathname_prefix.rstrip('/')
+
+
+def tile_url(root, layer):
+    return f"{root}/tiles/regions/{DATA_VERSION}/{layer}/{{z}}/{{x}}/{{y}}.pbf"
+
+
+def map_layers(metric, root):
+    bins = map_bins(metric)
+    layers = [
+        dict(
+            sourcetype='vector',
+            source=[tile_url(root, f'{metric}-{b}')],
+            sourcelayer='regions',
+            type='fill',
+            color=colorscale_color(MAP_COLOR_SCALES[metric], (b + 0.5) / MAP_TILE_BINS),
+            opacity=MAP_FILL_OPACITY,
+            below='traces',
+        )
+        for b in np.unique(bins)
+    ]
+    layers.append(dict(sourcetype='vector', source=[tile_url(root, 'all')], sourcelayer='regions', type='line',
+                       color=MAP_OUTLINE['color'], line=dict(width=MAP_OUTLINE['width']),
+                       opacity=MAP_FILL_OPACITY, below='traces'))
+    if len(map_alerts()[0]):
+        # regions with an outbreak alert in the latest month get a thick outline
+        layers.append(dict(sourcetype='vector', source=[tile_url(root, 'alerts')], sourcelayer='regions', type='line',
+                           color=ALERT_COLOR, line=dict(width=3), below='traces'))
+    return layers
+
+
+# Everything on the map that depends on the metric: region values, hover label and colour axis (and the
+# coloured tile layers). This small dict is all the browser needs to recolour the map (outlines and hospitals
+# stay put)
+def map_metric_style(metric, root=''):
+    metric_column = MAP_METRIC_COLUMNS[metric]
+    style = {
+        'coloraxis': dict(
+            colorbar=dict(
+                title=dict(text=f"Dengue {metric}"),
+                x=0.99,
+                y=0.8,
+                xanchor='right',
+                yanchor='middle',
+                len=0.4,
+                bgcolor="rgba(0,0,0,0.5)"
+            ),
+            colorscale=MAP_COLOR_SCALES[metric],
+        ),
+    }
+    # customdata: [index (tiles only), Hospitals, Cases_per_Hospital, Deaths_per_Hospital], see map_customdata
+    per_hospital = 2 if metric == 'Cases' else 3
+    hospitals = (f"<br>Hospitals=%{{customdata[1]}}"
+                 f"<br>{metric} per hospital=%{{customdata[{per_hospital}]:,.1f}}<extra></extra>")
+    if MAP_SOURCE == 'geojson':
+        style['trace'] = {
+            'z': typed_array(map_values(metric)),
+            'hovertemplate': f"<b>%{{hovertext}}</b><br><br>index=%{{location}}<br>{metric_column}=%{{z}}" + hospitals,
+        }
+    else:
+        style['trace'] = {
+            'marker': dict(color=typed_array(map_values(metric)), coloraxis='coloraxis', size=20, opacity=0),
+            'hovertemplate': f"<b>%{{hovertext}}</b><br><br>index=%{{customdata[0]}}<br>{metric_column}=%{{marker.color}}" + hospitals,
+        }
+        style['layers'] = map_layers(metric, root)
+    return style
+
+
+def map_metric_styles(root=''):
+    return {metric: map_metric_style(metric, root) for metric in METRICS}
+
+
+# Map view (initial) and size
+MAP_CENTER = {"lat": 12.8797, "lon": 121.9740}
+MAP_ZOOM = 5.1
+MAP_WIDTH = 600
+MAP_HEIGHT = 1000
+
+
+# Geometry tier for a zoom level: the coarsest one whose simplification is still under ~1.5 screen pixels
+def geometry_tier(zoom):
+    pixel_deg = 360 / (256 * 2 ** zoom)
+    for tier, info in enumerate(bundle.geometry_tiers):
+        if info['tolerance'] <= 1.5 * pixel_deg:
+            return tier
+    return len(bundle.geometry_tiers) - 1
+
+
+# Hospital markers for a map view: clusters when zoomed out, single facilities when zoomed in
+def hospital_markers(bounds, zoom):
+    markers = hospital_index.query(bounds, zoom)
+    count = markers['count']
+    return {
+        'lat': markers['lat'],
+        'lon': markers['lon'],
+        'text': markers['text'],
+        'marker_size': np.where(count == 1, 5, 8 + 6 * np.log10(np.maximum(count, 1))),
+    }
+
+
+def map_customdata():
+    regions = total_cases_and_deaths_with_region
+    return np.column_stack([np.arange(len(regions)), regions[['Hospitals', 'Cases_per_Hospital', 'Deaths_per_Hospital']]])
+
+
+# Regions (map region ids) with an outbreak alert in the latest month, and which signals fired
+def map_alerts():
+    bits = outbreaks.latest()
+    region_ids = {region: i for i, region in enumerate(total_cases_and_deaths_with_region['Region'])}
+    alerted = [(region_ids[region], b) for region, b in zip(outbreaks.keys, bits) if b and region in region_ids]
+    return np.array([i for i, _ in alerted], dtype=np.intp), [alert_text(b) for _, b in alerted]
+
+
+def latest_month():
+    return cube.dates(cube.first_year, cube.last_year)[outbreaks.n_periods - 1][:7] if outbreaks.n_periods else ''
+
+
+# Outbreak alert markers on the map (drawn over the regions, both map modes)
+def map_alert_trace():
+    ids, signals = map_alerts()
+    return dict(
+        type='scattermapbox',
+        lat=region_anchors['lat'][ids],
+        lon=region_anchors['lon'][ids],
+        mode='markers',
+        marker=dict(size=14, color=ALERT_COLOR, opacity=0.9),
+        hovertext=total_cases_and_deaths_with_region['Region'].to_numpy()[ids].tolist(),
+        customdata=signals,
+        hovertemplate=f"<b>%{{hovertext}}</b><br>Outbreak alert in {latest_month()}<br>%{{customdata}}<extra></extra>",
+        name='Outbreak alert',
+        showlegend=False,
+    )
+
+
+# Region trace for tile mode: the polygons are map layers, the trace is the invisible hover/colour bar markers
+def region_anchor_trace(style):
+    regions = total_cases_and_deaths_with_region
+    return dict(
+        style['trace'],
+        type='scattermapbox',
+        lat=region_anchors['lat'],
+        lon=region_anchors['lon'],
+        mode='markers',
+        hovertext=regions['Region'].tolist(),
+        customdata=map_customdata(),
+        name='',
+        showlegend=False,
+        subplot='mapbox',
+    )
+
+
+# Hospital points with the yellow color (clustered for the initial view, see update_map_view)
+def hospital_trace():
+    markers = hospital_markers(*viewport(None, MAP_CENTER, MAP_ZOOM, MAP_WIDTH, MAP_HEIGHT))
+    return dict(
+        type='scattermapbox',
+        lat=markers['lat'],
+        lon=markers['lon'],
+        mode='markers',
+        marker=dict(size=markers['marker_size'], color='#FFD700', opacity=0.7),
+        text=markers['text'],
+        hoverinfo="text",
+    )
+
+
+MAP_LAYOUT = {
+    'mapbox': dict(domain={'x': [0.0, 1.0], 'y': [0.0, 1.0]}, center=MAP_CENTER, zoom=MAP_ZOOM,
+                   style="carto-darkmatter"),  # dark map
+    'legend': dict(tracegroupgap=0, font=dict(color=WHITE)),
+    'title': dict(font=dict(size=20, color=WHITE)),
+    'width': MAP_WIDTH,
+    'height': MAP_HEIGHT,
+    'margin': dict(l=0, r=0, t=0, b=0),
+    'uirevision': 'map',  # keep the user's pan/zoom when the figure is updated
+}
+
+
+# Choropleth map for the selected metric (only built for the initial view, switching uses map_metric_style)
+@figure_cache.memoize
+def build_choropleth(metric, root=''):
+    style = map_metric_style(metric, root)
+    if MAP_SOURCE != 'geojson':
+        mapbox = dict(MAP_LAYOUT['mapbox'], layers=style['layers'])
+        return figure([region_anchor_trace(style), hospital_trace(), map_alert_trace()],
+                      layout(MAP_LAYOUT, mapbox=mapbox, coloraxis=style['coloraxis']))
 
-# Update choropleth map based on button
-@app.callback(
-    Output('choropleth-with-hospitals', 'figure'),
-    Input('metric-store', 'data')
-)
-def update_choropleth(metric):
-    metric_column = 'Dengue_Cas' if metric == 'Cases' else 'Dengue_Dea'
-    
-    # color based on meteric
-    if metric == 'Cases':
-        color_scale = [
-            [0.0, '#FFFFFF'],  # White for the minimum
-            [1.0, '#60B3F7']   # Blue for the maximum (Cases)
-        ]
-    elif metric == 'Deaths':
-        color_scale = [
-            [0.0, '#FFFFFF'],  # White for the minimum
-            [1.0, '#DC143C']   # Red for the maximum (Deaths)
-        ]
-    
     # choropleth map
     fig = px.choropleth_mapbox(
         total_cases_and_deaths_with_region,
-        geojson=total_cases_and_deaths_with_region.__geo_interface__,
+        geojson=region_geojson_tiers[geometry_tier(MAP_ZOOM)],
         locations=total_cases_and_deaths_with_region.index,
-        color=metric_column,
+        color=MAP_METRIC_COLUMNS[metric],
         hover_name='Region',
         mapbox_style="carto-darkmatter",  # dark map
-        zoom=5.1,
-        center={"lat": 12.8797, "lon": 121.9740},
+        zoom=MAP_ZOOM,
+        center=MAP_CENTER,
         opacity=0.7,
-        color_continuous_scale=color_scale,  
         #title=f"Dengue {metric} by Region"
         
     )
-
-    # Add hospital points with the ye llowcolor
-    fig.add_scattermapbox(
-        lat=hospitals_and_clinics['lat'],
-        lon=hospitals_and_clinics['lon'],
-        mode='markers',
-        marker=dict(size=5, color='#FFD700', opacity=0.7),  
-        text=hospitals_and_clinics['name'],
-        hoverinfo="text",
-    )
+    fig.update_traces(hovertemplate=style['trace']['hovertemplate'], customdata=map_customdata(),
+                      selector=dict(type='choroplethmapbox'))
+    fig.add_trace(hospital_trace())
+    fig.add_trace(map_alert_trace())
 
     # Update layout
     fig.update_layout(
         paper_bgcolor='#393D3F',
         font=dict(color='#FFFFFF'),
         title=dict(font=dict(size=20, color='#FFFFFF')),
-        coloraxis_colorbar=dict(
-            title=f"Dengue {metric}",  
-            x=0.99,  
-            y=0.8,   
-            xanchor='right',  
-            yanchor='middle',  
-            len=0.4,  
-            bgcolor="rgba(0,0,0,0.5)"  
-        ),
+        coloraxis=style['coloraxis'],
         legend=dict(font=dict(color='#FFFFFF')),
-        width=600,
-        height=1000,
+        width=MAP_WIDTH,
+        height=MAP_HEIGHT,
         margin=dict(l=0, r=0, t=0, b=0),
+        uirevision='map',  # keep the user's pan/zoom when the figure is updated
         
     )
-    return fig
+    return plain_figure(fig)
+
+
+#--------------------ACTUAL APP-------------------------------------------------------------------------------
+# External stylesheets
+external_stylesheets = [
+    dbc.themes.FLATLY, "https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0-beta3/css/all.min.css", #for the icons
+]
+
+# Background callbacks (the forecast fitting) run in their own process with results in a local diskcache, no
+# broker needed. Optional: without `pip install "dash[diskcache]"` the region line just has no forecast
+try:
+    import diskcache
+    background_cache = diskcache.Cache(FORECAST_CACHE_DIR)
+    background_callback_manager = DiskcacheManager(background_cache)
+    forecast_store = ForecastStore(background_cache)
+except ImportError:
+    background_callback_manager = forecast_store = None
+
+app = Dash(__name__, external_stylesheets=external_stylesheets, background_callback_manager=background_callback_manager)
+
+
+# start the data version watcher in whichever process ends up serving requests (under gunicorn post_fork already
+# did). Registered before every other request hook, so a 304 from http_cache or an API answer can't skip it
+@app.server.before_request
+def start_data_watcher():
+    data_watcher.start()
+
+
+# Per-callback timings / response sizes / cache hits on /metrics, only with DASH_METRICS=1
+# (has to come before the callbacks below are registered; with it off nothing is wrapped)
+metrics = CallbackMetrics.from_env()
+if metrics is not None:
+    metrics.instrument(app)
+    figure_cache.listeners.append(metrics.cache_lookup)
+    metrics.gauge('dash_figure_cache_bytes', 'Estimated size of the figure cache', lambda: figure_cache.bytes)
+    metrics.gauge('dash_figure_cache_entries', 'Entries in the figure cache', lambda: figure_cache.stats()['entries'])
+    metrics.counter('dash_figure_cache_evictions_total', 'Figure cache evictions', lambda: figure_cache.evictions)
+    query_cache.listeners.append(metrics.cache_lookup)
+    metrics.gauge('dash_query_cache_bytes', 'Size of the cached query results', lambda: query_cache.bytes)
+    metrics.gauge('dash_query_cache_entries', 'Cached query results', lambda: query_cache.stats()['entries'])
+
+# gzip/brotli for text responses over COMPRESS_MIN_BYTES, and empty 304s for repeat loads of the page/layout
+# while the data version and the code stay the same. The code is every module next to this file (the layout and
+# callbacks are built from several of them), the assets (the page links them with their mtime) and the Dash
+# versions (the renderer scripts on the page)
+def app_files():
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    modules = [os.path.join(app_dir, name) for name in os.listdir(app_dir) if name.endswith('.py')]
+    assets = [os.path.join(folder, name) for folder, _, names in os.walk(app.config.assets_folder) for name in names]
+    return modules + assets
+
+
+APP_FILES = app_files()
+APP_REVISION = mapping_hash({'files': content_hash(APP_FILES), 'dash': dash.__version__, 'dbc': dbc.__version__})
+APP_MODIFIED = datetime.fromtimestamp(int(max(os.path.getmtime(path) for path in APP_FILES)), timezone.utc)
+
+
+def data_last_modified():
+    return max(parse_timestamp(bundle.manifest['built_at']), APP_MODIFIED)
+
+
+http_cache = HttpCache(lambda: DATA_VERSION, data_last_modified, revision=APP_REVISION)
+http_cache.install(app.server)
+
+# the same aggregates as JSON / CSV / Arrow for analysts, see api.py
+CaseApi(query_engine).install(app.server, app.config.routes_pathname_prefix)
+
+# Values for the 4 info cards
+SUMMARY_CARDS = ['total-cases-card', 'total-deaths-card', 'average-cases-card', 'average-deaths-card']
+
+
+def summary_cards():
+    # from the cube's running totals, no pass over the rows
+    cases, deaths = (int(total) for total in cube.grand_totals())
+    return {
+        'total-cases-card': f"{cases:,}",
+        'total-deaths-card': f"{deaths:,}",
+        'average-cases-card': f"{(cases / len(cube.years)):,.0f}",
+        'average-deaths-card': f"{(deaths / len(cube.years)):,.0f}",
+    }
+
+
+# Page title with the years in the data (the static site takes it from here too)
+def dashboard_title():
+    return f"Philippine Dengue Cases and Deaths ({cube.first_year}-{cube.last_year})"
+
+
+# Year slider marks, one per year in the data (reports ingested for a new year add one)
+def year_marks():
+    return {int(year): {'label': str(year), 'style': {'color': '#FFFFFF'}} for year in cube.years}
+
+
+YEAR_SLIDERS = ['stacked_slider', 'specific_slider']
+
+# Inputs that go through a debounce in the browser before their callback runs (ms the value has to stay the same,
+# assets/coalesce.js): a few checkboxes ticked in a row are one request
+DEBOUNCE_MS = {'stacked_region': int(os.environ.get('CHECKLIST_DEBOUNCE_MS', 300))}
+
+
+# App Layout
+# figures=None gives the bare component tree, which is all Dash needs to validate the callbacks at startup
+def build_layout(figures=None):
+    figures = figures or {}
+    summary = summary_cards()
+    return html.Div(
+        style={
+            'backgroundColor': '#393D3F',  # layout bg BLACK
+            'color': '#FFFFFF',           # font WHITE
+            'padding': '10px',
+        },
+        children=[
+            dbc.Container([
+                # TITLE ROW
+                dbc.Row(
+                    dbc.Col(
+                        html.H1(dashboard_title(), id='dashboard-title',
+                                className="text-center mt-4",
+                                style={'color': '#FFFFFF'}  # White font color
+                        )
+                    )
+                ),
+
+                # 4 INFO CARDS ROW
+                dbc.Row([
+                    dbc.Col(
+                        dbc.Card(
+                            dbc.CardBody([
+                                html.H4([
+                                    html.I(className="fas fa-viruses me-2"),
+                                    "Total Cases across all years:"
+                                ], className="card-title", style={'color': '#FFFFFF'}),
+                                html.H2(summary['total-cases-card'], id='total-cases-card', 
+                                        className="card-text", style={'color': '#FFFFFF'}),
+                            ]),
+                            color="#60B3F7",  # COLOR BLACK
+                            inverse=True,
+                            className="text-center shadow-sm",
+                        ),
+                        width=3
+                    ),
+                    dbc.Col(
+                        dbc.Card(
+                            dbc.CardBody([
+                                html.H4([
+                                    html.I(className="fas fa-skull-crossbones me-2"),
+                                    "Total Deaths across all years:"
+                                ], className="card-title", style={'color': '#FFFFFF'}),
+                                html.H2(summary['total-deaths-card'], id='total-deaths-card', 
+                                        className="card-text", style={'color': '#FFFFFF'}),
+                            ]),
+                            color="#EC7777",  # ORANGE
+                            inverse=True,
+                            className="text-center shadow-sm",
+                        ),
+                        width=3
+                    ),
+                    dbc.Col(
+                        dbc.Card(
+                            dbc.CardBody([
+                                html.H4([
+                                    html.I(className="fas fa-chart-line me-2"),
+                                    "Average Cases per Year:"
+                                ], className="card-title", style={'color': '#FFFFFF'}),
+                                html.H2(summary['average-cases-card'], id='average-cases-card', 
+                                        className="card-text", style={'color': '#FFFFFF'}),
+                            ]),
+                            color="#60B3F7",  # BLUE
+                            inverse=True,
+                            className="text-center shadow-sm",
+                        ),
+                        width=3
+                    ),
+                    dbc.Col(
+                        dbc.Card(
+                            dbc.CardBody([
+                                html.H4([
+                                    html.I(className="fas fa-heartbeat me-2"),
+                                    "Average Deaths per Year:"
+                                ], className="card-title", style={'color': '#FFFFFF'}),
+                                html.H2(summary['average-deaths-card'], id='average-deaths-card', 
+                                        className="card-text", style={'color': '#FFFFFF'}),
+                            ]),
+                            color="#EC7777",  # YELLWO
+                            inverse=True,
+                            className="text-center shadow-sm",
+                        ),
+                        width=3
+                    ),
+                ], className="mt-4 mb-2"),
+
+                # Line Chart
+                dbc.Row([
+                    dbc.Col(
+                        dbc.Card([
+                            dbc.CardHeader(html.H4("Total Dengue Cases and Deaths Over Time", style={'color': '#FFFFFF'})),
+                            dbc.CardBody(dcc.Graph(figure=figures.get('total_per_year'), id='total-cases-deaths-graph'))
+                        ], style={'backgroundColor': '#60B3F7'}),
+                        width=12
+                    )
+                ], className="mt-4"),
+
+                # Pie Chart and Choropleth Map
+                dbc.Row([
+                    dbc.Col(
+                        [   
+                            dbc.Card([
+                                dbc.CardHeader(html.H4("Number of Hospitals per Island", style={'color': '#FFFFFF'})),
+                                dbc.CardBody(
+                                    [
+                                        dcc.Graph(id='hospitals_donut'),
+                                    ],
+                                 
+                                )
+                            ], style={'backgroundColor': '#60B3F7', 'margin-bottom':'10px'}),
+
+                            dbc.Card([
+                                dbc.CardHeader(html.H4(id='donut_title', children="Dengue Cases/Deaths per Island", style={'color': '#FFFFFF'})),
+                                dbc.CardBody([
+                                    dcc.Graph(id='pie-graph'),
+                                    dcc.Store(id='metric-store', data='Cases'),
+                                    dcc.Store(id='pie-figures', data=figures.get('pies')),
+                                    dcc.Store(id='map-styles', data=figures.get('map_styles'))
+                                ])
+                            ], style={'backgroundColor': '#60B3F7'}),
+
+    
+                        ],
+                        width=6,
+                        style={'height': '900px'}
+                    ),
+                    dbc.Col(
+                        dbc.Card([
+                            dbc.CardHeader(html.H4(id ='choro_title', children="Dengue Cases/Deaths by Region", style={'color': '#FFFFFF'})),
+                            dbc.CardBody([
+                                dcc.Graph(id='choropleth-with-hospitals', figure=figures.get('choropleth'), config={"scrollZoom": True} ),
+                                dcc.Store(id='map-geometry-tier', data=geometry_tier(MAP_ZOOM))
+                            ])
+                        ], style={'backgroundColor': '#60B3F7'}),
+                        width=6
+                    )
+                ], className="mt-4"),
+
+                # Buttons Row
+                dbc.Row(
+                    dbc.Col(
+                        dbc.ButtonGroup([
+                            dbc.Button("Cases", color="warning", id='cases_button', n_clicks=0,
+                                       style={'backgroundColor': '#60B3F7', 'borderColor': '#FFFFFF', 'color': '#FFFFFF'}),
+                            dbc.Button("Deaths", color="danger", id='deaths_button', n_clicks=0,
+                                       style={'backgroundColor': '#EC7777', 'borderColor': '#FFFFFF', 'color': '#FFFFFF'}),
+                        ], size='lg'),
+                        width=12,
+                        className="d-flex justify-content-center mt-2"
+                    )
+                ), 
+
+                # Bsr Bar Chart Section
+                dbc.Row(
+                    dbc.Col(
+                        dbc.Card([
+                            dbc.CardHeader(html.H4("Cases and Deaths per Region and Year", style={'color': '#FFFFFF'})),
+                            dbc.CardBody([
+                                dcc.Checklist(
+                                    options=[{'label': region, 'value': region} for region in df["Region"].unique()],
+                                    id='stacked_region',
+                                    inline=True,  # Keeps the checkboxes inline (horizontal)
+                                    style={
+                                        'backgroundColor': '#393D3F',  # Dark 
+                                        'color': '#FFFFFF',  # White
+                                        'display': 'flex',  
+                                        'flexWrap': 'wrap', 
+                                        'padding': '10px',
+                                      
+                                  
+                                    },
+                                    inputStyle={"margin-right": "10px", "margin-bottom": "10px"},  # Space checkboxes
+                                    labelStyle={'margin-right': '10px', 'margin-bottom': '10px'}  # Space labels
+                                ),
+                                dcc.Graph(
+                                        id='region-graph'
+                                    ),
+                                dcc.RangeSlider(
+                                    min=int(cube.first_year),
+                                    max=int(cube.last_year),
+                                    step=1,
+                                    count=1,
+                                    marks=year_marks(),
+                                    value=[int(cube.first_year), int(cube.last_year)],
+                                    updatemode='mouseup',  # one update on release, not one per year passed
+                                    id='stacked_slider'
+                                )
+                            ])
+                        ], style={'backgroundColor': '#60B3F7'}),
+                        width=12
+                    ),
+                    className="mt-4"
+                ),
+
+                # Specific Region Line Chart Section
+                dbc.Row(
+                    dbc.Col(
+                        dbc.Card([
+                            dbc.CardHeader(html.H4("Cases and Deaths for Specific Region and Year", style={'color': '#FFFFFF'})),
+                            dbc.CardBody([
+                                dcc.Dropdown(
+                                    options=[{'label': region, 'value': region} for region in df["Region"].unique()],
+                                    multi=False,
+                                    placeholder="Choose which region to display",
+                                    id='specific_dropdown',
+                                    style={'backgroundColor': '#FFFFFF', 'color': '#393D3F'}
+                                ),
+                                dcc.Graph(id='specific-region-graph'),
+                                html.Div(id='forecast-status', style={'color': '#FFFFFF'}),
+                                dcc.RangeSlider(
+                                    min=int(cube.first_year),
+                                    max=int(cube.last_year),
+                                    step=1,
+                                    count=1,
+                                    marks=year_marks(),
+                                    value=[int(cube.first_year), int(cube.last_year)],
+                                    updatemode='mouseup',
+                                    id='specific_slider'
+                                )
+                            ])
+                        ], style={'backgroundColor': '#60B3F7'}),
+                        width=12
+                    ),
+                    className="mt-4 mb-4"
+                )
+            ]#,fluid=True
+            ),dcc.Interval(id='data-version-poll', interval=60000, n_intervals=0), #cheap "has the data changed?" check
+        dcc.Store(id='data-version', data=DATA_VERSION),
+        dcc.Store(id='forecast-version'),  # data version the forecasts have been fitted for
+        dcc.Store(id='forecast-request'),  # data version whose forecasts still have to be fitted
+        dcc.Store(id='session-id'),  # this tab, for coalescing its callbacks (coalesce.py)
+        dcc.Store(id='debounce-ms', data=DEBOUNCE_MS),
+        dcc.Store(id='stacked_region-settled')  # stacked_region's value once it stops changing
+        ]
+    )
+
+
+# Full layout with the figures, built on the first page load and then reused until the data changes
+# (per tile URL root too, the map's tile URLs are absolute)
+@functools.lru_cache(maxsize=2)
+def build_full_layout(version, root):
+    figures = {}
+    with phase('line graph'):
+        figures['total_per_year'] = build_total_per_year_graph()
+    with phase('pie charts'):
+        figures['pies'] = {metric: build_pie_chart(metric) for metric in METRICS}
+    with phase('choropleth'):
+        figures['map_styles'] = map_metric_styles(root)
+        figures['choropleth'] = build_choropleth('Cases', root)
+    with phase('layout'):
+        return build_layout(figures)
+
+
+def serve_layout():
+    if not flask.has_request_context():
+        return build_layout()  # validation only
+    return build_full_layout(DATA_VERSION, tile_root())
+
+
+app.layout = serve_layout
+
+
+# Vector tiles for the map layers (see map_layers): layer 'all' has every region, '<metric>-<bin>' only the regions
+# in that colour bin. The data version is part of the URL, so a tile never changes and can be cached for good
+TILE_MAX_ZOOM = 16
+TILE_CACHE_SECONDS = 365 * 24 * 3600
+
+
+@app.server.route(app.config.routes_pathname_prefix + 'tiles/regions/<version>/<layer>/<int:z>/<int:x>/<int:y>.pbf')
+def serve_region_tile(version, layer, z, x, y):
+    if region_tiles is None or version != DATA_VERSION or z > TILE_MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+        flask.abort(404)
+    regions = None
+    if layer == 'alerts':
+        regions = map_alerts()[0].tolist()
+    elif layer != 'all':
+        metric, _, color_bin = layer.partition('-')
+        if metric not in METRICS or not color_bin.isdigit():
+            flask.abort(404)
+        regions = np.flatnonzero(map_bins(metric) == int(color_bin)).tolist()
+
+    tile = region_tiles.tile(z, x, y, regions)
+    response = flask.Response(tile, mimetype='application/x-protobuf')
+    encoding = accepted_encoding(flask.request.headers.get('Accept-Encoding'))
+    if encoding is not None:
+        response.set_data(compress(tile, encoding))
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = TILE_CACHE_SECONDS
+    response.cache_control.immutable = True
+    return response
+
+
+# --------------------------Callbacks-------------------------------------------------------------------------------------------------------------------------
+# Callbacks a user can fire faster than they're answered only compute the newest call per tab (coalesce.py); the
+# tab's id comes from the browser, debounced inputs reach their callback through a '<id>-settled' store
+coalescer = Coalescer()
+if metrics is not None:
+    metrics.counter('dash_superseded_calls_total', 'Callback calls skipped for a newer one from the same tab',
+                  lambda: coalescer.superseded)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='coalesce', function_name='session_id'),
+    Output('session-id', 'data'),
+    Input('data-version', 'data'),
+    State('session-id', 'data')
+)
+
+for debounced in DEBOUNCE_MS:
+    app.clientside_callback(
+        ClientsideFunction(namespace='coalesce', function_name='settle'),
+        Output(f'{debounced}-settled', 'data'),
+        Input(debounced, 'value'),
+        State('debounce-ms', 'data')
+    )
+
+# FOR PIE AND CHOROPLETH ROW
+# All of the Cases/Deaths switching runs in the browser (assets/metric_switch.js):
+# the figures for both metrics are shipped once, so toggling never hits the server.
+    #BuTTONS (whichever button was actually clicked wins, so one press is enough)
+app.clientside_callback(
+    ClientsideFunction(namespace='metric', function_name='switch_metric'),
+    Output('metric-store', 'data'),
+    [Input('cases_button', 'n_clicks'),
+     Input('deaths_button', 'n_clicks')],
+    State('metric-store', 'data'),
+    prevent_initial_call=True
+)
+
+#for updating the card headers for choropleth and donut chsart
+app.clientside_callback(
+    ClientsideFunction(namespace='metric', function_name='update_titles'),
+    [Output('donut_title', 'children'),
+     Output('choro_title', 'children')],
+    Input('metric-store', 'data')
+)
+
+# Pie chart: pick the prebuilt figure for the metric
+app.clientside_callback(
+    ClientsideFunction(namespace='metric', function_name='pick_pie'),
+    Output('pie-graph', 'figure'),
+    [Input('metric-store', 'data'),
+     Input('pie-figures', 'data')]
+)
+
+# Choropleth: swap values / colour axis on the figure already in the browser
+app.clientside_callback(
+    ClientsideFunction(namespace='metric', function_name='recolor_map'),
+    Output('choropleth-with-hospitals', 'figure'),
+    Input('metric-store', 'data'),
+    [State('map-styles', 'data'),
+     State('choropleth-with-hospitals', 'figure')],
+    prevent_initial_call=True
+)
+
+# Map view changes (pan/zoom): only what depends on the view is sent as a partial update,
+# the hospital markers every time and (GeoJSON mode) the region outlines only when the zoom moves to another tier.
+# With vector tiles mapbox-gl fetches the outlines for the view itself
+@app.callback(
+    [Output('choropleth-with-hospitals', 'figure', allow_duplicate=True),
+     Output('map-geometry-tier', 'data')],
+    Input('choropleth-with-hospitals', 'relayoutData'),
+    [State('map-geometry-tier', 'data'),
+     State('session-id', 'data')],
+    prevent_initial_call=True
+)
+@coalescer.latest
+def update_map_view(relayout_data, current_tier, session=None):
+    if not relayout_data or not any(key.startswith('mapbox') for key in relayout_data):
+        return no_update, no_update
+
+    bounds, zoom = viewport(relayout_data, MAP_CENTER, MAP_ZOOM, MAP_WIDTH, MAP_HEIGHT)
+    markers = hospital_markers(bounds, zoom)
+    patch = Patch()
+    patch['data'][1]['lat'] = typed_array(markers['lat'])
+    patch['data'][1]['lon'] = typed_array(markers['lon'])
+    patch['data'][1]['text'] = markers['text'].tolist()
+    patch['data'][1]['marker']['size'] = typed_array(markers['marker_size'])
+
+    tier = geometry_tier(zoom)
+    if tier != current_tier and MAP_SOURCE == 'geojson':
+        patch['data'][0]['geojson'] = region_geojson_tiers[tier]
+    return patch, tier
+
+# Data version check: answers "nothing changed" with an empty 204 unless the server has loaded new data,
+# only then do the figures below get rebuilt and resent
+@app.callback(
+    Output('data-version', 'data'),
+    Input('data-version-poll', 'n_intervals'),
+    State('data-version', 'data'),
+    prevent_initial_call=True
+)
+def check_data_version(_, known_version):
+    if known_version == DATA_VERSION:
+        raise PreventUpdate
+    return DATA_VERSION
+
+
+# New data version: rebuild the figures that were shipped with the layout (and the title, info cards, slider years)
+@app.callback(
+    [Output('dashboard-title', 'children'),
+     Output('total-cases-deaths-graph', 'figure'),
+     Output('pie-figures', 'data'),
+     Output('map-styles', 'data'),
+     Output('choropleth-with-hospitals', 'figure', allow_duplicate=True),
+     Output('map-geometry-tier', 'data', allow_duplicate=True)]
+    + [Output(card, 'children') for card in SUMMARY_CARDS]
+    + [Output(slider, prop) for slider in YEAR_SLIDERS for prop in ('min', 'max', 'marks')],
+    Input('data-version', 'data'),
+    State('metric-store', 'data'),
+    prevent_initial_call=True
+)
+def refresh_data_figures(_, metric):
+    summary = summary_cards()
+    return [
+        dashboard_title(),
+        build_total_per_year_graph(),
+        {metric: build_pie_chart(metric) for metric in METRICS},
+        map_metric_styles(tile_root()),
+        build_choropleth(metric, tile_root()),
+        geometry_tier(MAP_ZOOM),
+    ] + [summary[card] for card in SUMMARY_CARDS] \
+        + [int(cube.first_year), int(cube.last_year), year_marks()] * len(YEAR_SLIDERS)
+
+
+#donut chart for number of hospitals per island
+HOSPITAL_BAR_LAYOUT = {
+    'xaxis': dict(PX_XAXIS, title=dict(text="Hospital Count"), autorange=False),
+    'yaxis': dict(PX_YAXIS, title=dict(text="Island"), categoryorder="total ascending"),
+    'legend': dict(title=dict(text='Island'), tracegroupgap=0),
+    **PX_LAYOUT,
+    'barmode': 'relative',
+    'title': dict(font=dict(size=20, color=WHITE)),
+    #margin=dict(l=50, r=50, t=50, b=50),
+    #width=600,
+    #height=600,
+    'bargap': 0.2,
+    'showlegend': False,
+}
+
+
+@app.callback(
+    Output('hospitals_donut', 'figure'),
+    Input('data-version', 'data'),
+
+)
+#HORIZONTAL HOSPITAL BAR, NOT DONUT ANYMORE
+@figure_cache.memoize(key=lambda version: ())  # the data version is already part of the cache key
+def update_hospital_donut(_):
+    islands = pd.unique(hospitals_per_island['Island'])
+    counts = hospitals_per_island['Hospital_Count'].to_numpy()
+    traces = []
+    for island in islands:  # one bar per island, all yellow
+        rows = (hospitals_per_island['Island'] == island).to_numpy()
+        traces.append({
+            'alignmentgroup': 'True',
+            'hovertemplate': 'Island=%{y}<br>Hospital_Count=%{x}<extra></extra>',
+            'legendgroup': island,
+            'marker': {'color': '#FFD700', 'pattern': {'shape': ''}},
+            'name': island,
+            'offsetgroup': island,
+            'orientation': 'h',  # Horizontal bar chart
+            'showlegend': True,
+            'textposition': 'outside',
+            'x': counts[rows],
+            'xaxis': 'x',
+            'y': np.full(rows.sum(), island, dtype=object),
+            'yaxis': 'y',
+            'type': 'bar',
+            'texttemplate': '%{x}',
+        })
+
+    return figure(traces, dict(
+        HOSPITAL_BAR_LAYOUT,
+        xaxis=dict(HOSPITAL_BAR_LAYOUT['xaxis'], range=[0, int(counts.max()) + 50]),
+        yaxis=dict(HOSPITAL_BAR_LAYOUT['yaxis'], categoryarray=list(islands[::-1])),
+    ))
 
 
 # Update stacked bar chart
+STACKED_BAR_LAYOUT = {
+    'title': dict(font=dict(size=20, color=WHITE), x=0.5, xanchor='center'),
+    'xaxis': dict(AXIS, title=axis_title("Region")),
+    'yaxis': dict(AXIS, title=axis_title("Count (Cases)")),
+    'yaxis2': dict(
+        title=axis_title("Count (Deaths)"),
+        linecolor=WHITE,
+        gridcolor='#f2a4a4',
+        overlaying='y',  # Overlay on primary y-axis
+        side='right',    # Place it on the right side of the chart
+        tickmode="sync"
+    ),
+    'legend': dict(font=dict(color=WHITE), x=1.1, y=1),
+    'barmode': 'group',  # Grouped bars
+    'hovermode': 'x unified',
+}
+NO_REGION_BAR_LAYOUT = {
+    'title': dict(text="No Region Selected", font=dict(size=20, color=WHITE), x=0.5, xanchor='center'),
+    'xaxis': dict(AXIS, title=dict(text="Region"), zeroline=False),
+    'yaxis': dict(AXIS, title=dict(text="Count"), zeroline=False),
+}
+NO_DATA_BAR_LAYOUT = dict(NO_REGION_BAR_LAYOUT, title=dict(text="No Data Available for Selected Regions and Years"))
+STACKED_BAR_HOVER = "%{{y}}<br>Hospitals: %{{customdata[0]}}<br>{metric} per hospital: %{{customdata[1]:,.1f}}"
+
+
+def region_hospitals(region_names):
+    counts = total_cases_and_deaths_with_region.set_index('Region')['Hospitals']
+    return counts.reindex(region_names, fill_value=0).to_numpy()
+
+
 @app.callback(
     Output("region-graph", 'figure'),
-    [Input("stacked_region", 'value'),
-     Input("stacked_slider", "value")]
+    [Input("stacked_region-settled", 'data'),  # stacked_region, debounced
+     Input("stacked_slider", "value")],
+    State('session-id', 'data')
 )
-def update_stacked_bar(regions, years):
+@coalescer.latest
+def update_stacked_bar(regions, years, session=None):
     if regions is None or not regions:
-        return go.Figure(
-            data=[],
-            layout=go.Layout(
-                title=dict(
-                    text="No Region Selected",
-                    font=dict(size=20, color='#FFFFFF'),
-                    x=0.5,
-                    xanchor='center'
-                ),
-                paper_bgcolor='#393D3F',
-                plot_bgcolor='#393D3F',
-                font=dict(color='#FFFFFF'),
-                xaxis=dict(
-                    title="Region",
-                    linecolor='#FFFFFF',
-                    gridcolor='#60B3F7',
-                    zeroline=False,
-                ),
-                yaxis=dict(
-                    title="Count",
-                    linecolor='#FFFFFF',
-                    gridcolor='#60B3F7',
-                    zeroline=False,
-                ),
-            )
-        )
+        return empty_figure(NO_REGION_BAR_LAYOUT)
 
-    # Filter the data based on regions and year range
-    filtered_df = df[(df["Region"].isin(regions)) & (df["Year"].between(years[0], years[1]))]
-
-    if filtered_df.empty:
-        return go.Figure(
-            data=[],
-            layout=go.Layout(
-                title="No Data Available for Selected Regions and Years",
-                paper_bgcolor='#393D3F',
-                plot_bgcolor='#393D3F',
-                font=dict(color='#FFFFFF'),
-                xaxis=dict(
-                    title="Region",
-                    linecolor='#FFFFFF',
-                    gridcolor='#60B3F7',
-                    zeroline=False,
-                ),
-                yaxis=dict(
-                    title="Count",
-                    linecolor='#FFFFFF',
-                    gridcolor='#60B3F7',
-                    zeroline=False,
-                ),
-            )
-        )
+    # Region/Year totals for the selected regions and year range (query engine, cached per data version)
+    totals = query_engine.query(regions=regions, years=years, group_by=('region', 'year'))
 
-    filtered_df = filtered_df.groupby(['Region', 'Year'], as_index=False).sum()
+    if len(totals) == 0:
+        return empty_figure(NO_DATA_BAR_LAYOUT)
+
+    region_names = totals.column('Region')
+    cases = totals.column('Dengue_Cases')
+    deaths = totals.column('Dengue_Deaths')
+    # hospitals in the region (spatial join, see load_data) for the per-hospital numbers in the hover
+    hospitals = region_hospitals(region_names)
 
     # Dynamically change titles
     if len(regions) <= 3:
@@ -549,148 +1126,203 @@ def update_stacked_bar(regions, years):
     else:
         title = f"Cases and Deaths in selected regions from {years[0]} to {years[1]}"
 
-    # Create a grouped bar chart with offset groups
-    fig = go.Figure()
-
-    # Add Dengue Cases (excluding deaths)
-    fig.add_trace(go.Bar(
-        x=filtered_df['Region'],
-        y=filtered_df['Dengue_Cases'] - filtered_df['Dengue_Deaths'],  # Non-death cases
-        name='Dengue Cases',
-        marker_color='#C7E5FF',  # Teal
-        offsetgroup=0,  # Set offset group for cases
-        yaxis='y1'  # Assign to primary y-axis
-    ))
+    # Grouped bar chart with offset groups: cases (excluding deaths) on the left axis, deaths on the right one
+    traces = [
+        {'marker': {'color': CASES_COLOR}, 'name': 'Dengue Cases', 'offsetgroup': '0',
+         'x': region_names, 'y': cases - deaths, 'yaxis': 'y', 'type': 'bar',
+         'customdata': np.column_stack([hospitals, per_hospital(cases, hospitals)]),
+         'hovertemplate': STACKED_BAR_HOVER.format(metric='Cases')},
+        {'marker': {'color': DEATHS_COLOR}, 'name': 'Dengue Deaths', 'offsetgroup': '1',
+         'x': region_names, 'y': deaths, 'yaxis': 'y2', 'type': 'bar',
+         'customdata': np.column_stack([hospitals, per_hospital(deaths, hospitals)]),
+         'hovertemplate': STACKED_BAR_HOVER.format(metric='Deaths')},
+    ]
+    return figure(traces, dict(STACKED_BAR_LAYOUT, title=dict(STACKED_BAR_LAYOUT['title'], text=title)))
 
-    # Add Dengue Deaths
-    fig.add_trace(go.Bar(
-        x=filtered_df['Region'],
-        y=filtered_df['Dengue_Deaths'],  # Deaths
-        name='Dengue Deaths',
-        marker_color='#EC7777',  # Red
-        offsetgroup=1,  # Set offset group for deaths
-        yaxis='y2'  # Assign to secondary y-axis
-    ))
 
-    fig.update_layout(
-        barmode='group',  # Grouped bars
-        title=dict(
-            text=title,
-            font=dict(size=20, color='#FFFFFF'),
-            x=0.5,
-            xanchor='center',
-        ),
-        paper_bgcolor='#393D3F',
-        plot_bgcolor='#393D3F',
-        font=dict(color='#FFFFFF'),
-        xaxis=dict(
-            title=dict(text="Region", font=dict(color='#FFFFFF')),
-            linecolor='#FFFFFF',
-            gridcolor='#60B3F7'
-        ),
-        yaxis=dict(
-            title=dict(text="Count (Cases)", font=dict(color='#FFFFFF')),
-            linecolor='#FFFFFF',
-            gridcolor='#60B3F7',
-        ),
-        yaxis2=dict(
-            title=dict(text="Count (Deaths)", font=dict(color='#FFFFFF')),
-            linecolor='#FFFFFF',
-            gridcolor='#f2a4a4',
-            overlaying='y',  # Overlay on primary y-axis
-            side='right',    # Place it on the right side of the chart
-            tickmode="sync"
-        ),
-        legend=dict(font=dict(color='#FFFFFF'),
-            x=1.1,
-            y=1),
-            
-        hovermode='x unified',
+# Update specific region line chart
+REGION_LINE_LAYOUT = {
+    'xaxis': dict(PX_XAXIS, **AXIS, title=axis_title("Date")),
+    'yaxis': dict(PX_YAXIS, **AXIS, title=axis_title("Number of Cases/Deaths")),
+    'legend': dict(title=dict(text='Metric'), tracegroupgap=0, font=dict(color=WHITE)),
+    'title': dict(
+        font=dict(size=20, color=WHITE),  # Title font color and size
+        x=0.5,  # Center the title
+        xanchor='center'  # Anchor the title at the center
+    ),
+    'hovermode': 'x unified',
+}
+NO_REGION_LINE_LAYOUT = {
+    'title': dict(text="No Region Selected", font=dict(size=20, color=WHITE), x=0.5, xanchor='center'),
+    'xaxis': dict(AXIS, title=dict(text="Date"), zeroline=False),
+    'yaxis': dict(AXIS, title=dict(text="Number of Cases/Deaths"), zeroline=False),
+}
+NO_DATA_LINE_LAYOUT = {
+    'title': dict(text="No Data Available for Selected Region and Years"),
+    'xaxis': dict(AXIS, title=dict(text="Date")),
+    'yaxis': dict(AXIS, title=dict(text="Number of Cases/Deaths")),
+}
+
+
+# Outbreak overlay: the seasonal baseline of the cases and markers on the months with an alert (outbreaks.py)
+BASELINE_TRACE = {
+    'hovertemplate': "Metric=Seasonal baseline<br>Date=%{x}<br>Count=%{y:,.0f}<extra></extra>",
+    'legendgroup': 'Seasonal baseline',
+    'line': {'color': CASES_COLOR, 'dash': 'dot', 'width': 1},
+    'mode': 'lines',
+    'name': 'Seasonal baseline',
+    'showlegend': True,
+    'type': 'scatter',
+}
+ALERT_TRACE = {
+    'hovertemplate': "Outbreak alert: %{customdata}<extra></extra>",
+    'legendgroup': 'Outbreak alert',
+    'marker': {'color': ALERT_COLOR, 'size': 10, 'symbol': 'circle-open', 'line': {'width': 2}},
+    'mode': 'markers',
+    'name': 'Outbreak alert',
+    'showlegend': True,
+    'type': 'scatter',
+}
+
+
+# Forecast of the cases for the months after the data (forecasting.py), with its 80% interval as a band
+FORECAST_TRACE = {
+    'hovertemplate': "Metric=Forecast<br>Date=%{x}<br>Count=%{y:,.0f}<extra></extra>",
+    'legendgroup': 'Forecast',
+    'line': {'color': CASES_COLOR, 'dash': 'dash'},
+    'mode': 'lines',
+    'name': 'Forecast',
+    'showlegend': True,
+    'type': 'scatter',
+}
+FORECAST_BAND_TRACE = {
+    'fill': 'toself',
+    'fillcolor': 'rgba(255, 255, 255, 0.15)',
+    'hoverinfo': 'skip',
+    'legendgroup': 'Forecast',
+    'line': {'width': 0},
+    'mode': 'lines',
+    'name': '80% forecast interval',
+    'showlegend': True,
+    'type': 'scatter',
+}
+
+
+# Fit every region's forecast once per data version, in a background job (its own process, which fans out to a
+# process pool) so no web worker is blocked; the result goes to the shared diskcache and the region line callback
+# picks it up through forecast-version. Page loads first look in the cache (a plain callback, no job): only a
+# version without forecasts yet goes on to forecast-request and the background job (the lock in
+# ForecastStore.fit also keeps two sessions from fitting the same version twice)
+if background_callback_manager is not None:
+    @app.callback(
+        Output('forecast-version', 'data'),
+        Output('forecast-request', 'data'),
+        Input('data-version', 'data'),
+    )
+    def check_region_forecasts(version):
+        if version != DATA_VERSION:
+            raise PreventUpdate  # page from before a data reload, the version poll brings it up to date
+        if forecast_store.get(version) is not None:
+            return version, no_update
+        return no_update, version
+
+    @app.callback(
+        Output('forecast-version', 'data', allow_duplicate=True),
+        Input('forecast-request', 'data'),
+        background=True,
+        running=[(Output('forecast-status', 'children'), "Fitting forecasts...", "")],
+        prevent_initial_call=True,
     )
+    def fit_region_forecasts(version):
+        if version != DATA_VERSION:
+            raise PreventUpdate  # page from before a data reload, the version poll brings it up to date
+        forecast_store.fit(version, cube.regions, cube.series('Dengue_Cases'), FORECAST_WORKERS)
+        return version
 
-    return fig
+
+def region_forecast(region, version, last_date):
+    # dates and (mean, lower, upper) of the region's forecast when the line ends at the last month of the data,
+    # None otherwise or while the forecasts aren't fitted for the current data yet
+    if forecast_store is None or version != DATA_VERSION:
+        return None
+    forecasts = forecast_store.get(version)
+    if forecasts is None or cube.month_index([last_date])[0] != forecasts.start - 1:
+        return None
+    forecast = forecasts.region(region)
+    if forecast is None:
+        return None
+    months = forecasts.start + np.arange(len(forecast[0]))
+    dates = [f"{cube.first_year + m // 12}-{m % 12 + 1:02d}-01" for m in months]
+    return dates, forecast
+
+
+def region_outbreak_signals(region, dates):
+    # seasonal baseline (NaN where there is none) and alert bits of a region for the given months
+    months = cube.month_index(dates)
+    known = months < outbreaks.n_periods
+    column = cube.region_pos[region]
+    baseline = np.full(len(months), np.nan)
+    baseline[known] = outbreaks.baseline[months[known], column]
+    alerts = np.zeros(len(months), dtype=np.uint8)
+    alerts[known] = outbreaks.alerts[months[known], column]
+    return baseline, alerts
 
 
-# Update specific region line chart
 @app.callback(
     Output('specific-region-graph', 'figure'),
     [Input('specific_dropdown', 'value'),
-     Input('specific_slider', 'value')]
+     Input('specific_slider', 'value'),
+     Input('forecast-version', 'data')],
+    State('session-id', 'data')
 )
-def update_specific_region_graph(selected_region, selected_years):
+@coalescer.latest
+def update_specific_region_graph(selected_region, selected_years, forecast_version=None, session=None):
     if not selected_region:
-        return go.Figure(
-            data=[], 
-            layout=go.Layout(
-                title=dict(
-                    text="No Region Selected",
-                    font=dict(size=20, color='#FFFFFF'), 
-                    x=0.5,  # Center 
-                    xanchor='center'  # Anchor 
-                ),
-                paper_bgcolor='#393D3F',
-                plot_bgcolor='#393D3F',
-                font=dict(color='#FFFFFF'),
-                xaxis=dict(title="Date",
-                            linecolor='#FFFFFF', 
-                            gridcolor='#60B3F7',
-                            zeroline=False),
-                yaxis=dict(title="Number of Cases/Deaths",
-                            linecolor='#FFFFFF', 
-                            gridcolor='#60B3F7', 
-                            zeroline=False),
-            )
-        )
-
-    filtered_df = df[
-        (df["Region"] == selected_region) & (df["Year"].between(selected_years[0], selected_years[1]))
-    ]
+        return empty_figure(NO_REGION_LINE_LAYOUT)
 
-    if filtered_df.empty:
-        return go.Figure(
-            data=[], 
-            layout=go.Layout(
-                title="No Data Available for Selected Region and Years",
-                paper_bgcolor='#393D3F',
-                plot_bgcolor='#393D3F',
-                font=dict(color='#FFFFFF'),
-                xaxis=dict(title="Date", linecolor='#FFFFFF', gridcolor='#60B3F7'),
-                yaxis=dict(title="Number of Cases/Deaths", linecolor='#FFFFFF', gridcolor='#60B3F7'),
-            )
-        )
+    # Monthly totals for the region (query engine)
+    totals = query_engine.query(regions=[selected_region], years=selected_years, group_by=('year', 'month'))
 
-    aggregated_df = filtered_df.groupby(['Date'], as_index=False).sum()
-    melted_df = aggregated_df.melt(
-        id_vars=['Date'], value_vars=['Dengue_Cases', 'Dengue_Deaths'], var_name='Metric', value_name='Count'
-    )
+    if len(totals) == 0:
+        return empty_figure(NO_DATA_LINE_LAYOUT)
 
-    fig = px.line(
-        melted_df,
-        x='Date',
-        y='Count',
-        color='Metric',
-        title=f'Dengue Cases and Deaths Over Time in {selected_region}',
-        color_discrete_map={'Dengue_Cases': '#C7E5FF', 'Dengue_Deaths': '#EC7777'}
-    )
-
-    fig.update_layout(
-        paper_bgcolor='#393D3F',
-        plot_bgcolor='#393D3F',
-        font=dict(color='#FFFFFF'),
-        title=dict(
-            font=dict(size=20, color='#FFFFFF'),  # Title font color and size
-            x=0.5,  # Center the title
-            xanchor='center'  # Anchor the title at the center
-            
-        ),
-        xaxis=dict(title=dict(text="Date", font=dict(color='#FFFFFF')), linecolor='#FFFFFF', gridcolor='#60B3F7'),
-        yaxis=dict(title=dict(text="Number of Cases/Deaths", font=dict(color='#FFFFFF')), linecolor='#FFFFFF', gridcolor='#60B3F7'),
-        legend=dict(font=dict(color='#FFFFFF')),
-        hovermode='x unified',
-    )
-    return fig
+    dates = totals.dates()
+    cases = totals.column('Dengue_Cases')
+    series = [
+        ('Dengue_Cases', cases, CASES_COLOR),
+        ('Dengue_Deaths', totals.column('Dengue_Deaths'), DEATHS_COLOR),
+    ]
+    baseline, alerts = region_outbreak_signals(selected_region, dates)
+    alerted = alerts > 0
+    traces = line_traces(dates, series, 'Metric', 'Date', 'Count') + [
+        dict(BASELINE_TRACE, x=dates, y=baseline),
+        dict(ALERT_TRACE, x=dates[alerted], y=cases[alerted], customdata=[alert_text(b) for b in alerts[alerted]]),
+    ]
+    # the forecast continues the line when the selected years reach the end of the data
+    forecast = region_forecast(selected_region, forecast_version, dates[-1])
+    if forecast is not None:
+        forecast_dates, (mean, lower, upper) = forecast
+        traces += [
+            dict(FORECAST_BAND_TRACE, x=forecast_dates + forecast_dates[::-1],
+                 y=np.concatenate([upper, lower[::-1]])),
+            dict(FORECAST_TRACE, x=[dates[-1]] + forecast_dates, y=np.concatenate([cases[-1:], mean])),
+        ]
+    title = f'Dengue Cases and Deaths Over Time in {selected_region}'
+    return figure(traces, dict(REGION_LINE_LAYOUT, title=dict(REGION_LINE_LAYOUT['title'], text=title)))
 
 
 # ------------------------------------------run app ------------------------------------------------------------------------
 if __name__ == '__main__':
-    app.run_server(debug=True)
+    if PROFILING:
+        # what the first page load would do, then print where the time went
+        with app.server.test_request_context('/'):
+            # first attribute access runs the deferred imports
+            with phase('import plotly.express'):
+                px.line
+            with phase('build figure template'):
+                template()
+            with phase('build figures + layout'):
+                serve_layout()
+        report()
+    else:
+        app.run_server(debug=True)
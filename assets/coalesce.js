@@ -0,0 +1,28 @@
+// Fewer server calls while the user is still clicking (see coalesce.py and DEBOUNCE_MS in app.py)
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    coalesce: {
+        // passes the input's value on to the output store once it has stayed the same for the input's delay,
+        // so ticking a few checkboxes in a row sends one request; the first call (page load) goes straight through
+        settle: function(value, delays) {
+            const ctx = window.dash_clientside.callback_context;
+            const source = ctx.inputs_list[0].id;
+            const target = ctx.outputs_list.id;
+            const delay = (delays || {})[source] || 0;
+            const timers = window.dash_clientside.coalesceTimers = window.dash_clientside.coalesceTimers || {};
+            clearTimeout(timers[target]);
+            if (!ctx.triggered.length || !delay) {
+                return value;
+            }
+            timers[target] = setTimeout(function() {
+                delete timers[target];
+                window.dash_clientside.set_props(target, {data: value});
+            }, delay);
+            return window.dash_clientside.no_update;
+        },
+
+        // random id for this tab, sent along with the coalesced callbacks
+        session_id: function(_, current) {
+            return current || Math.random().toString(36).slice(2) + Date.now().toString(36);
+        }
+    }
+});
@@ -0,0 +1,46 @@
+// Cases/Deaths switching, runs entirely in the browser (see the clientside callbacks in app.py)
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    metric: {
+        // whichever button fired this callback decides the metric
+        switch_metric: function(cases_clicks, deaths_clicks, current) {
+            const triggered = window.dash_clientside.callback_context.triggered.map(t => t.prop_id);
+            if (triggered.includes('deaths_button.n_clicks')) {
+                return 'Deaths';
+            }
+            if (triggered.includes('cases_button.n_clicks')) {
+                return 'Cases';
+            }
+            return current || 'Cases';
+        },
+
+        update_titles: function(metric) {
+            if (metric === 'Cases') {
+                return ['Dengue Cases per Island', 'Dengue Cases by Region and Hospital Locations'];
+            }
+            return ['Dengue Deaths per Island', 'Dengue Deaths by Region and Hospital Locations'];
+        },
+
+        pick_pie: function(metric, figures) {
+            if (!figures || !figures[metric]) {
+                return window.dash_clientside.no_update;
+            }
+            return figures[metric];
+        },
+
+        // copy the figure and swap only the region values, hover label and colour axis (and the coloured
+        // tile layers), the region outlines and hospital markers are reused as they are
+        recolor_map: function(metric, styles, figure) {
+            if (!styles || !styles[metric] || !figure) {
+                return window.dash_clientside.no_update;
+            }
+            const style = styles[metric];
+            const data = figure.data.slice();
+            data[0] = Object.assign({}, data[0], style.trace);
+            const layout = Object.assign({}, figure.layout, {coloraxis: style.coloraxis});
+            if (style.layers) {
+                layout.mapbox = Object.assign({}, layout.mapbox, {layers: style.layers});
+            }
+            return Object.assign({}, figure, {data: data, layout: layout});
+        }
+    }
+});
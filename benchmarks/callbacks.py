@@ -0,0 +1,180 @@
+# Benchmark every server-side callback in app.py with a matrix of realistic inputs.
+# Records wall time (median / p95), peak Python memory (tracemalloc) and the serialized response size,
+# and compares against a stored baseline.
+#
+#   python benchmarks/callbacks.py --save-baseline          (record benchmarks/baseline.json on this machine)
+#   python benchmarks/callbacks.py                          (compare, exit 1 if anything regressed)
+#   python benchmarks/callbacks.py --scale 10 100 1000      (synthetic data: df_improved.csv x N regions)
+#
+# Timings are machine specific, so record the baseline on the machine that runs the comparison.
+import argparse
+import itertools
+import json
+import math
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+from dash.exceptions import PreventUpdate
+from plotly.io.json import to_json_plotly
+
+import app
+from cube import RegionCube
+from figure_cache import FigureCache
+from outbreaks import update_signals
+from query import QueryEngine
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+ORIGINAL_DF = app.df
+MIN_CALLS = 20  # timed calls per case at least (cases with few inputs are repeated more), fewer make p95 meaningless
+
+
+def uncached(func):
+    # bypass figure_cache.memoize so we time the real work
+    return getattr(func, '__wrapped__', func)
+
+
+def scaled_frame(df, factor):
+    # factor x as many regions: copies of every region with a numbered suffix, same values
+    if factor == 1:
+        return df
+    regions = df['Region'].astype(str)  # categorical in the bundle, the copies get new categories
+    frame = pd.concat([df.assign(Region=regions + f' #{i}') if i else df.assign(Region=regions)
+                       for i in range(factor)], ignore_index=True)
+    return frame.astype({'Region': 'category'})
+
+
+def use_data(df):
+    # swap in what load_data() derives from the cases for the callbacks below
+    app.df = df
+    app.cube = RegionCube(df)
+    app.outbreaks = update_signals(app.outbreaks, app.cube.regions, app.cube.series('Dengue_Cases'))
+    # no query cache (max_bytes=0), so repeated inputs time the aggregation and not a cache hit
+    app.query_engine = QueryEngine(lambda: app.cube, FigureCache(0, version=lambda: app.DATA_VERSION,
+                                                                 size=lambda result: result.nbytes))
+
+
+def cases():
+    regions = list(app.cube.regions)
+    years = list(range(app.cube.first_year, app.cube.last_year + 1))
+    ranges = [[first, last] for first, last in itertools.combinations_with_replacement(years, 2)]
+    singles = regions[:: max(1, len(regions) // 5)][:5]  # a handful of single regions spread over the list
+
+    yield 'update_stacked_bar', 'all regions', app.update_stacked_bar, [(regions, r) for r in ranges]
+    yield 'update_stacked_bar', 'single region', app.update_stacked_bar, [([region], r) for region in singles for r in ranges]
+    yield 'update_stacked_bar', 'no region', app.update_stacked_bar, [([], ranges[0])]
+    yield 'update_specific_region_graph', 'single region', app.update_specific_region_graph, [(region, r) for region in singles for r in ranges]
+    yield 'update_specific_region_graph', 'no region', app.update_specific_region_graph, [(None, ranges[0])]
+    yield 'update_hospital_donut', 'initial', uncached(app.update_hospital_donut), [(app.DATA_VERSION,)]
+    views = [{'mapbox.center': app.MAP_CENTER, 'mapbox.zoom': zoom} for zoom in (5.1, 7, 9, 11, 13, 15)]
+    yield 'update_map_view', 'zoom 5-15', app.update_map_view, [(view, 0) for view in views]
+    yield 'check_data_version', 'unchanged', app.check_data_version, [(1, app.DATA_VERSION)]
+    yield 'refresh_data_figures', 'both metrics', uncached_refresh, [(app.DATA_VERSION, metric) for metric in app.METRICS]
+
+
+def uncached_refresh(version, metric):
+    app.figure_cache.clear()
+    return app.refresh_data_figures(version, metric)
+
+
+def call(func, args):
+    try:
+        return func(*args)
+    except PreventUpdate:
+        return None  # Dash answers this with an empty 204
+
+
+def measure(func, arg_list, repeat):
+    times = []
+    for _ in range(max(repeat, math.ceil(MIN_CALLS / len(arg_list)))):
+        for args in arg_list:
+            started = time.perf_counter()
+            result = call(func, args)
+            to_json_plotly(result)  # Dash serializes every response, count it
+            times.append(time.perf_counter() - started)
+
+    peak = 0
+    size = 0
+    tracemalloc.start()
+    for args in arg_list:
+        tracemalloc.reset_peak()
+        result = call(func, args)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        size = max(size, len(to_json_plotly(result)) if result is not None else 0)
+    tracemalloc.stop()
+
+    return {
+        'calls': len(times),
+        'median_ms': statistics.median(times) * 1000,
+        'p95_ms': float(np.percentile(times, 95)) * 1000,
+        'peak_kb': peak / 1024,
+        'max_bytes': size,
+    }
+
+
+def run(scale, repeat):
+    use_data(scaled_frame(ORIGINAL_DF, scale))
+    results = {}
+    for name, label, func, arg_list in cases():
+        results[f'x{scale} {name} [{label}]'] = measure(func, arg_list, repeat)
+    return results
+
+
+def compare(results, baseline, margin):
+    failures = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for metric in ('median_ms', 'p95_ms', 'peak_kb', 'max_bytes'):
+            if base[metric] and result[metric] > base[metric] * (1 + margin):
+                failures.append(f"{key}: {metric} {result[metric]:.1f} > baseline {base[metric]:.1f} (+{margin:.0%})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Callback latency / memory / payload benchmarks")
+    parser.add_argument('--scale', type=int, nargs='+', default=[1], help="synthetic data sizes (x regions)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--margin', type=float, default=float(os.environ.get('BENCH_MARGIN', 0.25)),
+                        help="allowed regression over the baseline (0.25 = 25%%)")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'case':<70}{'calls':>7}{'median ms':>11}{'p95 ms':>9}{'peak KB':>10}{'bytes':>11}")
+    for scale in args.scale:
+        for key, r in run(scale, args.repeat).items():
+            results[key] = r
+            print(f"{key:<70}{r['calls']:>7}{r['median_ms']:>11.2f}{r['p95_ms']:>9.2f}{r['peak_kb']:>10.0f}{r['max_bytes']:>11,}")
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("no baseline yet, run with --save-baseline first")
+        return 0
+    with open(args.baseline) as f:
+        failures = compare(results, json.load(f), args.margin)
+    for failure in failures:
+        print("REGRESSION", failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
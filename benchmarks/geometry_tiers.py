@@ -0,0 +1,44 @@
+# Size and encode/decode cost of each region geometry tier in the bundle.
+# Browser render time isn't measured here; decode time (json.loads) is a rough stand-in for the
+# client's parse cost, and bytes/vertices drive both transfer and render time.
+# Run from the repo root: python benchmarks/geometry_tiers.py
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plotly.io.json import to_json_plotly
+
+import app
+
+REPEAT = 5
+
+
+def best_of(func):
+    times = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return min(times) * 1000
+
+
+def main():
+    zooms = [z / 2 for z in range(6, 31)]
+    print(f"{'tier':<6}{'tolerance':>10}{'zooms':>14}{'vertices':>10}{'bytes':>12}{'gzip':>10}{'encode ms':>11}{'decode ms':>11}")
+    for tier, info in enumerate(app.bundle.geometry_tiers):
+        used = [z for z in zooms if app.geometry_tier(z) == tier]
+        zoom_range = f"{used[0]:g}-{used[-1]:g}" if used else '-'
+        geojson = app.region_geojson_tiers[tier]
+        encoded = to_json_plotly(geojson)
+        encode_ms = best_of(lambda: to_json_plotly(geojson))
+        decode_ms = best_of(lambda: json.loads(encoded))
+        print(f"{tier:<6}{info['tolerance']:>10g}{zoom_range:>14}{info['vertices']:>10,}{len(encoded):>12,}"
+              f"{len(gzip.compress(encoded.encode())):>10,}{encode_ms:>11.2f}{decode_ms:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
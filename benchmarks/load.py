@@ -0,0 +1,496 @@
+# Load test of the Dash callback endpoint: simulated browser sessions replay scripted user actions against a locally
+# started server, at one or more concurrency levels. Reports throughput, p50/p95/p99 latency per callback and error
+# rates, and compares two builds. Run from the directory with the Data folder (the server is started there):
+#
+#   python benchmarks/load.py --concurrency 1 5 10 25 50              (this checkout, one gunicorn worker)
+#   python benchmarks/load.py --app-dir ../old-checkout --out old.json
+#   python benchmarks/load.py --out new.json && python benchmarks/load.py --compare old.json new.json
+#   python benchmarks/load.py --url http://127.0.0.1:8050/            (a server that is already running)
+#
+# A session does what the browser's Dash renderer would: load the page (index, layout, dependencies, then the
+# initial callbacks), then run a script of actions. Every action sends the _dash-update-component requests it
+# triggers, then the callbacks its outputs trigger, and the polls of background callbacks. Clientside callbacks
+# run in the browser and cost the server nothing, so the Cases/Deaths buttons send no requests here either; the
+# ones that feed server callbacks (debounce and tab id, assets/coalesce.js) are played like the browser would.
+# Sliders only send their value on release unless they have updatemode='drag'. Sessions are spread over a few
+# client processes so the client's own work doesn't slow the timings down.
+import argparse
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
+import requests
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPDATE = '_dash-update-component'
+P99_LIMIT_MS = 500
+TICK_SECONDS = (0.1, 0.4)  # between checklist ticks (quick clicking)
+DRAG_STEP_SECONDS = 0.05  # between the values a dragged slider goes through
+MAX_POLLS = 120  # background callback polls per call before giving up (counted as an error)
+CLIENTSIDE = {('coalesce', 'settle'), ('coalesce', 'session_id')}  # clientside functions played here
+
+# (action, component id[, count]); think = pause of --think seconds on average
+SCRIPTS = {
+    'browse': [('load',), ('think',), ('click', 'deaths_button'), ('think',), ('click', 'cases_button'),
+               ('tick', 'stacked_region', 3), ('think',), ('drag', 'stacked_slider'), ('think',),
+               ('pick', 'specific_dropdown'), ('think',), ('drag', 'specific_slider')],
+    'regions': [('load',), ('tick', 'stacked_region', 6), ('think',), ('drag', 'stacked_slider'), ('think',),
+                ('tick', 'stacked_region', 3), ('drag', 'stacked_slider')],
+    'region_lines': [('load',), ('pick', 'specific_dropdown'), ('think',), ('drag', 'specific_slider'), ('think',),
+                     ('pick', 'specific_dropdown'), ('think',), ('pick', 'specific_dropdown')],
+    'glance': [('load',), ('think',), ('click', 'deaths_button'), ('think',), ('click', 'cases_button')],
+}
+
+
+# ---- the browser side ----
+def components(node, found=None):
+    # id -> props of every component in a _dash-layout tree
+    found = {} if found is None else found
+    if isinstance(node, dict):
+        props = node.get('props')
+        if isinstance(props, dict) and 'type' in node:
+            if isinstance(props.get('id'), str):
+                found[props['id']] = props
+            node = props
+        for value in node.values():
+            components(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            components(value, found)
+    return found
+
+
+def split_outputs(output):
+    # '..a.b...c.d..' (several outputs) or 'a.b' -> ['a.b', 'c.d'], without the allow_duplicate suffixes
+    outputs = output[2:-2].split('...') if output.startswith('..') else [output]
+    return [o.split('@')[0] for o in outputs]
+
+
+def callback_label(output):
+    outputs = split_outputs(output)
+    return outputs[0] + (f" +{len(outputs) - 1}" if len(outputs) > 1 else '')
+
+
+def option_values(options):
+    return [o['value'] if isinstance(o, dict) else o for o in options or ()]
+
+
+class Session:
+    # one simulated browser tab; record(label, seconds, status) gets every request (status 0: no response)
+    def __init__(self, base, rng, think, record, pool):
+        self.base = base
+        self.rng = rng
+        self.think_seconds = think
+        self.record = record
+        self.pool = pool
+        self.http = requests.Session()
+        self.lock = threading.Lock()
+
+    def request(self, label, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base + path, timeout=60, **kwargs)
+        except requests.RequestException:
+            self.record(label, time.perf_counter() - started, 0)
+            return None
+        self.record(label, time.perf_counter() - started, response.status_code)
+        return response
+
+    # -- page load --
+    def load(self):
+        self.request('GET /', 'GET', '')
+        layout = self.request('GET _dash-layout', 'GET', '_dash-layout')
+        dependencies = self.request('GET _dash-dependencies', 'GET', '_dash-dependencies')
+        if layout is None or dependencies is None or not layout.ok or not dependencies.ok:
+            return False
+        self.props = components(layout.json())
+        self.callbacks = [c for c in dependencies.json() if not c.get('clientside_function')
+                          or (c['clientside_function']['namespace'],
+                              c['clientside_function']['function_name']) in CLIENTSIDE]
+        self.timers = {}
+        self.values = {f"{id_}.{prop}": value for id_, props in self.props.items() for prop, value in props.items()}
+        self.intervals = {id_: (props.get('interval', 1000) / 1000, time.monotonic())
+                          for id_, props in self.props.items() if 'n_intervals' in props}
+        initial = [c for c in self.callbacks if not c.get('prevent_initial_call')
+                   and all(i['id'] in self.props for i in c['inputs'])]
+        self.run(initial, set())
+        return True
+
+    # -- callbacks --
+    def body(self, callback, changed):
+        def spec(items, with_values=True):
+            specs = []
+            for item in items:
+                entry = {'id': item['id'], 'property': item['property']}
+                key = f"{item['id']}.{item['property']}"
+                if with_values and key in self.values:
+                    entry['value'] = self.values[key]
+                specs.append(entry)
+            return specs
+
+        outputs = [dict(zip(('id', 'property'), o.split('.', 1))) for o in split_outputs(callback['output'])]
+        return {
+            'output': callback['output'],
+            'outputs': outputs if callback['output'].startswith('..') else outputs[0],
+            'inputs': spec(callback['inputs']),
+            'state': spec(callback['state']),
+            'changedPropIds': sorted(changed),
+        }
+
+    def call(self, callback, changed):
+        # one callback (polling background ones until they're done) -> {prop id: new value}
+        if callback.get('clientside_function'):
+            return getattr(self, callback['clientside_function']['function_name'])(callback, changed)
+        label = callback_label(callback['output'])
+        body = self.body(callback, changed)
+        response = self.request(label, 'POST', UPDATE, json=body)
+        if response is None or response.status_code != 200:
+            return {}
+        result = response.json()
+        if 'cacheKey' in result:
+            interval = ((callback.get('long') or {}).get('interval') or 1000) / 1000
+            query = {'cacheKey': result['cacheKey'], 'job': result['job']}
+            for _ in range(MAX_POLLS):
+                time.sleep(interval)
+                response = self.request(label + ' (poll)', 'POST', UPDATE, json=body, params=query)
+                if response is None or response.status_code != 200:
+                    return {}
+                result = response.json()
+                if 'response' in result:
+                    break
+            else:
+                self.record(label + ' (poll)', 0.0, 0)
+                return {}
+        updates = {}
+        for id_, props in result.get('response', {}).items():
+            for prop, value in props.items():
+                updates[f"{id_}.{prop}"] = value
+        return updates
+
+    def run(self, callbacks, changed):
+        # the renderer's loop: fire what the changed props trigger, apply the outputs, fire what those trigger.
+        # A callback waits while one of its inputs is an output of another pending callback.
+        pending = list(callbacks)
+        while pending:
+            outputs = {o: c for c in pending for o in split_outputs(c['output'])}
+            ready = [c for c in pending
+                     if not any(f"{i['id']}.{i['property']}" in outputs
+                                and outputs[f"{i['id']}.{i['property']}"] is not c for i in c['inputs'])] or pending
+            pending = [c for c in pending if c not in ready]
+            updated = set()
+            for callback in ready:
+                updates = self.call(callback, changed)
+                with self.lock:
+                    self.values.update(updates)
+                updated.update(updates)
+            changed = updated
+            pending += [c for c in self.triggered(updated) if c not in pending]
+
+    # -- clientside functions (CLIENTSIDE), same as in assets/coalesce.js --
+    def settle(self, callback, changed):
+        source, state = callback['inputs'][0], callback['state'][0]
+        target = split_outputs(callback['output'])[0]
+        value = self.values.get(f"{source['id']}.{source['property']}")
+        delay = (self.values.get(f"{state['id']}.{state['property']}") or {}).get(source['id'], 0) / 1000
+        timer = self.timers.pop(target, None)
+        if timer is not None:
+            timer.cancel()
+        if not changed or not delay:
+            return {target: value}
+        self.timers[target] = threading.Timer(delay, self.set, (target, value))
+        self.timers[target].start()
+        return {}
+
+    def session_id(self, callback, changed):
+        target = split_outputs(callback['output'])[0]
+        return {target: self.values.get(target) or uuid.uuid4().hex}
+
+    def triggered(self, changed):
+        return [c for c in self.callbacks if any(f"{i['id']}.{i['property']}" in changed for i in c['inputs'])]
+
+    def set(self, prop_id, value):
+        with self.lock:
+            self.values[prop_id] = value
+        self.run(self.triggered({prop_id}), {prop_id})
+
+    # -- user actions --
+    def think(self):
+        time.sleep(self.rng.uniform(0.5, 1.5) * self.think_seconds)
+        now = time.monotonic()
+        for id_, (interval, last) in list(self.intervals.items()):
+            if now - last >= interval:  # dcc.Interval ticks that came due meanwhile
+                self.intervals[id_] = (interval, now)
+                key = f"{id_}.n_intervals"
+                self.set(key, (self.values.get(key) or 0) + 1)
+
+    def click(self, id_):
+        key = f"{id_}.n_clicks"
+        self.set(key, (self.values.get(key) or 0) + 1)
+
+    def tick(self, id_, count=1):
+        options = option_values(self.props[id_].get('options'))
+        for i in range(count):
+            if i:
+                time.sleep(self.rng.uniform(*TICK_SECONDS))
+            ticked = list(self.values.get(f"{id_}.value") or [])
+            option = self.rng.choice(options)
+            self.set(f"{id_}.value", [o for o in ticked if o != option] if option in ticked else ticked + [option])
+
+    def drag(self, id_):
+        # one handle from where it is to a random year; intermediate values only go out with updatemode='drag'
+        props = self.props[id_]
+        low, high = props['min'], props['max']
+        value = list(self.values.get(f"{id_}.value") or [low, high])
+        handle = self.rng.randrange(2)
+        target = self.rng.randint(low, value[1]) if handle == 0 else self.rng.randint(value[0], high)
+        step = 1 if target >= value[handle] else -1
+        positions = list(range(value[handle] + step, target + step, step)) or [target]
+        if props.get('updatemode', 'mouseup') != 'drag':
+            time.sleep(DRAG_STEP_SECONDS * (len(positions) - 1))
+            positions = positions[-1:]
+        sent = []
+        for position in positions:
+            value = list(value)
+            value[handle] = position
+            sent.append(self.pool.submit(self.set, f"{id_}.value", value))  # the renderer doesn't wait either
+            if position != positions[-1]:
+                time.sleep(DRAG_STEP_SECONDS)
+        wait(sent)
+
+    def pick(self, id_):
+        self.set(f"{id_}.value", self.rng.choice(option_values(self.props[id_].get('options'))))
+
+    def play(self, script):
+        for action, *args in script:
+            if action == 'load':
+                if not self.load():
+                    return
+            else:
+                getattr(self, action)(*args)
+        for timer in list(self.timers.values()):  # debounced values still on their way
+            timer.join()
+
+
+# ---- running sessions ----
+def client_process(base, sessions, first_seed, duration, ramp, scripts, think):
+    # runs `sessions` sessions in threads until the deadline, returns the samples [(label, seconds, status)]
+    samples = []
+    deadline = time.monotonic() + duration
+    pool = ThreadPoolExecutor(max_workers=max(4, sessions * 4))
+
+    def loop(seed):
+        rng = random.Random(seed)
+        time.sleep(rng.uniform(0, ramp))
+        while time.monotonic() < deadline:
+            script = scripts[rng.choice(list(scripts))]
+            Session(base, rng, think, lambda *sample: samples.append(sample), pool).play(script)
+
+    threads = [threading.Thread(target=loop, args=(first_seed + i,)) for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pool.shutdown()
+    return samples
+
+
+def percentile(times, q):
+    # interpolated like benchmarks/callbacks.py, the lower sample's index understates p95/p99 for small levels
+    return float(np.percentile(times, q * 100)) if times else 0.0
+
+
+def summarize(samples, seconds):
+    by_label = {}
+    for label, elapsed, status in samples:
+        by_label.setdefault(label, []).append((elapsed, status))
+    labels = {}
+    for label, entries in sorted(by_label.items()):
+        times = sorted(elapsed for elapsed, _ in entries)
+        labels[label] = {
+            'requests': len(entries),
+            'errors': sum(1 for _, status in entries if status == 0 or status >= 400),
+            'p50_ms': percentile(times, 0.50) * 1000,
+            'p95_ms': percentile(times, 0.95) * 1000,
+            'p99_ms': percentile(times, 0.99) * 1000,
+        }
+    callbacks = [e for label, e in labels.items() if not label.startswith('GET ')]
+    total = sum(e['requests'] for e in labels.values())
+    return {
+        'seconds': seconds,
+        'requests_per_s': total / seconds,
+        'callbacks_per_s': sum(e['requests'] for e in callbacks) / seconds,
+        'error_rate': sum(e['errors'] for e in labels.values()) / max(total, 1),
+        'worst_callback_p99_ms': max((e['p99_ms'] for e in callbacks), default=0.0),
+        'labels': labels,
+    }
+
+
+def run_level(base, concurrency, args, scripts):
+    processes = max(1, min(args.processes, concurrency))
+    shares = [concurrency // processes + (i < concurrency % processes) for i in range(processes)]
+    seeds = itertools.accumulate([args.seed] + shares[:-1])
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(client_process, base, share, seed, args.duration, args.ramp, scripts, args.think)
+                   for share, seed in zip(shares, seeds)]
+        samples = [sample for future in futures for sample in future.result()]
+    return summarize(samples, time.perf_counter() - started)
+
+
+# ---- the server ----
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(app_dir, workers, threads, log_path):
+    # gunicorn with the build's own gunicorn.conf.py, in the current directory (Data/ is relative to it)
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(app_dir), BIND=f'127.0.0.1:{port}',
+               WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads),
+               GUNICORN_MAX_REQUESTS='0')  # no worker recycling in the middle of a measurement
+    log = open(log_path, 'w')
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', os.path.join(app_dir, 'gunicorn.conf.py'),
+                                'wsgi:server'], env=env, stdout=log, stderr=subprocess.STDOUT)
+    base = f'http://127.0.0.1:{port}/'
+    for _ in range(600):
+        if process.poll() is not None:
+            sys.exit(f"server exited, see {log_path}")
+        try:
+            if requests.get(base, timeout=5).ok:
+                return process, base
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    sys.exit(f"server didn't come up, see {log_path}")
+
+
+def revision(app_dir):
+    try:
+        return subprocess.run(['git', '-C', app_dir, 'describe', '--always', '--dirty'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---- reports ----
+def print_level(concurrency, summary, limit):
+    print(f"\n{concurrency} sessions: {summary['requests_per_s']:.1f} requests/s "
+          f"({summary['callbacks_per_s']:.1f} callbacks/s), errors {summary['error_rate']:.2%}, "
+          f"worst callback p99 {summary['worst_callback_p99_ms']:.0f} ms"
+          + (" OVER LIMIT" if summary['worst_callback_p99_ms'] > limit else ''))
+    print(f"  {'request':<52}{'count':>7}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for label, e in summary['labels'].items():
+        print(f"  {label:<52}{e['requests']:>7}{e['errors']:>8}"
+              f"{e['p50_ms']:>9.1f}{e['p95_ms']:>9.1f}{e['p99_ms']:>9.1f}")
+
+
+def capacity(levels, limit):
+    # most sessions with every callback's p99 under the limit and no errors
+    ok = [int(c) for c, s in levels.items() if s['worst_callback_p99_ms'] <= limit and not s['error_rate']]
+    return max(ok, default=None)
+
+
+def compare(old, new, limit):
+    def change(a, b):
+        return f"{(b - a) / a:+.0%}" if a else '   n/a'
+
+    print(f"old: {old.get('build')} {old.get('revision') or ''}\nnew: {new.get('build')} {new.get('revision') or ''}")
+    for concurrency in sorted(set(old['levels']) & set(new['levels']), key=int):
+        a, b = old['levels'][concurrency], new['levels'][concurrency]
+        print(f"\n{concurrency} sessions: callbacks/s {a['callbacks_per_s']:.1f} -> {b['callbacks_per_s']:.1f} "
+              f"({change(a['callbacks_per_s'], b['callbacks_per_s'])}), errors {a['error_rate']:.2%} -> "
+              f"{b['error_rate']:.2%}, worst p99 {a['worst_callback_p99_ms']:.0f} -> "
+              f"{b['worst_callback_p99_ms']:.0f} ms")
+        print(f"  {'request':<52}{'count':>13}{'p50 ms':>21}{'p99 ms':>21}")
+        for label in sorted(set(a['labels']) | set(b['labels'])):
+            x, y = a['labels'].get(label), b['labels'].get(label)
+            if x is None or y is None:
+                print(f"  {label:<52}{'only in ' + ('new' if x is None else 'old'):>13}")
+                continue
+            print(f"  {label:<52}{x['requests']:>6} ->{y['requests']:>5}"
+                  f"{x['p50_ms']:>8.1f} ->{y['p50_ms']:>6.1f} {change(x['p50_ms'], y['p50_ms']):>4}"
+                  f"{x['p99_ms']:>8.1f} ->{y['p99_ms']:>6.1f} {change(x['p99_ms'], y['p99_ms']):>4}")
+    print(f"\nsessions under the p99 limit of {limit} ms: {capacity(old['levels'], limit)} -> "
+          f"{capacity(new['levels'], limit)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent session load test of the Dash callbacks")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 5, 10, 25, 50],
+                        help="simultaneous sessions, one run per value")
+    parser.add_argument('--duration', type=float, default=30, help="seconds per concurrency level")
+    parser.add_argument('--ramp', type=float, default=2, help="sessions start spread over this many seconds")
+    parser.add_argument('--think', type=float, default=1.0, help="average pause between actions (seconds)")
+    parser.add_argument('--scripts', help="JSON file {name: [[action, id, ...], ...]} instead of the built-in ones")
+    parser.add_argument('--app-dir', default=REPO, help="checkout of the build to start")
+    parser.add_argument('--url', help="test this running server instead of starting one")
+    parser.add_argument('--workers', type=int, default=1, help="gunicorn workers of the started server")
+    parser.add_argument('--threads', type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument('--processes', type=int, default=min(4, os.cpu_count() or 1), help="client processes")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--p99-limit', type=float, default=P99_LIMIT_MS, help="ms, for the capacity line")
+    parser.add_argument('--out', help="save the results as JSON (for --compare)")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two saved results and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            compare(json.load(f), json.load(g), args.p99_limit)
+        return 0
+
+    scripts = SCRIPTS
+    if args.scripts:
+        with open(args.scripts) as f:
+            scripts = {name: [tuple(step) for step in steps] for name, steps in json.load(f).items()}
+
+    server = None
+    if args.url:
+        base = args.url.rstrip('/') + '/'
+    else:
+        # server log next to the results (or in the temp dir), not in the Data folder's directory
+        log_path = (os.path.splitext(args.out)[0] + '-server.log' if args.out
+                    else os.path.join(tempfile.gettempdir(), f'load-server-{os.getpid()}.log'))
+        server, base = start_server(args.app_dir, args.workers, args.threads, log_path)
+    try:
+        # one pass of every script first: imports, caches and background jobs (forecast fits) out of the way
+        with ThreadPoolExecutor(8) as pool:
+            warmup = Session(base, random.Random(args.seed), 0, lambda *sample: None, pool)
+            for script in scripts.values():
+                warmup.play(script)
+
+        results = {'build': args.url or os.path.abspath(args.app_dir),
+                   'revision': None if args.url else revision(args.app_dir),
+                   'workers': None if args.url else args.workers, 'levels': {}}
+        for concurrency in args.concurrency:
+            summary = run_level(base, concurrency, args, scripts)
+            results['levels'][str(concurrency)] = summary
+            print_level(concurrency, summary, args.p99_limit)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print(f"\nmost sessions with every callback's p99 under {args.p99_limit:.0f} ms: "
+          f"{capacity(results['levels'], args.p99_limit)}")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"results saved to {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+# Per-click payload of the Cases/Deaths switch on the choropleth.
+# Compares the old behaviour (server rebuilds and resends the whole map figure), a server-side
+# dash.Patch with only the changed properties, and what the app does now (clientside recolour).
+# Bytes only: the browser's render time isn't measured (see geometry_tiers.py for encode/decode time).
+# Run from the repo root: python benchmarks/map_payload.py
+import gzip
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dash import Patch
+from plotly.io.json import to_json_plotly
+
+import app
+
+MAP_ID = 'choropleth-with-hospitals'
+
+
+def response_size(figure):
+    # body of a /_dash-update-component response carrying this figure
+    body = to_json_plotly({'multi': True, 'response': {MAP_ID: {'figure': figure}}}).encode()
+    return len(body), len(gzip.compress(body))
+
+
+def metric_patch(metric):
+    style = app.map_metric_style(metric)
+    patch = Patch()
+    for key, value in style['trace'].items():
+        patch['data'][0][key] = value
+    patch['layout']['coloraxis'] = style['coloraxis']
+    if 'layers' in style:
+        patch['layout']['mapbox']['layers'] = style['layers']
+    return patch
+
+
+def main():
+    rows = []
+    for metric in app.METRICS:
+        rows.append((f'full figure ({metric})', *response_size(app.build_choropleth(metric))))
+        rows.append((f'dash.Patch ({metric})', *response_size(metric_patch(metric))))
+    styles = to_json_plotly(app.map_metric_styles()).encode()
+    rows.append(('clientside, per click', 0, 0))
+    rows.append(('clientside, map-styles store (once per page)', len(styles), len(gzip.compress(styles))))
+
+    print(f"{'payload':<48}{'bytes':>12}{'gzip':>12}")
+    for name, raw, packed in rows:
+        print(f"{name:<48}{raw:>12,}{packed:>12,}")
+
+
+if __name__ == '__main__':
+    main()
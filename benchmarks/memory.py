@@ -0,0 +1,72 @@
+# Memory of the case / facility tables with pandas defaults (straight from the CSVs) against the typed schema of
+# the bundle (schema.py), plus the cost of the region/year filter + groupby the callbacks used to run.
+# --municipalities N also blows the cases table up to N regions (each real region's rows copied with noise),
+# roughly what municipality-level data would look like. Run from the repo root:
+#   python benchmarks/memory.py [--data-dir Data --municipalities 1600]
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from build_bundle import SOURCES
+from schema import memory_report, to_table
+
+
+def municipalities(cases, n):
+    # n pseudo-municipalities, each a copy of one real region's rows with different counts
+    regions = cases['Region'].unique()
+    rng = np.random.default_rng(0)
+    parts = []
+    for i in range(n):
+        part = cases[cases['Region'] == regions[i % len(regions)]].copy()
+        part['Region'] = f"{regions[i % len(regions)]} {i:04d}"
+        part['Dengue_Cases'] = rng.poisson(part['Dengue_Cases'].to_numpy() / 20)
+        part['Dengue_Deaths'] = rng.poisson(part['Dengue_Deaths'].to_numpy() / 20)
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+
+def filter_ms(cases, repeat=5):
+    # a quarter of the regions over three years, grouped like the stacked bar callback did
+    regions = list(pd.unique(cases['Region']))[::4]
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        selected = cases[cases['Region'].isin(regions) & cases['Year'].between(2017, 2019)]
+        selected.groupby(['Region', 'Year'], observed=True)[['Dengue_Cases', 'Dengue_Deaths']].sum()
+        times.append(time.perf_counter() - started)
+    return min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Table memory with pandas defaults against the typed schema")
+    parser.add_argument('--data-dir', default='Data')
+    parser.add_argument('--municipalities', type=int, default=1600)
+    args = parser.parse_args()
+
+    raw = {name: pd.read_csv(os.path.join(args.data_dir, SOURCES[name]))
+           for name in ('cases', 'hospitals', 'hospitals_per_island')}
+    datasets = {'': raw}
+    if args.municipalities:
+        datasets[f' ({args.municipalities:,} municipalities)'] = {'cases': municipalities(raw['cases'], args.municipalities)}
+
+    for suffix, frames in datasets.items():
+        # what the app gets from the bundle
+        typed = {name: to_table(frame, name).to_pandas(date_as_object=False) for name, frame in frames.items()}
+        print(f"pandas defaults{suffix}")
+        print(memory_report(frames))
+        print(f"typed schema{suffix}")
+        print(memory_report(typed))
+        before = sum(frame.memory_usage(deep=True).sum() for frame in frames.values())
+        after = sum(frame.memory_usage(deep=True).sum() for frame in typed.values())
+        print(f"total {before / 1e6:.2f} MB -> {after / 1e6:.2f} MB ({after / before:.0%}), region/year filter + "
+              f"groupby {filter_ms(frames['cases']):.1f} ms -> {filter_ms(typed['cases']):.1f} ms\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# Per-worker memory of the gunicorn deployment, memory-mapped bundle vs private copies.
+# Starts `gunicorn -c gunicorn.conf.py wsgi:server` for each worker count and mode, loads the page once
+# per worker, then reads RSS / PSS / USS of every worker (Linux, needs psutil).
+#   python benchmarks/memory_report.py --workers 1 2 4 8
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+import psutil
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 8765
+
+
+def wait_until_up(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not come up")
+
+
+def measure(n_workers, mmap, preload):
+    env = dict(os.environ, WEB_CONCURRENCY=str(n_workers), GUNICORN_THREADS='1', BIND=f'127.0.0.1:{PORT}',
+               DATA_MMAP='1' if mmap else '0', GUNICORN_PRELOAD='1' if preload else '0')
+    master = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:server'],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base = f'http://127.0.0.1:{PORT}'
+        wait_until_up(base + '/')
+        # hit every worker a few times so each one has built its layout/figures
+        for _ in range(4 * n_workers):
+            urllib.request.urlopen(base + '/_dash-layout').read()
+        time.sleep(0.5)
+        workers = psutil.Process(master.pid).children()
+        infos = [w.memory_full_info() for w in workers]
+        mb = 1024 * 1024
+        return {
+            'workers': len(infos),
+            'rss': sum(i.rss for i in infos) / len(infos) / mb,
+            'pss': sum(i.pss for i in infos) / len(infos) / mb,
+            'uss': sum(i.uss for i in infos) / len(infos) / mb,
+            'total_pss': sum(i.pss for i in infos) / mb,
+        }
+    finally:
+        master.terminate()
+        master.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    modes = [('copies, no preload', False, False), ('mmap + preload', True, True)]
+    print(f"{'mode':<22}{'workers':>8}{'RSS/worker':>12}{'PSS/worker':>12}{'USS/worker':>12}{'total PSS':>11}  (MB)")
+    for name, mmap, preload in modes:
+        for n in args.workers:
+            m = measure(n, mmap, preload)
+            print(f"{name:<22}{m['workers']:>8}{m['rss']:>12.1f}{m['pss']:>12.1f}{m['uss']:>12.1f}{m['total_pss']:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# Time of the outbreak signals (outbreaks.py) on synthetic weekly series: a full computation for every region, and
+# the incremental update when one more week arrives. Run from the repo root:
+#   python benchmarks/outbreaks.py [--regions 3000 --weeks 520]
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from outbreaks import OutbreakSignals, update_signals
+
+
+def best(func, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - started)
+    return result, min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Outbreak signal computation time")
+    parser.add_argument('--regions', type=int, default=3000)
+    parser.add_argument('--weeks', type=int, default=520)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # seasonal Poisson counts, a different size per region
+    rng = np.random.default_rng(0)
+    season = 50 + 30 * np.sin(np.arange(args.weeks) * 2 * np.pi / 52)
+    counts = rng.poisson(season[:, None] * rng.uniform(0.2, 3, (1, args.regions)))
+    keys = range(args.regions)
+
+    signals, full_ms = best(lambda: OutbreakSignals(keys, counts, season=52), args.repeat)
+    previous = OutbreakSignals(keys, counts[:-1], season=52)
+    _, extend_ms = best(lambda: update_signals(previous, keys, counts, season=52), args.repeat)
+    print(f"{args.regions:,} regions x {args.weeks} weeks ({args.regions * args.weeks:,} cells)")
+    print(f"  full computation      {full_ms:8.1f} ms")
+    print(f"  one more week         {extend_ms:8.1f} ms")
+    print(f"  alerts                {(signals.alerts > 0).mean():8.1%} of region-weeks")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# Size and encode time of the callback payloads: the old encoding (every number written out as decimal text)
+# against what the app sends now (plotly.js typed arrays). Both go through the same JSON encoder, so the
+# numbers are about the typed arrays alone; the encoders (stdlib json, orjson when it's installed) get their own
+# columns.
+# Run from the repo root: python benchmarks/payload_encoding.py [--repeat 20]
+import argparse
+import base64
+import gzip
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from plotly.io.json import to_json_plotly
+
+import app
+from hospital_index import viewport
+
+
+def decimal_arrays(value):
+    # typed arrays back to plain NumPy arrays, i.e. the payload as it was encoded before
+    if isinstance(value, dict):
+        if set(value) == {'dtype', 'bdata'}:
+            return np.frombuffer(base64.b64decode(value['bdata']), dtype=value['dtype'])
+        return {k: decimal_arrays(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decimal_arrays(v) for v in value]
+    return value
+
+
+def payloads():
+    regions = list(app.cube.regions)
+    first, last = int(app.cube.first_year), int(app.cube.last_year)
+    yield 'total per year line', app.build_total_per_year_graph()
+    for metric in app.METRICS:
+        yield f'pie ({metric})', app.build_pie_chart(metric)
+        yield f'choropleth + hospitals ({metric})', app.build_choropleth(metric)
+    yield 'map-styles store', app.map_metric_styles()
+    yield 'stacked bar, all regions', app.update_stacked_bar(regions, [first, last])
+    yield 'region line, one region', app.update_specific_region_graph(regions[0], [first, last])
+    for zoom in (7, 13):
+        markers = app.hospital_markers(*viewport({'mapbox.zoom': zoom}, app.MAP_CENTER, zoom, app.MAP_WIDTH, app.MAP_HEIGHT))
+        yield f'hospital markers, zoom {zoom}', {
+            'lat': app.typed_array(markers['lat']),
+            'lon': app.typed_array(markers['lon']),
+            'text': markers['text'].tolist(),
+            'size': app.typed_array(markers['marker_size']),
+        }
+
+
+def encode(value, engine, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        body = to_json_plotly(value, engine=engine).encode()
+    return body, (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Payload size / encode time, decimal JSON vs typed arrays")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    engines = ['json']
+    try:
+        import orjson  # noqa: F401
+        engines.append('orjson')
+    except ImportError:
+        print("orjson not installed, only the stdlib json encoder is timed")
+
+    header = ''.join(f"{f'{engine} ms':>16}{'':>8}" for engine in engines)
+    print(f"{'':<36}{'decimal':>22}{'typed arrays':>22}{header}")
+    print(f"{'payload':<36}{'bytes':>12}{'gzip':>10}{'bytes':>12}{'gzip':>10}" + f"{'decimal':>16}{'typed':>8}" * len(engines))
+    for name, payload in payloads():
+        old, new = decimal_arrays(payload), payload
+        line = f"{name:<36}"
+        for value in (old, new):
+            body = to_json_plotly(value, engine='json').encode()
+            line += f"{len(body):>12,}{len(gzip.compress(body)):>10,}"
+        for engine in engines:
+            line += f"{encode(old, engine, args.repeat)[1]:>16.2f}{encode(new, engine, args.repeat)[1]:>8.2f}"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+# Time of the hospital -> region spatial join (spatial_join.RegionLocator) for growing numbers of facilities:
+# the real registry resampled with some jitter up to --sizes, against the finest region outlines.
+# Run from the repo root: python benchmarks/spatial_join.py [--sizes 5000 20000 100000]
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from data_bundle import load_bundle
+from spatial_join import RegionLocator
+from vector_tiles import region_shapes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hospital -> region spatial join time")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5_000, 20_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    bundle = load_bundle()
+    shapes = region_shapes(bundle.region_geojson(len(bundle.geometry_tiers) - 1))
+    hospitals = bundle.frame('hospitals')
+    rng = np.random.default_rng(0)
+
+    started = time.perf_counter()
+    locator = RegionLocator(shapes)
+    print(f"STRtree over {len(shapes)} regions: {(time.perf_counter() - started) * 1000:.1f} ms")
+    print(f"{'facilities':>12}{'ms':>10}{'outside':>10}")
+    for size in args.sizes:
+        rows = rng.integers(0, len(hospitals), size)
+        lat = hospitals['lat'].to_numpy()[rows] + rng.normal(0, 0.01, size)
+        lon = hospitals['lon'].to_numpy()[rows] + rng.normal(0, 0.01, size)
+        times = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            region = locator.locate(lat, lon)
+            times.append(time.perf_counter() - started)
+        print(f"{size:>12,}{min(times) * 1000:>10.1f}{int((region < 0).sum()):>10,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+# Compile the raw files in Data/ into a versioned bundle the app can load quickly:
+# typed Arrow tables (see schema.py), pre-simplified region geometry (GeoJSON + WKB) and a manifest with content hashes.
+# This is the only place that needs geopandas, the app itself just reads the bundle.
+#
+#   python build_bundle.py            (reads Data/, writes Data/bundle/)
+import argparse
+import json
+import os
+import time
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+import pyarrow.feather as feather
+
+from cube import RegionCube
+from data_bundle import BUNDLE_FORMAT, DEFAULT_BUNDLE_DIR, set_current
+from data_version import content_hash, mapping_hash
+from schema import to_table
+
+# Region geometry level-of-detail pyramid: simplification tolerance (degrees) per tier, coarsest first.
+# Coordinates in each tier are rounded to about a tenth of its tolerance.
+GEOMETRY_TIERS = [0.05, 0.01, 0.002, 0.0005]
+
+# raw source files (relative to the data directory)
+SOURCES = {
+    'cases': 'df_improved.csv',
+    'hospitals': 'hospitals_and_clinics-original.csv',  # full facility registry
+    'hospitals_per_island': 'hospitals_per_island.csv',
+    'regions': 'total_cases_and_deaths_with_region/total_cases_and_deaths_with_region.shp',
+}
+REGION_SIDECARS = ['.dbf', '.shx', '.prj', '.cpg']
+
+def source_files(data_dir):
+    files = [os.path.join(data_dir, path) for path in SOURCES.values()]
+    shp = os.path.join(data_dir, SOURCES['regions'])
+    files += [os.path.splitext(shp)[0] + ext for ext in REGION_SIDECARS if os.path.exists(os.path.splitext(shp)[0] + ext)]
+    return files
+
+
+def write_table(table, path):
+    # uncompressed Arrow IPC so the file can be memory-mapped as is
+    feather.write_feather(table, path, compression='uncompressed')
+
+
+def load_regions(data_dir):
+    regions = gpd.read_file(os.path.join(data_dir, SOURCES['regions']))
+    regions.set_crs(epsg=4326, inplace=True, allow_override=True)
+    return regions
+
+
+def tier_decimals(tolerance):
+    return int(np.ceil(-np.log10(tolerance))) + 1
+
+
+def simplify_tier(geometry, tolerance):
+    # coverage simplification keeps the borders shared between neighbouring regions identical
+    # (no gaps/overlaps); older GEOS without it falls back to per-polygon simplification
+    if hasattr(shapely, 'coverage_simplify'):
+        simplified = shapely.coverage_simplify(geometry, tolerance)
+    else:
+        simplified = shapely.simplify(geometry, tolerance, preserve_topology=True)
+    decimals = tier_decimals(tolerance)
+    return shapely.transform(simplified, lambda coords: np.round(coords, decimals))
+
+
+def geojson_bytes(regions, geometry):
+    tier = gpd.GeoDataFrame(regions.drop(columns='geometry'), geometry=geometry, crs=regions.crs)
+    return json.dumps(tier.__geo_interface__, separators=(',', ':')).encode()
+
+
+def build(data_dir='Data', bundle_dir=None):
+    bundle_dir = bundle_dir or os.path.join(data_dir, DEFAULT_BUNDLE_DIR)
+    started = time.perf_counter()
+
+    tables = {
+        'cases': to_table(pd.read_csv(os.path.join(data_dir, SOURCES['cases'])), 'cases'),
+        'hospitals': to_table(pd.read_csv(os.path.join(data_dir, SOURCES['hospitals'])), 'hospitals'),
+        'hospitals_per_island': to_table(pd.read_csv(os.path.join(data_dir, SOURCES['hospitals_per_island'])), 'hospitals_per_island'),
+    }
+    regions = load_regions(data_dir)
+    raw_geometry = regions.geometry.to_numpy()
+    tier_geometry = [simplify_tier(raw_geometry, tolerance) for tolerance in GEOMETRY_TIERS]
+    region_table = pd.DataFrame(regions.drop(columns='geometry'))
+    region_table['geometry'] = shapely.to_wkb(tier_geometry[-1])  # finest tier, for point-in-polygon work
+    tables['regions'] = to_table(region_table, 'regions')
+
+    # the version is a hash of the source files and build settings, so rebuilding unchanged data gives the same bundle
+    sources = {os.path.relpath(path, data_dir).replace(os.sep, '/'): content_hash([path]) for path in source_files(data_dir)}
+    version = mapping_hash({'format': BUNDLE_FORMAT, 'geometry_tiers': GEOMETRY_TIERS, 'sources': sources})
+    version_dir = os.path.join(bundle_dir, version)
+    os.makedirs(version_dir, exist_ok=True)
+
+    files = {}
+    for name, table in tables.items():
+        path = os.path.join(version_dir, f'{name}.arrow')
+        write_table(table, path)
+        files[f'{name}.arrow'] = content_hash([path])
+    tiers = []
+    for i, (tolerance, geometry) in enumerate(zip(GEOMETRY_TIERS, tier_geometry)):
+        name = f'regions-{i}.geojson'
+        data = geojson_bytes(regions, geometry)
+        with open(os.path.join(version_dir, name), 'wb') as f:
+            f.write(data)
+        files[name] = content_hash([os.path.join(version_dir, name)])
+        tiers.append({
+            'file': name,
+            'tolerance': tolerance,
+            'decimals': tier_decimals(tolerance),
+            'vertices': int(shapely.get_num_coordinates(geometry).sum()),
+            'bytes': len(data),
+        })
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'version': version,
+        'built_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'geometry_tiers': tiers,
+        'sources': sources,
+        'files': files,
+        'rows': {name: table.num_rows for name, table in tables.items()},
+    }
+    # aggregate cube, stored as .npy so the app can memory-map it
+    RegionCube(tables['cases'].to_pandas()).save(version_dir)
+    for name in sorted(os.listdir(version_dir)):
+        if name.startswith('cube'):
+            files[name] = content_hash([os.path.join(version_dir, name)])
+
+    with open(os.path.join(version_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    set_current(bundle_dir, version)
+
+    print(f"bundle {version} written to {version_dir} in {time.perf_counter() - started:.2f}s")
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compile Data/ into the bundle the dashboard loads at startup")
+    parser.add_argument('--data-dir', default='Data')
+    parser.add_argument('--bundle-dir', default=None, help="defaults to <data-dir>/bundle")
+    args = parser.parse_args()
+    build(args.data_dir, args.bundle_dir)
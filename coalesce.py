@@ -0,0 +1,78 @@
+# Latest-wins for callbacks a user can fire faster than they're answered (checklist ticks, slider keys, map pans).
+# Calls are grouped per browser tab (the session-id store, set by assets/coalesce.js) and callback: one runs at a
+# time, a call still waiting when a newer one from the same tab arrives is answered with an empty 204
+# (PreventUpdate) right away instead of being computed, and so is a finished one that got overtaken meanwhile.
+# The renderer only keeps the newest result anyway. Per process: with several gunicorn workers a tab's requests
+# mostly stay on one worker (keep-alive connection), the ones that don't are simply not coalesced.
+import functools
+import inspect
+import threading
+
+from dash.exceptions import PreventUpdate
+
+
+class _Slot:
+    __slots__ = ('latest', 'users', 'running')
+
+    def __init__(self):
+        self.latest = 0  # number of the newest call
+        self.users = 0  # calls running or waiting, the slot goes away at 0
+        self.running = False
+
+
+class Coalescer:
+    def __init__(self):
+        self._changed = threading.Condition()  # a call came in or finished
+        self._slots = {}  # (session, callback) -> _Slot
+        self.superseded = 0  # calls skipped because a newer one came in
+
+    def latest(self, func):
+        # decorator, func takes a `session` argument (the tab's id; None: run as usual, e.g. export_static.py)
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            session = signature.bind(*args, **kwargs).arguments.get('session')
+            if session is None:
+                return func(*args, **kwargs)
+            return self.run((session, func.__qualname__), lambda: func(*args, **kwargs))
+
+        return wrapper
+
+    def run(self, key, call):
+        with self._changed:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = _Slot()
+            slot.latest += 1
+            number = slot.latest
+            slot.users += 1
+            # an older call of the tab that is still waiting gives up right away, so a tab never holds more than
+            # one waiting server thread
+            self._changed.notify_all()
+            while slot.running and slot.latest == number:
+                self._changed.wait()
+            overtaken = slot.latest != number
+            slot.running = slot.running or not overtaken
+        try:
+            if overtaken:
+                self._skip()
+            try:
+                result = call()
+            finally:
+                with self._changed:
+                    slot.running = False
+                    self._changed.notify_all()
+            if slot.latest != number:  # overtaken while computing, don't send a result nobody shows
+                self._skip()
+            return result
+        finally:
+            with self._changed:
+                slot.users -= 1
+                if not slot.users:
+                    del self._slots[key]
+
+    def _skip(self):
+        with self._changed:
+            self.superseded += 1
+        raise PreventUpdate
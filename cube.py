@@ -0,0 +1,151 @@
+# Region x Year x Month aggregate cube
+# Built once at load time so the callbacks can answer "which regions, which years"
+# with array slicing instead of filtering + grouping the whole dataframe every time.
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+VALUES = ['Dengue_Cases', 'Dengue_Deaths']
+
+
+# arrays written by save() (the rest is recomputed or kept in cube.json)
+ARRAYS = ['data', 'rows', 'yearly', 'yearly_rows', 'prefix']
+
+
+class RegionCube:
+    def __init__(self, df, values=VALUES):
+        self.values = list(values)
+        self._set_axes(sorted(df['Region'].unique()), int(df['Year'].min()), int(df['Year'].max()))
+        island = df.groupby('Region', observed=True)['Island'].first()
+        self.islands = np.array([island[region] for region in self.regions], dtype=object)  # island of each region
+
+        region_idx = pd.Categorical(df['Region'], categories=self.regions).codes
+        year_idx = df['Year'].to_numpy() - self.first_year
+        month_idx = pd.to_datetime(df['Date']).dt.month.to_numpy() - 1
+
+        # data[region, year, month, value], rows[...] counts how many rows fed each cell
+        shape = (len(self.regions), len(self.years), 12)
+        self.data = np.zeros(shape + (len(self.values),), dtype=np.int64)
+        self.rows = np.zeros(shape, dtype=np.int64)
+        np.add.at(self.data, (region_idx, year_idx, month_idx), df[self.values].to_numpy(dtype=np.int64))
+        np.add.at(self.rows, (region_idx, year_idx, month_idx), 1)
+
+        # Yearly totals and prefix sums along the flattened time axis (year*12 + month)
+        self.yearly = self.data.sum(axis=2)
+        self.yearly_rows = self.rows.sum(axis=2)
+        monthly = self.data.reshape(len(self.regions), -1, len(self.values))
+        self.prefix = np.zeros((len(self.regions), monthly.shape[1] + 1, len(self.values)), dtype=np.int64)
+        np.cumsum(monthly, axis=1, out=self.prefix[:, 1:])
+
+    def _set_axes(self, regions, first_year, last_year):
+        self.regions = np.array(regions, dtype=object)  # sorted like groupby
+        self.region_pos = {region: i for i, region in enumerate(self.regions)}
+        self.first_year = first_year
+        self.last_year = last_year
+        self.years = np.arange(self.first_year, self.last_year + 1)
+
+    # ---- persistence (the bundle stores the cube so workers can memory-map it) ----
+    def save(self, directory):
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f'cube-{name}.npy'), getattr(self, name))
+        with open(os.path.join(directory, 'cube.json'), 'w') as f:
+            json.dump({'values': self.values, 'regions': list(self.regions), 'islands': list(self.islands),
+                       'first_year': self.first_year, 'last_year': self.last_year}, f)
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        # mmap_mode='r' shares the arrays' pages between every process that loads the same file
+        with open(os.path.join(directory, 'cube.json')) as f:
+            meta = json.load(f)
+        cube = cls.__new__(cls)
+        cube.values = meta['values']
+        cube._set_axes(meta['regions'], meta['first_year'], meta['last_year'])
+        cube.islands = np.array(meta['islands'], dtype=object)
+        for name in ARRAYS:
+            setattr(cube, name, np.load(os.path.join(directory, f'cube-{name}.npy'), mmap_mode=mmap_mode))
+        return cube
+
+    # ---- index helpers ----
+    def region_indices(self, regions):
+        # unknown regions are dropped, result is in sorted (groupby) order
+        return np.array(sorted(self.region_pos[r] for r in set(regions) if r in self.region_pos), dtype=np.intp)
+
+    def year_slice(self, first, last):
+        first = max(int(first), self.first_year)
+        last = min(int(last), self.last_year)
+        return slice(first - self.first_year, last - self.first_year + 1)
+
+    def dates(self, first, last):
+        years = self.years[self.year_slice(first, last)]
+        return np.array([f"{year}-{month:02d}-01" for year in years for month in range(1, 13)], dtype=object)
+
+    # ---- queries ----
+    def totals(self, regions, first, last):
+        # total per selected region over [first, last] using the prefix sums -> (n_regions, n_values)
+        idx = self.region_indices(regions)
+        years = self.year_slice(first, last)
+        if years.start >= years.stop:
+            return idx, np.zeros((len(idx), len(self.values)), dtype=np.int64)
+        return idx, self.prefix[idx, years.stop * 12] - self.prefix[idx, years.start * 12]
+
+    def month_index(self, dates):
+        # 'YYYY-MM-DD' dates (as in dates()) -> positions on the flattened time axis (year*12 + month)
+        months = np.asarray(dates, dtype='datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        return months - (self.first_year - 1970) * 12
+
+    def series(self, name):
+        # one value per month and region, time-major (n_months, n_regions), up to the last month with any data
+        rows = self.rows.reshape(len(self.regions), -1).sum(axis=0)
+        n_months = int(np.flatnonzero(rows)[-1]) + 1 if rows.any() else 0
+        monthly = self.data.reshape(len(self.regions), -1, len(self.values))
+        return self.column(monthly, name)[:, :n_months].T
+
+    def grand_totals(self):
+        # every value summed over all regions and months -> (n_values,)
+        return self.prefix[:, -1].sum(axis=0)
+
+    # ---- incremental updates (new case reports, see ingest.py) ----
+    def add(self, regions, years, months, values):
+        # new cube with rows added: region names, years, months (1..12) and values (n, n_values). The year axis grows
+        # as needed and the prefix sums are only redone from the first month that changed, so adding the latest
+        # month costs about one copy of the arrays. Rows for unknown regions raise KeyError.
+        region_idx = np.array([self.region_pos[region] for region in regions], dtype=np.intp)
+        years = np.asarray(years, dtype=np.int64)
+        months = np.asarray(months, dtype=np.int64) - 1
+        values = np.asarray(values, dtype=np.int64).reshape(len(region_idx), len(self.values))
+        first = min(self.first_year, int(years.min()))
+        last = max(self.last_year, int(years.max()))
+        before, after = self.first_year - first, last - self.last_year
+
+        cube = RegionCube.__new__(RegionCube)
+        cube.values = self.values
+        cube._set_axes(self.regions, first, last)
+        cube.islands = self.islands
+
+        def grow(array):
+            # copy with the new years added on the year axis (axis 1)
+            padding = [(0, 0)] * array.ndim
+            padding[1] = (before, after)
+            return np.pad(array, padding)
+
+        year_idx = years - first
+        cube.data, cube.rows = grow(self.data), grow(self.rows)
+        cube.yearly, cube.yearly_rows = grow(self.yearly), grow(self.yearly_rows)
+        np.add.at(cube.data, (region_idx, year_idx, months), values)
+        np.add.at(cube.rows, (region_idx, year_idx, months), 1)
+        np.add.at(cube.yearly, (region_idx, year_idx), values)
+        np.add.at(cube.yearly_rows, (region_idx, year_idx), 1)
+
+        monthly = cube.data.reshape(len(self.regions), -1, len(self.values))
+        cube.prefix = np.zeros((len(self.regions), monthly.shape[1] + 1, len(self.values)), dtype=np.int64)
+        start = 0 if before else int((year_idx * 12 + months).min())
+        cube.prefix[:, :start + 1] = self.prefix[:, :start + 1]
+        np.cumsum(monthly[:, start:], axis=1, out=cube.prefix[:, start + 1:])
+        cube.prefix[:, start + 1:] += cube.prefix[:, start:start + 1]
+        return cube
+
+    def column(self, values, name):
+        # pick one value column out of a (..., n_values) result
+        return values[..., self.values.index(name)]
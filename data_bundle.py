@@ -0,0 +1,88 @@
+# Load the preprocessed data bundle written by build_bundle.py.
+# Only needs pyarrow + pandas, no geopandas/shapefile parsing in the serving process.
+import json
+import os
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from cube import RegionCube
+from data_version import mapping_hash
+
+BUNDLE_FORMAT = 5
+DEFAULT_BUNDLE_DIR = 'bundle'
+CURRENT_FILE = 'current.json'
+
+
+class BundleError(RuntimeError):
+    pass
+
+
+# Memory-map the bundle files by default: every worker process reading the same bundle then shares
+# the same physical pages (page cache) instead of holding its own copy. DATA_MMAP=0 reads private copies.
+MEMORY_MAP = os.environ.get('DATA_MMAP', '1') != '0'
+
+
+class DataBundle:
+    def __init__(self, path, manifest, memory_map=MEMORY_MAP):
+        self.path = path
+        self.manifest = manifest
+        self.version = manifest['version']
+        self.memory_map = memory_map
+
+    def table(self, name):
+        # a table can come in parts: the built table plus the case reports added later (ingest.py)
+        parts = self.manifest.get('parts', {}).get(name, [f'{name}.arrow'])
+        tables = [feather.read_table(os.path.join(self.path, part), memory_map=self.memory_map) for part in parts]
+        return tables[0] if len(tables) == 1 else pa.concat_tables(tables)
+
+    def frame(self, name):
+        # split_blocks lets numeric columns point straight at the (mapped) Arrow buffers instead of copying;
+        # dates come out as datetime64 (not datetime.date objects), labels as categoricals (schema.py)
+        return self.table(name).to_pandas(split_blocks=self.memory_map, date_as_object=False)
+
+    def cube(self):
+        return RegionCube.load(self.path, mmap_mode='r' if self.memory_map else None)
+
+    def files_key(self, names):
+        # hash of the given files' contents: state derived only from them can be kept across versions with the same key
+        return mapping_hash({name: self.manifest['files'][name] for name in sorted(names)})
+
+    @property
+    def geometry_key(self):
+        return self.files_key(tier['file'] for tier in self.geometry_tiers)
+
+    @property
+    def geometry_tiers(self):
+        # coarsest first, see GEOMETRY_TIERS in build_bundle.py
+        return self.manifest['geometry_tiers']
+
+    def region_geojson(self, tier=0):
+        with open(os.path.join(self.path, self.geometry_tiers[tier]['file']), 'rb') as f:
+            return json.load(f)
+
+
+def current_version(bundle_dir):
+    try:
+        with open(os.path.join(bundle_dir, CURRENT_FILE)) as f:
+            return json.load(f)['version']
+    except FileNotFoundError:
+        raise BundleError(f"No data bundle in {bundle_dir!r}, run `python build_bundle.py` first") from None
+
+
+def set_current(bundle_dir, version):
+    # point the app at a version (atomic rename so a reader never sees half a file)
+    pointer = os.path.join(bundle_dir, CURRENT_FILE)
+    with open(pointer + f'.{os.getpid()}.tmp', 'w') as f:
+        json.dump({'version': version}, f)
+    os.replace(pointer + f'.{os.getpid()}.tmp', pointer)
+
+
+def load_bundle(bundle_dir=os.path.join('Data', DEFAULT_BUNDLE_DIR), version=None, memory_map=MEMORY_MAP):
+    version = version or current_version(bundle_dir)
+    path = os.path.join(bundle_dir, version)
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise BundleError(f"Bundle {version} has format {manifest.get('format')}, expected {BUNDLE_FORMAT}; rebuild it")
+    return DataBundle(path, manifest, memory_map)
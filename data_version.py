@@ -0,0 +1,64 @@
+# Data version token: a short content hash of the files the app reads.
+# Anything cached per dataset (figures, aggregates) should include this in its key
+# so a changed data file can never serve stale results.
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def content_hash(paths, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def mapping_hash(mapping):
+    # hash of a small JSON-able dict, e.g. {file name: content hash}
+    return hashlib.sha256(json.dumps(mapping, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class VersionWatcher:
+    # Polls read_version() in a background thread and calls on_change(new_version) when it changes.
+    # One thread per process (gunicorn forks after import, so start() is called again in each worker).
+    # initial is the version the process already has loaded: if the pointer has moved on by the first check
+    # (a forked worker, an ingest between import and start), that check loads the new one. Without it the
+    # first check only records the version.
+    def __init__(self, read_version, on_change, interval=5.0, initial=None):
+        self.read_version = read_version
+        self.on_change = on_change
+        self.interval = interval
+        self.version = initial
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def check(self):
+        try:
+            version = self.read_version()
+        except (OSError, ValueError, KeyError):
+            return self.version  # pointer being rewritten or missing, try again next time
+        with self._lock:
+            if version == self.version:
+                return version
+            previous, self.version = self.version, version
+        if previous is not None:
+            self.on_change(version)
+        return version
+
+    def start(self):
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self.check()
+        thread = threading.Thread(target=self._run, name='data-version-watcher', daemon=True)
+        thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.check()
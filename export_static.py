@@ -0,0 +1,187 @@
+# Export the dashboard as a static site (no Python process needed: open index.html, or put the folder on a CDN).
+# Every figure state the callbacks can reach is rendered once by the app's own callbacks and written out as JSON,
+# next to small lookup tables (yearly/monthly totals per region). static_export/dashboard.js shows the
+# pre-rendered figure for a state when there is one and builds the rest from the lookup tables.
+# Everything is written as small scripts (tables.js, figures/*.js) so the page also works from file://.
+#
+#   python export_static.py                       (everything, into static_site/)
+#   python export_static.py --top-k 200 --request-log requests.jsonl
+#       only pre-render the 200 most requested stacked bar / region line states from a log written by the
+#       running app (DASH_METRICS=1 DASH_REQUEST_LOG=requests.jsonl), the rest comes from the lookup tables
+#
+# The stacked bar's region checklist allows 2^17 subsets, so the full export pre-renders all regions and every
+# single region for each year range; other subsets are built in the browser. The map keeps its initial
+# hospital clusters (no server to re-cluster on zoom) and needs internet for the dark base map tiles.
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import time
+from collections import Counter
+
+import numpy as np
+import plotly
+from plotly.io.json import to_json_plotly
+
+os.environ['MAP_SOURCE'] = 'geojson'  # no tile server behind a static site, the map carries its outlines
+import app  # noqa: E402
+from figures import template  # noqa: E402
+from outbreaks import alert_text  # noqa: E402
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static_export')
+PLOTLY_JS = os.path.join(os.path.dirname(plotly.__file__), 'package_data', 'plotly.min.js')
+
+
+# ---- figure states ----
+def year_ranges():
+    years = range(int(app.cube.first_year), int(app.cube.last_year) + 1)
+    return [[first, last] for first, last in itertools.combinations_with_replacement(years, 2)]
+
+
+def stacked_regions(regions):
+    # the checklist's regions as they go in the key: click order only matters while the title lists them
+    # (3 or fewer, see update_stacked_bar), after that the figure is the same for any order, so sorted (cube order)
+    return list(regions) if len(regions) <= 3 else sorted(regions)
+
+
+def state_key(callback, args):
+    # same key as dashboard.js builds for the state, None for callbacks that aren't exported per state
+    if callback == 'update_stacked_bar':
+        regions, years = args[:2]
+        if regions:
+            return f"stacked/{'|'.join(stacked_regions(regions))}/{years[0]}-{years[1]}"
+    elif callback == 'update_specific_region_graph':
+        region, years = args[:2]  # no forecasts in the static site
+        if region:
+            return f"specific/{region}/{years[0]}-{years[1]}"
+    return None
+
+
+CALLBACKS = {
+    'update_stacked_bar': app.update_stacked_bar,
+    'update_specific_region_graph': app.update_specific_region_graph,
+}
+
+
+def all_states():
+    regions = list(app.cube.regions)
+    for years in year_ranges():
+        yield 'update_stacked_bar', (regions, years)
+        for region in regions:
+            yield 'update_stacked_bar', ([region], years)
+            yield 'update_specific_region_graph', (region, years)
+
+
+def requested_states(request_log, top_k):
+    # the top_k most frequent exportable states in the request log
+    counts = Counter()
+    calls = {}
+    with open(request_log) as f:
+        for line in f:
+            entry = json.loads(line)
+            key = state_key(entry['callback'], entry['args'])
+            if key is not None:
+                counts[key] += 1
+                calls[key] = (entry['callback'], tuple(entry['args'][:2]))
+    return [calls[key] for key, _ in counts.most_common(top_k)]
+
+
+# ---- lookup tables for dashboard.js ----
+def without_template(figure):
+    # the shared template goes out once in tables.js instead of with every figure (dashboard.js puts it back)
+    if figure['layout'].get('template') != template():
+        return figure
+    return {'data': figure['data'], 'layout': {k: v for k, v in figure['layout'].items() if k != 'template'}}
+
+
+def prototype(figure):
+    # a real callback output with the data taken out, dashboard.js fills in x/y(/customdata)/title
+    return without_template({
+        'data': [{k: v for k, v in trace.items() if k not in ('x', 'y', 'customdata')} for trace in figure['data']],
+        'layout': figure['layout'],
+    })
+
+
+def tables():
+    cube = app.cube
+    regions = list(cube.regions)
+    years = [int(cube.first_year), int(cube.last_year)]
+    sample = regions[:1]
+    # outbreak signals over every month of the cube (NaN / no alert after the last month with data)
+    outbreak_baseline = np.full((len(regions), cube.data.shape[1] * 12), np.nan)
+    outbreak_alerts = np.zeros(outbreak_baseline.shape, dtype=np.uint8)
+    outbreak_baseline[:, :app.outbreaks.n_periods] = app.outbreaks.baseline.T
+    outbreak_alerts[:, :app.outbreaks.n_periods] = app.outbreaks.alerts.T
+    return {
+        'title': app.dashboard_title(),  # with the years in the data
+        'regions': regions,  # cube order (sorted), the order the callbacks list regions in
+        'checklist_regions': list(app.df['Region'].unique()),  # order of the checklist/dropdown options
+        'values': cube.values,
+        'first_year': years[0],
+        'last_year': years[1],
+        'dates': cube.dates(*years).tolist(),
+        'yearly': cube.yearly.tolist(),  # [region][year][value]
+        'yearly_rows': cube.yearly_rows.tolist(),
+        'monthly': cube.data.reshape(len(regions), -1, len(cube.values)).tolist(),  # [region][month][value]
+        'monthly_rows': cube.rows.reshape(len(regions), -1).tolist(),
+        'hospitals': app.region_hospitals(regions).tolist(),  # per region, for the stacked bar's hover
+        'baseline': outbreak_baseline.tolist(),  # [region][month], outbreak overlay of the region line
+        'alerts': [[alert_text(b) for b in row] for row in outbreak_alerts],
+        'summary': app.summary_cards(),
+        'prototypes': {
+            'stacked': prototype(app.update_stacked_bar(sample, years)),
+            'stacked_none': without_template(app.update_stacked_bar([], years)),
+            'stacked_nodata': without_template(app.update_stacked_bar(['(none)'], years)),
+            'specific': prototype(app.update_specific_region_graph(sample[0], years)),
+            'specific_none': without_template(app.update_specific_region_graph(None, years)),
+            'specific_nodata': without_template(app.update_specific_region_graph('(none)', years)),
+        },
+    }
+
+
+def write_script(path, before, value, after):
+    # a small script with the value as JSON in the middle
+    with open(path, 'w') as f:
+        f.write(before + to_json_plotly(value) + after)
+
+
+def export(out_dir, states):
+    started = time.perf_counter()
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(os.path.join(out_dir, 'figures'))
+    for name in ('index.html', 'dashboard.js'):
+        shutil.copy(os.path.join(TEMPLATE_DIR, name), out_dir)
+    shutil.copy(PLOTLY_JS, out_dir)
+
+    # figures that don't depend on any input
+    fixed = {'total_per_year': app.build_total_per_year_graph(), 'hospitals': app.update_hospital_donut(app.DATA_VERSION)}
+    for metric in app.METRICS:
+        fixed[f'pie/{metric}'] = app.build_pie_chart(metric)
+        fixed[f'map/{metric}'] = app.build_choropleth(metric)
+
+    index = {}
+    for key, figure in itertools.chain(fixed.items(), ((state_key(name, args), CALLBACKS[name](*args)) for name, args in states)):
+        figure = without_template(figure)
+        name = hashlib.sha1(key.encode()).hexdigest()[:16] + '.js'
+        write_script(os.path.join(out_dir, 'figures', name), f'dashboardFigure("{name}", ', figure, ');\n')
+        index[key] = name
+
+    write_script(os.path.join(out_dir, 'tables.js'), 'window.DASHBOARD_TABLES = ',
+                 dict(tables(), version=app.DATA_VERSION, figures=index, template=template()), ';\n')
+    size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(out_dir) for f in files)
+    print(f"{len(index)} figures ({len(index) - len(fixed)} states) written to {out_dir}, "
+          f"{size / 1e6:.1f} MB in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the dashboard as a static site")
+    parser.add_argument('--out', default='static_site')
+    parser.add_argument('--top-k', type=int, default=None, help="only pre-render the K most requested states")
+    parser.add_argument('--request-log', default=None, help="JSON lines written with DASH_REQUEST_LOG")
+    args = parser.parse_args()
+    if args.top_k is not None and not args.request_log:
+        parser.error("--top-k needs --request-log")
+    states = requested_states(args.request_log, args.top_k) if args.top_k is not None else list(all_states())
+    export(args.out, states)
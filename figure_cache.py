@@ -0,0 +1,106 @@
+# Bounded LRU cache for callback outputs (mostly Plotly figures).
+# Keys are (callback, data version, callback inputs); entries are evicted least recently
+# used first once the estimated serialized size goes over the memory budget.
+import functools
+import os
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+
+DEFAULT_BUDGET_MB = 64
+
+
+def _freeze(value):
+    # callback inputs can be lists/dicts (checklists, sliders), turn them into hashable tuples
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def _size_of(value):
+    # size the browser would receive, close enough to what the entry costs to keep around
+    try:
+        return len(pio.to_json(value, validate=False))
+    except (TypeError, ValueError):
+        return len(repr(value))
+
+
+class FigureCache:
+    def __init__(self, max_bytes=None, version=lambda: None, size=_size_of):
+        # size: estimated bytes of a value (other caches of this kind hold other things than figures)
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get('FIGURE_CACHE_MB', DEFAULT_BUDGET_MB)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.version = version
+        self.size = size
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.listeners = []  # called with hit=True/False on every lookup (instrumentation.py)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        for listener in self.listeners:
+            listener(entry is not None)
+        return entry[0] if entry is not None else None
+
+    def put(self, key, value):
+        size = self.size(value)
+        if size > self.max_bytes:
+            return  # would evict everything else, just don't cache it
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def memoize(self, func=None, *, key=None):
+        # key: optional function of the callback args returning the part that matters
+        # (e.g. ignore an Interval's n_intervals). Defaults to all args.
+        if func is None:
+            return functools.partial(self.memoize, key=key)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            inputs = key(*args, **kwargs) if key is not None else (args, kwargs)
+            cache_key = (func.__qualname__, self.version(), _freeze(inputs))
+            value = self.get(cache_key)
+            if value is None:
+                value = func(*args, **kwargs)
+                self.put(cache_key, value)
+            return value
+
+        return wrapper
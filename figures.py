@@ -0,0 +1,141 @@
+# Fast figure building for the callbacks.
+# px.line / px.bar / go.Figure validate every property and reshape DataFrames on each call, which is most of
+# what a callback costs here. Instead the dark theme is registered once as a Plotly template, the per-chart
+# layouts are built once as plain dicts (layout() below), and the callbacks put NumPy arrays straight into
+# plain figure dicts. Dash serializes those the same way as go.Figure, just without the validation.
+#
+# The layout/trace dicts are shared between calls, so never modify one in place; use layout(base, **changes)
+# and trace dicts built per call instead.
+#
+# Numeric arrays in the traces are sent as plotly.js typed arrays ({dtype, bdata}: base64 of the raw bytes,
+# plotly.js >= 2.28 decodes them) instead of one decimal string per value. Text arrays become plain lists so
+# the orjson encoder (used by plotly/Dash when orjson is installed) never has to fall back to the slow path.
+import base64
+import functools
+
+import numpy as np
+import plotly.io as pio
+
+TEMPLATE_NAME = 'dengue_dark'
+
+# Colours used all over the dashboard
+BACKGROUND = '#393D3F'
+WHITE = '#FFFFFF'
+GRID_BLUE = '#60B3F7'
+CASES_COLOR = '#C7E5FF'
+DEATHS_COLOR = '#EC7777'
+ALERT_COLOR = '#FF4500'  # outbreak alerts
+
+# What every figure shares: dark background, white text
+THEME = {
+    'paper_bgcolor': BACKGROUND,
+    'plot_bgcolor': BACKGROUND,
+    'font': {'color': WHITE},
+}
+
+# Axis look used by the line and bar charts
+AXIS = {'linecolor': WHITE, 'gridcolor': GRID_BLUE}
+
+
+@functools.lru_cache(maxsize=None)
+def template():
+    # plotly's default template + the theme, registered under TEMPLATE_NAME (so px figures can use it too).
+    # Returned as a plain dict, built once per process.
+    pio.templates[TEMPLATE_NAME] = pio.templates.merge_templates('plotly', {'layout': THEME})
+    return pio.templates[TEMPLATE_NAME].to_plotly_json()
+
+
+# narrowest integer type first; int64 isn't a plotly.js typed array type, so bigger values go as float64
+INT_TYPES = [np.int8, np.uint8, np.int16, np.uint16, np.int32, np.uint32]
+
+
+def typed_array(values):
+    array = np.asarray(values)
+    if array.ndim != 1 or array.dtype.kind not in 'iuf' or not len(array):
+        return array.tolist()
+    if array.dtype.kind == 'f':
+        array = array.astype(np.float64, copy=False)
+    else:
+        low, high = array.min(), array.max()
+        array = next((array.astype(t) for t in INT_TYPES if np.iinfo(t).min <= low and high <= np.iinfo(t).max),
+                     array.astype(np.float64))
+    return {'dtype': array.dtype.str[1:], 'bdata': base64.b64encode(np.ascontiguousarray(array).data).decode('ascii')}
+
+
+def hex_rgb(color):
+    return [int(color[i:i + 2], 16) for i in (1, 3, 5)]
+
+
+def colorscale_color(colorscale, position):
+    # colour at position (0..1) of a [[position, '#RRGGBB'], ...] colour scale, interpolated in RGB like plotly.js
+    for (low, low_color), (high, high_color) in zip(colorscale, colorscale[1:]):
+        if position <= high or high == colorscale[-1][0]:
+            step = (position - low) / (high - low) if high > low else 0.0
+            rgb = [round(a + (b - a) * step) for a, b in zip(hex_rgb(low_color), hex_rgb(high_color))]
+            return 'rgb({}, {}, {})'.format(*rgb)
+    return colorscale[-1][1]
+
+
+def compact(trace):
+    # every NumPy array in the trace (also nested ones like marker.size) -> typed array / list
+    result = {}
+    for key, value in trace.items():
+        if isinstance(value, np.ndarray):
+            value = typed_array(value)
+        elif isinstance(value, dict) and key != 'geojson':
+            value = compact(value)
+        result[key] = value
+    return result
+
+
+def plain_figure(fig):
+    # a px/go figure as a plain dict with compact arrays (for the figures that are still built with px)
+    fig = fig.to_plotly_json()
+    return {'data': [compact(trace) for trace in fig['data']], 'layout': fig['layout']}
+
+
+def layout(base=None, **changes):
+    # new top-level layout dict: base + changes (nested values are shared, not copied)
+    result = dict(base or {})
+    result.update(changes)
+    return result
+
+
+def axis_title(text):
+    return {'text': text, 'font': {'color': WHITE}}
+
+
+def figure(data, layout):
+    return {'data': [compact(trace) for trace in data], 'layout': dict(layout, template=template())}
+
+
+def empty_figure(layout):
+    return figure([], layout)
+
+
+def line_traces(x, series, legend, x_label, y_label):
+    # one trace per (name, values, color), like px.line(long_df, x, y, color=legend)
+    return [
+        {
+            'hovertemplate': f"{legend}={name}<br>{x_label}=%{{x}}<br>{y_label}=%{{y}}<extra></extra>",
+            'legendgroup': name,
+            'line': {'color': color, 'dash': 'solid'},
+            'marker': {'symbol': 'circle'},
+            'mode': 'lines',
+            'name': name,
+            'orientation': 'v',
+            'showlegend': True,
+            'x': x,
+            'xaxis': 'x',
+            'y': values,
+            'yaxis': 'y',
+            'type': 'scatter',
+        }
+        for name, values, color in series
+    ]
+
+
+# px puts these on the axes/legend of every cartesian figure it makes
+PX_XAXIS = {'anchor': 'y', 'domain': [0.0, 1.0]}
+PX_YAXIS = {'anchor': 'x', 'domain': [0.0, 1.0]}
+PX_LAYOUT = {'margin': {'t': 60}}
@@ -0,0 +1,121 @@
+# Short-term case forecasts per region: additive Holt-Winters on log(1 + monthly cases), smoothing parameters picked
+# per region from a small grid by one-step-ahead error (the whole grid runs at once as arrays, one Python loop over
+# time). Regions are fitted in chunks in a process pool, at lower priority so the web workers stay responsive.
+#
+# Fitting everything takes seconds for many regions, so it never runs inside an interactive callback: a Dash
+# background callback (app.fit_region_forecasts) fits once per data version and keeps the result in a diskcache
+# shared by the workers (ForecastStore), the region line callback only reads it.
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+SEASON = 12
+HORIZON = 6  # months ahead
+MIN_SEASONS = 2  # regions with less history get no forecast
+INTERVAL_Z = 1.2816  # 80% prediction interval
+ALPHAS = (0.1, 0.2, 0.4, 0.6, 0.8)
+BETAS = (0.0, 0.02, 0.1)
+GAMMAS = (0.05, 0.1, 0.3, 0.5)
+FIT_NICE = 10  # niceness of the pool processes
+FORECAST_KEY = 'forecasts/'
+
+
+def holt_winters(y, season=SEASON, horizon=HORIZON):
+    # y: (periods,) -> mean, lower, upper (horizon,) on the log scale, NaN without enough history
+    n = len(y)
+    if n < MIN_SEASONS * season:
+        return np.full((3, horizon), np.nan)
+    alpha, beta, gamma = (grid.ravel() for grid in np.meshgrid(ALPHAS, BETAS, GAMMAS, indexing='ij'))
+    level = np.full(len(alpha), y[:season].mean())
+    trend = np.full(len(alpha), (y[season:2 * season].mean() - y[:season].mean()) / season)
+    seasonal = np.repeat((y[:season] - y[:season].mean())[:, None], len(alpha), axis=1)
+    sse = np.zeros(len(alpha))
+    for t in range(season, n):
+        s = t % season
+        error = y[t] - (level + trend + seasonal[s])
+        sse += error * error
+        new_level = alpha * (y[t] - seasonal[s]) + (1 - alpha) * (level + trend)
+        trend = beta * (new_level - level) + (1 - beta) * trend
+        seasonal[s] = gamma * (y[t] - new_level) + (1 - gamma) * seasonal[s]
+        level = new_level
+
+    best = np.argmin(sse)
+    steps = np.arange(1, horizon + 1)
+    mean = level[best] + steps * trend[best] + seasonal[(n + steps - 1) % season, best]
+    # one-step error grown like a random walk in the level (the usual Holt-Winters approximation)
+    sigma = np.sqrt(sse[best] / (n - season))
+    spread = INTERVAL_Z * sigma * np.sqrt(1 + (steps - 1) * alpha[best] ** 2 * (1 + steps * beta[best]) ** 2)
+    return np.stack([mean, mean - spread, mean + spread])
+
+
+def fit_chunk(counts, season=SEASON, horizon=HORIZON):
+    # counts: (periods, regions) -> (3, horizon, regions) cases: mean, lower, upper
+    y = np.log1p(np.asarray(counts, dtype=np.float64))
+    fitted = np.stack([holt_winters(y[:, i], season, horizon) for i in range(y.shape[1])], axis=-1)
+    return np.maximum(np.expm1(fitted), 0)
+
+
+def lower_priority():
+    try:
+        os.nice(FIT_NICE)
+    except OSError:
+        pass
+
+
+def fit_regions(counts, workers=None, season=SEASON, horizon=HORIZON):
+    # every region of counts (periods, regions), in a pool of `workers` processes (inline for 1 worker)
+    counts = np.asarray(counts)
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    if workers == 1 or counts.shape[1] < 2:
+        return fit_chunk(counts, season, horizon)
+    chunks = np.array_split(counts, min(workers * 4, counts.shape[1]), axis=1)
+    with ProcessPoolExecutor(max_workers=workers, initializer=lower_priority) as pool:
+        fitted = list(pool.map(fit_chunk, chunks, [season] * len(chunks), [horizon] * len(chunks)))
+    return np.concatenate(fitted, axis=-1)
+
+
+class RegionForecasts:
+    # mean/lower/upper: (horizon, regions); start: period index of the first forecast period (= periods of history)
+    def __init__(self, keys, counts, workers=None, season=SEASON, horizon=HORIZON):
+        self.keys = list(keys)
+        self.start = len(counts)
+        self.mean, self.lower, self.upper = fit_regions(counts, workers, season, horizon)
+
+    def region(self, key):
+        # (mean, lower, upper) of a region, None for unknown regions / not enough history
+        column = self.keys.index(key) if key in self.keys else None
+        if column is None or np.isnan(self.mean[0, column]):
+            return None
+        return self.mean[:, column], self.lower[:, column], self.upper[:, column]
+
+
+class ForecastStore:
+    # fitted forecasts per data version in a diskcache.Cache (shared by the workers and the background jobs),
+    # the last one read also kept in memory
+    def __init__(self, cache):
+        self.cache = cache
+        self._memory = (None, None)  # (version, forecasts)
+
+    def get(self, version):
+        if self._memory[0] == version:
+            return self._memory[1]
+        forecasts = self.cache.get(FORECAST_KEY + version)
+        if forecasts is not None:
+            self._memory = (version, forecasts)
+        return forecasts
+
+    def fit(self, version, keys, counts, workers=None):
+        # fitted forecasts for the version, fitting them unless another process already did (or is doing it)
+        from diskcache import Lock
+
+        with Lock(self.cache, f'forecast-lock/{version}', expire=3600):
+            forecasts = self.get(version)
+            if forecasts is None:
+                forecasts = RegionForecasts(keys, counts, workers)
+                self.cache.set(FORECAST_KEY + version, forecasts)
+                for key in list(self.cache.iterkeys()):  # older versions aren't needed anymore
+                    if isinstance(key, str) and key.startswith(FORECAST_KEY) and key != FORECAST_KEY + version:
+                        self.cache.delete(key)
+        self._memory = (version, forecasts)
+        return forecasts
@@ -0,0 +1,28 @@
+# gunicorn settings for serving the dashboard: gunicorn -c gunicorn.conf.py wsgi:server
+# Every setting can be overridden with an environment variable.
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+
+# Import the app (and load the bundle) once in the master before forking, so workers start instantly and
+# share those pages copy-on-write. The bundle files themselves are memory-mapped (DATA_MMAP, see
+# data_bundle.py), so data reloaded later inside a worker is shared through the page cache as well.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+# recycle workers now and then so slow leaks can't build up
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+
+def post_fork(server, worker):
+    # A worker forked from the preloaded master (also every recycled one) starts with the master's import-time
+    # data. Check the bundle pointer before serving anything, so a version ingested or rebuilt since then is
+    # loaded first, and start the worker's version watcher.
+    import sys
+    if 'app' in sys.modules:  # without preload_app the worker imports the app itself, with the current bundle
+        sys.modules['app'].data_watcher.start()
@@ -0,0 +1,123 @@
+# Spatial index over the hospital/clinic points for the map.
+# At low zoom it returns clusters (grid cells ~cluster_radius pixels wide, precomputed per zoom level),
+# at high zoom the individual facilities inside the current viewport. Either way the number of markers
+# sent to the browser depends on the screen size, not on how big the registry is.
+import math
+
+import numpy as np
+
+TILE_SIZE = 256  # pixels per world width at zoom 0 (web mercator)
+
+
+def mercator(lat, lon):
+    # lon/lat -> world coordinates in [0, 1]
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0
+    sin = np.sin(np.radians(np.clip(lat, -85.0511, 85.0511)))
+    y = 0.5 - np.log((1 + sin) / (1 - sin)) / (4 * math.pi)
+    return x, y
+
+
+class ClusterLevel:
+    __slots__ = ('lat', 'lon', 'count', 'first')
+
+    def __init__(self, lat, lon, count, first):
+        self.lat = lat
+        self.lon = lon
+        self.count = count
+        self.first = first  # index of one facility in the cluster (used for the label of single points)
+
+
+class HospitalIndex:
+    def __init__(self, names, lat, lon, cluster_radius=60, max_cluster_zoom=12, bucket_deg=0.25, max_points=2000):
+        self.names = np.asarray(names, dtype=object)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.cluster_radius = cluster_radius
+        self.max_cluster_zoom = max_cluster_zoom
+        self.max_points = max_points
+
+        x, y = mercator(self.lat, self.lon)
+        self.levels = [self._cluster_level(x, y, zoom) for zoom in range(max_cluster_zoom)]
+
+        # uniform lat/lon grid (CSR layout: points sorted by bucket + offsets) for viewport point queries
+        self.bucket_deg = bucket_deg
+        self.lat0 = self.lat.min() if len(self.lat) else 0.0
+        self.lon0 = self.lon.min() if len(self.lon) else 0.0
+        rows = self._bucket(self.lat, self.lat0)
+        cols = self._bucket(self.lon, self.lon0)
+        self.n_rows = int(rows.max()) + 1 if len(rows) else 1
+        self.n_cols = int(cols.max()) + 1 if len(cols) else 1
+        buckets = rows * self.n_cols + cols
+        self.order = np.argsort(buckets, kind='stable')
+        self.offsets = np.searchsorted(buckets[self.order], np.arange(self.n_rows * self.n_cols + 1))
+
+    def __len__(self):
+        return len(self.lat)
+
+    def _bucket(self, values, origin):
+        return np.floor((values - origin) / self.bucket_deg).astype(np.int64)
+
+    def _cluster_level(self, x, y, zoom):
+        cells = TILE_SIZE * 2 ** zoom / self.cluster_radius
+        keys = np.floor(x * cells).astype(np.int64) * (1 << 32) + np.floor(y * cells).astype(np.int64)
+        _, first, inverse, count = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+        lat = np.bincount(inverse, weights=self.lat) / count
+        lon = np.bincount(inverse, weights=self.lon) / count
+        return ClusterLevel(lat, lon, count, first)
+
+    def _points_in(self, bounds):
+        west, south, east, north = bounds
+        row_lo, row_hi = np.clip(self._bucket(np.array([south, north]), self.lat0), 0, self.n_rows - 1)
+        col_lo, col_hi = np.clip(self._bucket(np.array([west, east]), self.lon0), 0, self.n_cols - 1)
+        # each bucket row is one contiguous run of the sorted points
+        candidates = [
+            self.order[self.offsets[row * self.n_cols + col_lo]:self.offsets[row * self.n_cols + col_hi + 1]]
+            for row in range(row_lo, row_hi + 1)
+        ]
+        idx = np.concatenate(candidates) if candidates else np.empty(0, dtype=np.int64)
+        lat, lon = self.lat[idx], self.lon[idx]
+        return idx[(lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)]
+
+    def query(self, bounds, zoom):
+        # bounds = (west, south, east, north); returns marker arrays for that view
+        # pad the viewport a bit so small pans don't show empty edges
+        west, south, east, north = bounds
+        pad_lon, pad_lat = (east - west) * 0.25, (north - south) * 0.25
+        bounds = (west - pad_lon, south - pad_lat, east + pad_lon, north + pad_lat)
+
+        if zoom >= self.max_cluster_zoom:
+            idx = self._points_in(bounds)
+            if len(idx) <= self.max_points:
+                return {
+                    'lat': self.lat[idx],
+                    'lon': self.lon[idx],
+                    'count': np.ones(len(idx), dtype=np.int64),
+                    'text': self.names[idx],
+                }
+        level = self.levels[int(np.clip(math.floor(zoom), 0, len(self.levels) - 1))]
+        west, south, east, north = bounds
+        inside = (level.lat >= south) & (level.lat <= north) & (level.lon >= west) & (level.lon <= east)
+        count = level.count[inside]
+        text = np.where(count == 1, self.names[level.first[inside]], [f"{n:,} facilities" for n in count])
+        return {'lat': level.lat[inside], 'lon': level.lon[inside], 'count': count, 'text': text}
+
+
+def viewport(relayout_data, center, zoom, width, height):
+    # (bounds, zoom) of the map from a mapbox relayoutData event, falling back to center/zoom + figure size
+    relayout_data = relayout_data or {}
+    center = relayout_data.get('mapbox.center', center)
+    zoom = relayout_data.get('mapbox.zoom', zoom)
+    corners = (relayout_data.get('mapbox._derived') or {}).get('coordinates')
+    if corners:
+        lons = [c[0] for c in corners]
+        lats = [c[1] for c in corners]
+        return (min(lons), min(lats), max(lons), max(lats)), zoom
+
+    # world size in pixels at this zoom, then back from pixels to lon/lat around the center
+    world = TILE_SIZE * 2 ** zoom
+    cx, cy = mercator(center['lat'], center['lon'])
+    half_x, half_y = width / 2 / world, height / 2 / world
+    west = (cx - half_x) * 360.0 - 180.0
+    east = (cx + half_x) * 360.0 - 180.0
+    north, south = (math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y)))) for y in (cy - half_y, cy + half_y))
+    return (float(west), float(south), float(east), float(north)), zoom
@@ -0,0 +1,137 @@
+# Response compression and conditional GETs for the Flask server behind the Dash app.
+#
+# - Compression: gzip, or brotli when the `brotli` package is installed and the browser accepts it, for
+#   text-like responses of at least COMPRESS_MIN_BYTES (default 1 KB). Responses that don't depend on the
+#   request (layout, static assets, Dash's component bundles) are compressed once and the result reused.
+# - Conditional GETs: the pages that only change with the data (layout, index, dependencies) get an ETag and
+#   Last-Modified built from the data version, and a repeat load of the same version is answered with an
+#   empty 304 before Dash builds or serializes anything. Static files already get ETags from Flask/Dash.
+import gzip
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import flask
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+COMPRESSIBLE = ('text/', 'application/json', 'application/javascript', 'application/x-javascript',
+                'application/xml', 'image/svg+xml', 'application/geo+json')
+VERSIONED_PATHS = ('/', '/_dash-layout', '/_dash-dependencies')
+
+
+def accepted_encoding(header):
+    # best encoding we can do out of an Accept-Encoding header (ignores anything with q=0)
+    accepted = set()
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(name.strip().lower())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)  # quality 5 is about gzip's speed and still smaller
+    return gzip.compress(data, compresslevel=6)
+
+
+class HttpCache:
+    def __init__(self, version, last_modified, revision='', min_bytes=None, paths=VERSIONED_PATHS, max_entries=64):
+        self.version = version  # () -> current data version
+        self.last_modified = last_modified  # () -> datetime the data (or the code) last changed
+        self.revision = revision  # changes the ETags when the app code changes
+        self.min_bytes = COMPRESS_MIN_BYTES if min_bytes is None else min_bytes
+        self.paths = set(paths)
+        self.max_entries = max_entries
+        self._compressed = OrderedDict()  # (path, etag, encoding) -> bytes
+        self._lock = threading.Lock()
+
+    def install(self, server):
+        server.before_request(self.not_modified)
+        # after_request handlers run last-registered first: tag the response, then compress it
+        server.after_request(self.compress_response)
+        server.after_request(self.tag_response)
+
+    def etag(self):
+        return f'{self.version()}-{self.revision}'
+
+    # ---- conditional GETs ----
+    def not_modified(self):
+        request = flask.request
+        if request.method != 'GET' or request.path not in self.paths:
+            return None
+        if request.if_none_match:
+            fresh = request.if_none_match.contains_weak(self.etag())
+        else:
+            since = request.if_modified_since
+            fresh = since is not None and self.last_modified().replace(microsecond=0) <= since
+        if not fresh:
+            return None
+        response = flask.Response(status=304)
+        self._set_validators(response)
+        return response
+
+    def tag_response(self, response):
+        if flask.request.method == 'GET' and flask.request.path in self.paths and response.status_code == 200:
+            self._set_validators(response)
+        return response
+
+    def _set_validators(self, response):
+        response.set_etag(self.etag())
+        response.last_modified = self.last_modified()
+        response.cache_control.no_cache = True  # may be stored, but ask us every time (cheap 304)
+
+    # ---- compression ----
+    def compress_response(self, response):
+        if (response.status_code != 200 or response.is_streamed and not response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or not (response.mimetype or '').startswith(COMPRESSIBLE)):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = accepted_encoding(flask.request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+        response.direct_passthrough = False  # send_file responses: read the file so we can compress it
+        data = response.get_data()
+        if len(data) < self.min_bytes:
+            return response
+
+        # responses that are the same for everyone (ETag, or Dash's fingerprinted bundles with a max-age) are
+        # compressed once. The ETag stays as it is (Dash compares it verbatim), Vary keeps caches apart
+        etag, _ = response.get_etag()
+        if etag or flask.request.method == 'GET' and response.cache_control.max_age:
+            body = self._cached((flask.request.full_path, etag, encoding), data)
+        else:
+            body = compress(data, encoding)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def _cached(self, key, data):
+        with self._lock:
+            body = self._compressed.get(key)
+            if body is not None:
+                self._compressed.move_to_end(key)
+                return body
+        body = compress(data, key[2])
+        with self._lock:
+            self._compressed[key] = body
+            while len(self._compressed) > self.max_entries:
+                self._compressed.popitem(last=False)
+        return body
+
+
+def parse_timestamp(text):
+    # '2024-01-31T12:00:00Z' (bundle manifests) -> aware datetime
+    return datetime.strptime(text, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
@@ -0,0 +1,220 @@
+# Add new case reports to the data without rebuilding the bundle or restarting the app:
+#
+#   python ingest.py reports.csv [more.csv ...]     (CSV with the columns of df_improved.csv)
+#   python ingest.py --watch Data/incoming          (ingest every CSV put in the folder, then move it to processed/
+#                                                    or failed/; write the file elsewhere and move it in when done)
+#
+# The reports are validated (known region, its island, no month that is already there), the cube's aggregates are
+# updated incrementally (RegionCube.add) and written together with the new rows as a new bundle version; every other
+# file is hard-linked from the current version. Switching current.json is the atomic swap: the running workers
+# load the new version on their next check (VersionWatcher in app.py) and keep everything that only depends on the
+# geometry / facilities. One ingest at a time (lock file in the bundle directory).
+#
+# The reports only live in the bundle: build_bundle.py starts from the CSVs again, so add them there too before
+# the next rebuild.
+import argparse
+import csv
+import fcntl
+import json
+import os
+import shutil
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from data_bundle import DEFAULT_BUNDLE_DIR, load_bundle, set_current
+from data_version import content_hash, mapping_hash
+from schema import MONTHS, SCHEMAS, CaseRecord, to_table
+
+REGIONS_COLUMNS = ['Dengue_Cas', 'Dengue_Dea']  # per-region cases / deaths totals kept in regions.arrow
+MAX_ERRORS = 20  # reported per file
+
+
+class IngestError(ValueError):
+    pass
+
+
+def read_reports(path):
+    # CSV -> CaseRecords, IngestError listing the bad rows
+    records, errors = [], []
+    with open(path, newline='') as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            try:
+                records.append(CaseRecord.from_row(row))
+            except ValueError as e:
+                errors.append(f"line {line}: {e}")
+    if errors:
+        raise IngestError(f"{path}: {len(errors)} bad rows\n" + '\n'.join(errors[:MAX_ERRORS]))
+    return records
+
+
+def validate(records, cube):
+    # reports have to fit the loaded data: known region on the right island, one report per region and month,
+    # and no month that already has data
+    errors = []
+    seen = set()
+    for record in records:
+        key = (record.region, record.year, record.month)
+        position = cube.region_pos.get(record.region)
+        if position is None:
+            errors.append(f"{record}: unknown region")
+        elif cube.islands[position] != record.island:
+            errors.append(f"{record}: {record.region} is on {cube.islands[position]}, not {record.island}")
+        elif key in seen:
+            errors.append(f"{record}: reported twice")
+        elif cube.first_year <= record.year <= cube.last_year \
+                and cube.rows[position, record.year - cube.first_year, record.month - 1]:
+            errors.append(f"{record}: {record.region} already has data for {record.year}-{record.month:02d}")
+        seen.add(key)
+    if not records:
+        errors.append("no reports")
+    if errors:
+        raise IngestError(f"{len(errors)} reports rejected\n" + '\n'.join(errors[:MAX_ERRORS]))
+
+
+def records_frame(records):
+    # same columns as df_improved.csv
+    return pd.DataFrame({
+        'Month': [MONTHS[r.month - 1] for r in records],
+        'Year': [r.year for r in records],
+        'Region': [r.region for r in records],
+        'Dengue_Cases': [r.cases for r in records],
+        'Dengue_Deaths': [r.deaths for r in records],
+        'Island': [r.island for r in records],
+        'Date': [r.date for r in records],
+    }, columns=SCHEMAS['cases'].names)
+
+
+def region_totals(table, records):
+    # regions.arrow with the reports added to its per-region totals
+    added = defaultdict(lambda: np.zeros(2, dtype=np.int64))
+    for record in records:
+        added[record.region] += (record.cases, record.deaths)
+    extra = np.array([added.get(region, (0, 0)) for region in table['Region'].to_pylist()],
+                     dtype=np.int64).reshape(-1, 2)
+    for i, column in enumerate(REGIONS_COLUMNS):
+        values = table[column].to_numpy().astype(np.int64) + extra[:, i]
+        table = table.set_column(table.schema.get_field_index(column), column,
+                                 pa.array(values, type=table.schema.field(column).type))  # raises on overflow
+    return table
+
+
+def link_or_copy(source, target):
+    try:
+        os.link(source, target)
+    except OSError:  # other filesystem, no hard links
+        shutil.copy2(source, target)
+
+
+@contextmanager
+def ingest_lock(bundle_dir):
+    with open(os.path.join(bundle_dir, 'ingest.lock'), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def ingest(records, bundle_dir=os.path.join('Data', DEFAULT_BUNDLE_DIR)):
+    # add the reports as a new bundle version and make it current, returns the new version
+    with ingest_lock(bundle_dir):
+        bundle = load_bundle(bundle_dir)
+        cube = bundle.cube()
+        validate(records, cube)
+        new_cube = cube.add([r.region for r in records], [r.year for r in records], [r.month for r in records],
+                            [(r.cases, r.deaths) for r in records])
+
+        version = mapping_hash({'base': bundle.version,
+                                'reports': [[r.region, r.year, r.month, r.cases, r.deaths] for r in records]})
+        version_dir = os.path.join(bundle_dir, version)
+        temp_dir = f'{version_dir}.{os.getpid()}.tmp'
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        os.makedirs(temp_dir)
+
+        manifest = dict(bundle.manifest, version=version, files=dict(bundle.manifest['files']))
+        part = f'cases-{version}.arrow'
+        for name in os.listdir(bundle.path):  # everything but the files written below
+            if name not in ('manifest.json', 'regions.arrow') and not name.startswith('cube'):
+                link_or_copy(os.path.join(bundle.path, name), os.path.join(temp_dir, name))
+
+        # uncompressed Arrow IPC like build_bundle.py, so the files can be memory-mapped
+        feather.write_feather(to_table(records_frame(records), 'cases'), os.path.join(temp_dir, part),
+                              compression='uncompressed')
+        feather.write_feather(region_totals(bundle.table('regions'), records),
+                              os.path.join(temp_dir, 'regions.arrow'), compression='uncompressed')
+        new_cube.save(temp_dir)
+        for name in os.listdir(temp_dir):
+            if name == part or name == 'regions.arrow' or name.startswith('cube'):
+                manifest['files'][name] = content_hash([os.path.join(temp_dir, name)])
+
+        parts = manifest.get('parts', {})
+        manifest['parts'] = dict(parts, cases=parts.get('cases', ['cases.arrow']) + [part])
+        manifest['rows'] = dict(manifest['rows'], cases=manifest['rows']['cases'] + len(records))
+        # built_at is this version's time (the Last-Modified of the page and layout, see app.data_last_modified)
+        manifest['built_at'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        manifest['ingested'] = manifest.get('ingested', []) + [{
+            'version': version, 'rows': len(records), 'at': manifest['built_at'],
+        }]
+        with open(os.path.join(temp_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        if os.path.exists(version_dir):  # same reports on the same base again: identical, keep the old one
+            shutil.rmtree(temp_dir)
+        else:
+            os.rename(temp_dir, version_dir)
+        set_current(bundle_dir, version)
+        return version
+
+
+def ingest_files(paths, bundle_dir):
+    records = [record for path in paths for record in read_reports(path)]
+    started = time.perf_counter()
+    version = ingest(records, bundle_dir)
+    print(f"{len(records)} reports -> bundle {version} in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return version
+
+
+def watch(directory, bundle_dir, interval):
+    # ingest CSVs as they show up (oldest first); done files go to processed/, rejected ones to failed/ with the
+    # reason next to them
+    for sub in ('processed', 'failed'):
+        os.makedirs(os.path.join(directory, sub), exist_ok=True)
+    print(f"watching {directory} for case report CSVs")
+    while True:
+        paths = sorted((os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.csv')),
+                       key=os.path.getmtime)
+        for path in paths:
+            try:
+                ingest_files([path], bundle_dir)
+                shutil.move(path, os.path.join(directory, 'processed', os.path.basename(path)))
+            except IngestError as e:
+                print(e)
+                target = os.path.join(directory, 'failed', os.path.basename(path))
+                shutil.move(path, target)
+                with open(target + '.error.txt', 'w') as f:
+                    f.write(f"{e}\n")
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Add case reports to the dashboard data without a rebuild")
+    parser.add_argument('reports', nargs='*', help="CSV files with the columns of df_improved.csv")
+    parser.add_argument('--bundle-dir', default=os.path.join('Data', DEFAULT_BUNDLE_DIR))
+    parser.add_argument('--watch', metavar='DIR', help="keep ingesting CSVs dropped into DIR")
+    parser.add_argument('--interval', type=float, default=2.0, help="seconds between checks with --watch")
+    args = parser.parse_args()
+    if args.watch:
+        watch(args.watch, args.bundle_dir, args.interval)
+    elif args.reports:
+        try:
+            ingest_files(args.reports, args.bundle_dir)
+        except IngestError as e:
+            parser.exit(1, f"{e}\n")
+    else:
+        parser.error("give report CSVs or --watch DIR")
@@ -0,0 +1,214 @@
+# Per-callback instrumentation with a Prometheus-format /metrics route on the Flask server.
+# Turned on with DASH_METRICS=1. When it's off nothing gets wrapped, so there is no overhead at all.
+#
+# For every server callback it records:
+#   - compute time (the callback function itself)
+#   - serialization time (Dash turning the result into the JSON response, i.e. the rest of the request)
+#   - response bytes
+#   - figure cache hits/misses during the call
+# DASH_PROFILE_SLOWEST=N additionally runs a sample of the calls (DASH_PROFILE_SAMPLE, default 10%) under
+# cProfile and keeps the N slowest, readable at /metrics/profiles.
+# DASH_REQUEST_LOG=path appends every call's inputs as a JSON line ({"callback": ..., "args": [...]}), which is
+# what `python export_static.py --top-k` uses to find the most requested states.
+import bisect
+import cProfile
+import heapq
+import io
+import itertools
+import json
+import os
+import pstats
+import random
+import threading
+import time
+from collections import defaultdict
+
+import flask
+from dash.exceptions import PreventUpdate
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class CallbackMetrics:
+    def __init__(self, profile_slowest=0, profile_sample=0.1, request_log=None):
+        self.compute = defaultdict(lambda: Histogram(TIME_BUCKETS))
+        self.serialize = defaultdict(lambda: Histogram(TIME_BUCKETS))
+        self.response_bytes = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+        self.counters = defaultdict(int)  # (metric, callback) -> value
+        self.readings = {}  # name -> (type, help, function), values read from elsewhere when /metrics is served
+        self.profile_slowest = profile_slowest
+        self.profile_sample = profile_sample
+        self.profiles = []  # min-heap of (seconds, seq, callback, report)
+        self.request_log = open(request_log, 'a', buffering=1) if request_log else None  # line buffered
+        self._sequence = itertools.count()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        if os.environ.get('DASH_METRICS', '0') != '1':
+            return None
+        return cls(int(os.environ.get('DASH_PROFILE_SLOWEST', 0)), float(os.environ.get('DASH_PROFILE_SAMPLE', 0.1)),
+                   os.environ.get('DASH_REQUEST_LOG'))
+
+    # ---- wiring ----
+    def instrument(self, app):
+        # wrap every @app.callback registered from now on, then serve the numbers
+        register_callback = app.callback
+
+        def callback(*args, **kwargs):
+            register = register_callback(*args, **kwargs)
+
+            def decorator(func):
+                result = register(self._timed_compute(func.__name__, func))
+                entry = app.callback_map[next(reversed(app.callback_map))]  # the one just added
+                entry['callback'] = self._timed_response(func.__name__, entry['callback'])
+                return result
+
+            return decorator
+
+        app.callback = callback
+        app.server.add_url_rule('/metrics', 'metrics', self.serve_metrics)
+        if self.profile_slowest:
+            app.server.add_url_rule('/metrics/profiles', 'metrics_profiles', self.serve_profiles)
+
+    def gauge(self, name, help_text, read):
+        self.readings[name] = ('gauge', help_text, read)
+
+    def counter(self, name, help_text, read):
+        # read() only ever goes up (until a restart), so rate() works on it; name it *_total
+        self.readings[name] = ('counter', help_text, read)
+
+    def cache_lookup(self, hit):
+        # FigureCache listener: attribute the hit/miss to the callback running on this thread
+        name = getattr(self._local, 'callback', None)
+        if name is not None:
+            with self._lock:
+                self.counters['cache_hits' if hit else 'cache_misses', name] += 1
+
+    # ---- timing ----
+    def _timed_compute(self, name, func):
+        def wrapper(*args, **kwargs):
+            if self.request_log is not None:
+                self._log_request(name, args)
+            self._local.callback = name
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._local.compute = time.perf_counter() - started
+                self._local.callback = None
+
+        wrapper.__name__ = func.__name__
+        wrapper.__wrapped__ = func
+        return wrapper
+
+    def _log_request(self, name, args):
+        line = json.dumps({'callback': name, 'args': list(args)}, default=str)
+        with self._lock:
+            self.request_log.write(line + '\n')
+
+    def _timed_response(self, name, dash_callback):
+        # dash_callback calls our compute wrapper and then serializes, returning the JSON body
+        def wrapper(*args, **kwargs):
+            self._local.compute = 0.0
+            profiler = None
+            if self.profile_slowest and random.random() < self.profile_sample:
+                profiler = cProfile.Profile()
+                profiler.enable()
+            started = time.perf_counter()
+            prevented = False
+            body = ''
+            try:
+                body = dash_callback(*args, **kwargs)
+                return body
+            except PreventUpdate:
+                prevented = True
+                raise
+            finally:
+                total = time.perf_counter() - started
+                if profiler is not None:
+                    profiler.disable()
+                self._record(name, total, body, prevented, profiler)
+
+        return wrapper
+
+    def _record(self, name, total, body, prevented, profiler):
+        compute = self._local.compute
+        with self._lock:
+            self.counters['calls', name] += 1
+            self.compute[name].observe(compute)
+            if prevented:
+                self.counters['no_update', name] += 1
+            elif isinstance(body, str):
+                self.serialize[name].observe(max(total - compute, 0.0))
+                self.response_bytes[name].observe(len(body))
+        if profiler is not None:
+            self._keep_profile(name, total, profiler)
+
+    def _keep_profile(self, name, seconds, profiler):
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(30)
+        entry = (seconds, next(self._sequence), name, report.getvalue())
+        with self._lock:
+            if len(self.profiles) < self.profile_slowest:
+                heapq.heappush(self.profiles, entry)
+            elif seconds > self.profiles[0][0]:
+                heapq.heapreplace(self.profiles, entry)
+
+    # ---- output ----
+    def prometheus(self):
+        lines = []
+        with self._lock:
+            for metric, histograms, help_text in (
+                ('dash_callback_compute_seconds', self.compute, 'Time spent in the callback function'),
+                ('dash_callback_serialize_seconds', self.serialize, 'Time spent turning the result into the JSON response'),
+                ('dash_callback_response_bytes', self.response_bytes, 'Size of the JSON response'),
+            ):
+                lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} histogram']
+                for name, histogram in sorted(histograms.items()):
+                    lines += histogram.lines(metric, f'callback="{name}"')
+            for counter, help_text in (
+                ('calls', 'Callback requests'),
+                ('no_update', 'Callback requests answered without an update'),
+                ('cache_hits', 'Figure cache hits during the callback'),
+                ('cache_misses', 'Figure cache misses during the callback'),
+            ):
+                metric = f'dash_callback_{counter}_total'
+                lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+                lines += [f'{metric}{{callback="{name}"}} {value}'
+                          for (kind, name), value in sorted(self.counters.items()) if kind == counter]
+        for metric, (kind, help_text, read) in sorted(self.readings.items()):
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} {kind}', f'{metric} {read()}']
+        return '\n'.join(lines) + '\n'
+
+    def serve_metrics(self):
+        return flask.Response(self.prometheus(), mimetype='text/plain; version=0.0.4')
+
+    def serve_profiles(self):
+        with self._lock:
+            profiles = sorted(self.profiles, reverse=True)
+        text = '\n'.join(f'===== {name}: {seconds * 1000:.1f} ms =====\n{report}' for seconds, _, name, report in profiles)
+        return flask.Response(text or 'no profiles yet\n', mimetype='text/plain')
@@ -0,0 +1,133 @@
+# Outbreak signals for every region at once, on a (periods x regions) matrix of counts (months here, works the same
+# for weekly series with season=52). Everything is array maths over all regions; the only Python loops are over the
+# few baseline years and, for the EWMA/CUSUM recursions, over time. Time-major so a period is one contiguous row
+# (the recursions step through rows, a new month is a new row).
+#
+# - seasonal baseline: mean/spread of the same period in up to BASELINE_YEARS previous years
+# - z: this period against its baseline (spread at least Poisson-like, so flat baselines don't give huge z)
+# - EWMA of z, alert when above EWMA_LIMIT of its own standard deviation
+# - CUSUM of z (one-sided, reference CUSUM_K), alert when above CUSUM_H, then restarts from 0 (otherwise one big
+#   epidemic keeps it above the limit for a year after)
+#
+# Computed once per data version; a new version that only adds periods at the end is extended (baseline and the
+# recursions for the new periods only) instead of recomputed, see update_signals.
+import numpy as np
+
+BASELINE_YEARS = 5
+MIN_BASELINE_YEARS = 2  # periods with fewer years of history get no baseline and no alerts
+Z_THRESHOLD = 2.0
+EWMA_LAMBDA = 0.3
+EWMA_LIMIT = 2.5
+CUSUM_K = 0.5
+CUSUM_H = 4.0
+
+# bits of OutbreakSignals.alerts
+Z_ALERT, EWMA_ALERT, CUSUM_ALERT = 1, 2, 4
+ALERT_NAMES = {Z_ALERT: 'z-score', EWMA_ALERT: 'EWMA', CUSUM_ALERT: 'CUSUM'}
+
+
+def seasonal_baseline(counts, season, start=0, years=BASELINE_YEARS):
+    # mean and spread of counts[t - k*season] (k = 1..years) for the periods t >= start, NaN mean where there are
+    # fewer than MIN_BASELINE_YEARS years before t
+    n_periods = len(counts)
+    shape = (n_periods - start,) + counts.shape[1:]
+    total = np.zeros(shape)
+    squares = np.zeros(shape)
+    n = np.zeros(shape[0])
+    for k in range(1, years + 1):
+        lag = k * season
+        first = max(start, lag)  # first period with k years of history
+        if first >= n_periods:
+            break
+        past = counts[first - lag:n_periods - lag]
+        total[first - start:] += past
+        squares[first - start:] += past * past
+        n[first - start:] += 1
+    n = n[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = total / n
+        variance = (squares - total * mean) / (n - 1)
+    mean[n[:, 0] < MIN_BASELINE_YEARS] = np.nan
+    # spread = sqrt(max(variance, mean, 1)), in place
+    np.maximum(variance, mean, out=variance)
+    np.maximum(variance, 1.0, out=variance)
+    return mean, np.sqrt(variance, out=variance)
+
+
+def recursions(z, ewma=None, cusum=None):
+    # EWMA and CUSUM of z along time, starting from the given last state (zeros for a fresh start)
+    ewma_out = np.empty(z.shape)
+    cusum_out = np.empty(z.shape)
+    ewma = np.zeros(z.shape[1]) if ewma is None else ewma
+    cusum = np.zeros(z.shape[1]) if cusum is None else cusum
+    steps = np.nan_to_num(z)  # no baseline yet: no evidence either way
+    for t, step in enumerate(steps):
+        ewma = EWMA_LAMBDA * step + (1 - EWMA_LAMBDA) * ewma
+        cusum = np.maximum(0.0, np.where(cusum >= CUSUM_H, 0.0, cusum) + step - CUSUM_K)
+        ewma_out[t] = ewma
+        cusum_out[t] = cusum
+    return ewma_out, cusum_out
+
+
+def alert_bits(z, ewma, cusum):
+    # NaN z (no baseline yet) compares False, and the recursions stay at 0 there
+    ewma_sd = np.sqrt(EWMA_LAMBDA / (2 - EWMA_LAMBDA))
+    bits = (z >= Z_THRESHOLD).view(np.uint8) * np.uint8(Z_ALERT)
+    bits |= (ewma >= EWMA_LIMIT * ewma_sd).view(np.uint8) * np.uint8(EWMA_ALERT)
+    bits |= (cusum >= CUSUM_H).view(np.uint8) * np.uint8(CUSUM_ALERT)
+    return bits
+
+
+class OutbreakSignals:
+    # every array is (periods, regions): counts, baseline, spread, z, ewma, cusum and alerts (bits, see ALERT_NAMES)
+    def __init__(self, keys, counts, season=12):
+        # keys: one label per column (region names)
+        self.keys = list(keys)
+        self.season = season
+        self.counts = np.asarray(counts, dtype=np.float64)
+        self.baseline, self.spread = seasonal_baseline(self.counts, season)
+        self.z = (self.counts - self.baseline) / self.spread
+        self.ewma, self.cusum = recursions(self.z)
+        self.alerts = alert_bits(self.z, self.ewma, self.cusum)
+
+    @property
+    def n_periods(self):
+        return len(self.counts)
+
+    def extend(self, counts):
+        # new signals for counts = the old counts plus new periods at the end; only the new periods are computed
+        counts = np.asarray(counts, dtype=np.float64)
+        old = self.n_periods
+        baseline, spread = seasonal_baseline(counts, self.season, start=old)
+        z = (counts[old:] - baseline) / spread
+        ewma, cusum = recursions(z, self.ewma[-1], self.cusum[-1]) if old else recursions(z)
+
+        result = OutbreakSignals.__new__(OutbreakSignals)
+        result.keys, result.season, result.counts = self.keys, self.season, counts
+        result.baseline = np.concatenate([self.baseline, baseline])
+        result.spread = np.concatenate([self.spread, spread])
+        result.z = np.concatenate([self.z, z])
+        result.ewma = np.concatenate([self.ewma, ewma])
+        result.cusum = np.concatenate([self.cusum, cusum])
+        result.alerts = np.concatenate([self.alerts, alert_bits(z, ewma, cusum)])
+        return result
+
+    def latest(self):
+        # alert bits per region for the last period (zeros when there's no data)
+        return self.alerts[-1] if self.n_periods else np.zeros(len(self.keys), dtype=np.uint8)
+
+
+def alert_text(bits):
+    # alert bits -> 'z-score, CUSUM' ('' for no alert), for hover labels
+    return ', '.join(name for bit, name in ALERT_NAMES.items() if bits & bit)
+
+
+def update_signals(previous, keys, counts, season=12):
+    # extend the previous signals when the new counts only add periods at the end, reuse them when nothing
+    # changed, otherwise start over
+    counts = np.asarray(counts, dtype=np.float64)
+    if previous is None or previous.keys != list(keys) or previous.season != season:
+        return OutbreakSignals(keys, counts, season)
+    if previous.n_periods <= len(counts) and np.array_equal(previous.counts, counts[:previous.n_periods]):
+        return previous if previous.n_periods == len(counts) else previous.extend(counts)
+    return OutbreakSignals(keys, counts, season)
@@ -0,0 +1,141 @@
+# Cases/deaths aggregates on the RegionCube: the one query path behind the dashboard callbacks (stacked bar, line
+# graphs, island pie) and the /api/cases routes (api.py). A query picks regions and/or islands and a year range and
+# sums everything it doesn't group by; the result has the rows df[filter].groupby(group_by).sum() would have
+# (only groups with data, sorted by the group columns). Results are cached per query and data version.
+import threading
+
+import numpy as np
+
+# group_by names -> output column (the names of df_improved.csv; Month is the month number here)
+GROUPS = {'region': 'Region', 'island': 'Island', 'year': 'Year', 'month': 'Month'}
+DEFAULT_BUDGET_MB = 32
+
+
+class QueryError(ValueError):
+    pass
+
+
+class QueryResult:
+    # columns: output column -> array for each group_by, values: (rows, n_values) with the cube's value columns
+    def __init__(self, group_by, columns, value_names, values):
+        self.group_by = group_by
+        self.columns = columns
+        self.value_names = list(value_names)
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def names(self):
+        return list(self.columns) + self.value_names
+
+    def column(self, name):
+        if name in self.columns:
+            return self.columns[name]
+        return self.values[:, self.value_names.index(name)]
+
+    def dates(self):
+        # 'YYYY-MM-01' per row of a year+month result (same strings as RegionCube.dates)
+        return np.array([f"{year}-{month:02d}-01" for year, month in zip(self.columns['Year'].tolist(),
+                                                                          self.columns['Month'].tolist())],
+                        dtype=object)
+
+    @property
+    def nbytes(self):
+        # labels are shared with the cube, count them as one pointer each
+        return self.values.nbytes + sum(column.nbytes for column in self.columns.values())
+
+
+def signature(regions=None, islands=None, years=None, group_by=()):
+    # the parts of a query that decide its result, hashable and the same however the inputs were ordered
+    group_by = tuple(group_by)
+    unknown = [group for group in group_by if group not in GROUPS]
+    if unknown or len(set(group_by)) != len(group_by):
+        raise QueryError(f"group_by: {', '.join(group_by)} (any of {', '.join(GROUPS)}, each once)")
+    if years is not None:
+        years = (int(years[0]), int(years[1]))
+    return (None if regions is None else tuple(sorted(set(regions))),
+            None if islands is None else tuple(sorted(set(islands))),
+            years, group_by)
+
+
+def aggregate(cube, regions=None, islands=None, years=None, group_by=()):
+    # regions / islands: names to keep (None: all, unknown names are dropped), years: (first, last) inclusive
+    idx = np.arange(len(cube.regions)) if regions is None else cube.region_indices(regions)
+    if islands is not None:
+        idx = idx[np.isin(cube.islands[idx], list(islands))]
+    span = slice(0, len(cube.years)) if years is None else cube.year_slice(*years)
+    span = slice(span.start, max(span.start, span.stop))
+
+    # [region, year, month] cells, the yearly totals when months aren't needed (month axis of 1)
+    if 'month' in group_by:
+        data, rows = cube.data[idx, span], cube.rows[idx, span]
+    else:
+        data, rows = cube.yearly[idx, span][:, :, None], cube.yearly_rows[idx, span][:, :, None]
+
+    island_names, island_codes = np.unique(cube.islands[idx], return_inverse=True)
+    if 'region' not in group_by:
+        if 'island' in group_by:
+            data = np.stack([data[island_codes == i].sum(axis=0) for i in range(len(island_names))]) \
+                if len(island_names) else data[:0]
+            rows = np.stack([rows[island_codes == i].sum(axis=0) for i in range(len(island_names))]) \
+                if len(island_names) else rows[:0]
+        else:
+            data, rows = data.sum(axis=0, keepdims=True), rows.sum(axis=0, keepdims=True)
+    if 'year' not in group_by:
+        data, rows = data.sum(axis=1, keepdims=True), rows.sum(axis=1, keepdims=True)
+
+    # cells with rows behind them, in (region or island, year, month) order
+    first, year, month = np.nonzero(rows > 0)
+    codes = {
+        'region': first,
+        'island': island_codes[first] if 'region' in group_by else first,
+        'year': year,
+        'month': month,
+    }
+    if len(group_by) > 1:  # sorted by the group columns in the order asked for
+        order = np.lexsort([codes[group] for group in reversed(group_by)])
+        first, year, month = first[order], year[order], month[order]
+        codes = dict(codes, region=first, island=codes['island'][order], year=year, month=month)
+
+    labels = {
+        'region': lambda: cube.regions[idx][first],
+        'island': lambda: island_names[codes['island']],
+        'year': lambda: cube.years[span][year],
+        'month': lambda: month + 1,
+    }
+    columns = {GROUPS[group]: labels[group]() for group in group_by}
+    return QueryResult(group_by, columns, cube.values, data[first, year, month])
+
+
+class QueryEngine:
+    # aggregate() on the current cube (cube: function returning it), results cached in a FigureCache keyed on the
+    # query signature, its data version and which cube answered it (a cube swapped in without a new data version,
+    # e.g. benchmarks/callbacks.py --scale, doesn't get the old cube's results)
+    def __init__(self, cube, cache):
+        self.cube = cube
+        self.cache = cache
+        self._cube = None  # the cube of the last query and its number
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def version(self):
+        return self.cache.version()
+
+    def _current(self):
+        cube = self.cube()
+        with self._lock:
+            if cube is not self._cube:
+                self._cube = cube
+                self._generation += 1
+            return cube, self._generation
+
+    def query(self, regions=None, islands=None, years=None, group_by=()):
+        cube, generation = self._current()
+        key = ('query', self.version(), generation, signature(regions, islands, years, group_by))
+        result = self.cache.get(key)
+        if result is None:
+            result = aggregate(cube, *key[3])
+            self.cache.put(key, result)
+        return result
@@ -0,0 +1,116 @@
+# Column types of the bundle tables. Repeated labels (region, island, month) are dictionary encoded, so pandas
+# gets categoricals (small integer codes + the labels once) instead of a string per row; dates are parsed once
+# into date32 (datetime64 in pandas); counts get the narrowest integer type that is still safe
+# (pyarrow refuses to build a table when a value doesn't fit, so a bad file fails the bundle build instead of
+# wrapping around).
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October',
+          'November', 'December']
+
+
+def label(ordered=False):
+    # int16 codes leave room for municipality-level regions (pandas picks the smallest code width itself)
+    return pa.dictionary(pa.int16(), pa.string(), ordered=ordered)
+
+
+SCHEMAS = {
+    'cases': pa.schema([
+        ('Month', label(ordered=True)),  # calendar order, see typed_frame
+        ('Year', pa.int16()),
+        ('Region', label()),
+        ('Dengue_Cases', pa.int32()),
+        ('Dengue_Deaths', pa.int16()),
+        ('Island', label()),
+        ('Date', pa.date32()),
+    ]),
+    'hospitals': pa.schema([
+        ('name', pa.string()),  # nearly all different, a dictionary wouldn't save anything
+        ('lat', pa.float64()),
+        ('lon', pa.float64()),
+    ]),
+    'hospitals_per_island': pa.schema([
+        ('Island', label()),
+        ('Hospital_Count', pa.int32()),
+    ]),
+    'regions': pa.schema([
+        ('Region', pa.string()),  # one row per region
+        ('Dengue_Cas', pa.int32()),
+        ('Dengue_Dea', pa.int32()),
+        ('geometry', pa.binary()),  # WKB, already simplified
+    ]),
+}
+
+
+def typed_frame(frame, name):
+    # raw CSV frame -> the columns of SCHEMAS[name] with pandas types that convert to it without copies
+    frame = frame[SCHEMAS[name].names].copy()
+    for column in SCHEMAS[name]:
+        if pa.types.is_dictionary(column.type):
+            values = frame[column.name]
+            categories = MONTHS if column.name == 'Month' else sorted(values.dropna().unique())
+            unknown = set(values.dropna().unique()) - set(categories)
+            if unknown or values.isna().any():
+                raise ValueError(f"{name}.{column.name}: missing or unknown values {sorted(unknown)}")
+            frame[column.name] = pd.Categorical(values, categories=categories, ordered=column.type.ordered)
+        elif pa.types.is_date(column.type):
+            frame[column.name] = pd.to_datetime(frame[column.name], format='%Y-%m-%d')
+    return frame
+
+
+def to_table(frame, name):
+    return pa.Table.from_pandas(typed_frame(frame, name), schema=SCHEMAS[name], preserve_index=False)
+
+
+# One incoming case report (rows handled one at a time, e.g. ingestion), __slots__ so millions of them stay small
+class CaseRecord:
+    __slots__ = ('region', 'island', 'year', 'month', 'cases', 'deaths')
+
+    def __init__(self, region, island, year, month, cases, deaths):
+        self.region = region
+        self.island = island
+        self.year = year
+        self.month = month  # 1..12
+        self.cases = cases
+        self.deaths = deaths
+
+    @classmethod
+    def from_row(cls, row):
+        # a CSV-style row (Month name or number, Year, Region, Island, Dengue_Cases, Dengue_Deaths); ValueError when
+        # something is missing or out of range
+        try:
+            month = row['Month']
+            month = MONTHS.index(month) + 1 if month in MONTHS else int(month)
+            record = cls(str(row['Region']).strip(), str(row['Island']).strip(), int(row['Year']), month,
+                         int(row['Dengue_Cases']), int(row['Dengue_Deaths']))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"bad case report {dict(row)!r}: {e}") from None
+        if not record.region or not record.island:
+            raise ValueError(f"bad case report {dict(row)!r}: empty region/island")
+        if not 1 <= record.month <= 12:
+            raise ValueError(f"bad case report {dict(row)!r}: month {record.month}")
+        for column, value, dtype in (('Year', record.year, np.int16), ('Dengue_Cases', record.cases, np.int32),
+                                     ('Dengue_Deaths', record.deaths, np.int16)):
+            if not 0 <= value <= np.iinfo(dtype).max:
+                raise ValueError(f"bad case report {dict(row)!r}: {column} {value} out of range")
+        return record
+
+    @property
+    def date(self):
+        return f"{self.year}-{self.month:02d}-01"
+
+    def __repr__(self):
+        return f"CaseRecord({self.region!r}, {self.island!r}, {self.year}, {self.month}, {self.cases}, {self.deaths})"
+
+
+def memory_report(frames):
+    # {table name: frame} -> text table of rows and bytes per table, with the bytes of every column
+    lines = [f"{'table':<24}{'rows':>10}{'bytes':>14}{'bytes/row':>11}  columns"]
+    for name, frame in frames.items():
+        usage = frame.memory_usage(deep=True, index=False)
+        columns = ', '.join(f"{column} {frame[column].dtype} {usage[column]:,}" for column in frame.columns)
+        lines.append(f"{name:<24}{len(frame):>10,}{int(usage.sum()):>14,}{usage.sum() / max(len(frame), 1):>11.1f}"
+                     f"  {columns}")
+    return '\n'.join(lines)
@@ -0,0 +1,66 @@
+# Which region every facility lies in: STRtree over the region polygons for the candidates, then vectorized
+# point-in-polygon tests (shapely 2, in C). Well under a second for 100k facilities, so it simply runs again for every
+# data version; the result is also kept on disk per data version so other workers / restarts just load it.
+import os
+
+import numpy as np
+
+from startup import lazy_import
+
+shapely = lazy_import('shapely')
+
+# facilities just off a (simplified) coastline still count for the closest region within this many degrees
+NEAREST_DEGREES = 0.05
+
+
+class RegionLocator:
+    def __init__(self, shapes, nearest_degrees=NEAREST_DEGREES):
+        # shapes: region geometries indexed by region id (see vector_tiles.region_shapes)
+        self.shapes = shapes
+        self.n_regions = len(shapes)
+        self.tree = shapely.STRtree(shapes)
+        self.nearest_degrees = nearest_degrees
+
+    def locate(self, lat, lon):
+        # region id per point, -1 for points outside every region
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        points = shapely.points(lon, lat)
+        region = np.full(len(points), -1, dtype=np.int32)
+
+        # candidate (point, region) pairs from the tree (bounding boxes only), grouped by region, then the exact
+        # point-in-polygon test for each region's candidates at once
+        point_index, region_index = self.tree.query(points)
+        order = np.argsort(region_index, kind='stable')
+        point_index, region_index = point_index[order], region_index[order]
+        starts = np.searchsorted(region_index, np.arange(self.n_regions + 1))
+        for region_id in range(self.n_regions - 1, -1, -1):  # highest first: on a shared border the lowest id wins
+            candidates = point_index[starts[region_id]:starts[region_id + 1]]
+            if len(candidates):
+                inside = shapely.contains_xy(self.shapes[region_id], lon[candidates], lat[candidates])
+                region[candidates[inside]] = region_id
+
+        missing = np.flatnonzero(region < 0)
+        if len(missing) and self.nearest_degrees:
+            near_point, near_region = self.tree.query_nearest(points[missing], max_distance=self.nearest_degrees)
+            region[missing[near_point[::-1]]] = near_region[::-1]
+        return region
+
+    def count(self, region):
+        # points per region id
+        return np.bincount(region[region >= 0], minlength=self.n_regions)
+
+
+def cached_locate(locator, lat, lon, cache_path=None):
+    # locator.locate, kept in cache_path (one file per data version) when given
+    if cache_path and os.path.exists(cache_path):
+        region = np.load(cache_path)
+        if len(region) == len(lat):
+            return region
+    region = locator.locate(lat, lon)
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp = f'{cache_path}.{os.getpid()}.tmp.npy'
+        np.save(temp, region)
+        os.replace(temp, cache_path)
+    return region
@@ -0,0 +1,74 @@
+# Startup helpers: lazy module imports and a phase timer for `python app.py --profile-startup`.
+# Import this before anything heavy so the profiler can time the imports that follow it.
+import builtins
+import importlib.util
+import sys
+import time
+from contextlib import contextmanager
+
+PROFILE_FLAG = '--profile-startup'
+PROFILING = PROFILE_FLAG in sys.argv
+
+_started = time.perf_counter()
+_phases = []  # [name, depth, seconds] in the order they started
+_depth = 0
+
+
+@contextmanager
+def phase(name):
+    global _depth
+    entry = [name, _depth, None]
+    _phases.append(entry)
+    started = time.perf_counter()
+    _depth += 1
+    try:
+        yield
+    finally:
+        _depth -= 1
+        entry[2] = time.perf_counter() - started
+
+
+def lazy_import(name):
+    # module object that is only really imported on first attribute access
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def _install_import_timer(modules=('__main__', 'app')):
+    # time the top-level imports done by the app module itself (each one includes everything it pulls in)
+    original_import = builtins.__import__
+    nested = [False]
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        caller = (globals or {}).get('__name__')
+        if nested[0] or level or caller not in modules or name in sys.modules:
+            return original_import(name, globals, locals, fromlist, level)
+        nested[0] = True
+        try:
+            with phase(f'import {name}'):
+                return original_import(name, globals, locals, fromlist, level)
+        finally:
+            nested[0] = False
+
+    builtins.__import__ = timed_import
+
+
+def report(file=sys.stdout):
+    total = time.perf_counter() - _started
+    print(f"{'phase':<50}{'ms':>10}{'%':>8}", file=file)
+    for name, depth, seconds in _phases:
+        if seconds is None:
+            continue
+        print(f"{'  ' * depth + name:<50}{seconds * 1000:>10.1f}{100 * seconds / total:>7.1f}%", file=file)
+    print(f"{'total':<50}{total * 1000:>10.1f}", file=file)
+
+
+if PROFILING:
+    _install_import_timer()
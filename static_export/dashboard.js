@@ -0,0 +1,194 @@
+// Static version of the dashboard callbacks (see export_static.py).
+// Shows the pre-rendered figure for a state when the export has one, otherwise builds it from the lookup
+// tables with the same rules as update_stacked_bar / update_specific_region_graph in app.py.
+// Data comes in as <script> files (tables.js, figures/*.js) rather than fetch(), so opening index.html
+// straight from disk works too.
+(function() {
+    const tables = window.DASHBOARD_TABLES;
+    const loading = {};  // figure file -> Promise of the figure
+    const CASES = tables.values.indexOf('Dengue_Cases');
+    const DEATHS = tables.values.indexOf('Dengue_Deaths');
+
+    // figures/<file>.js calls this with its figure
+    window.dashboardFigure = function(file, figure) {
+        loading[file].resolve(figure);
+    };
+
+    function exported(key) {
+        const file = tables.figures[key];
+        if (!file) {
+            return Promise.resolve(null);
+        }
+        if (!loading[file]) {
+            let resolve;
+            loading[file] = new Promise(r => { resolve = r; });
+            loading[file].resolve = resolve;
+            const script = document.createElement('script');
+            script.src = 'figures/' + file;
+            document.head.appendChild(script);
+        }
+        return loading[file];
+    }
+
+    function plot(id, figure) {
+        if (!figure.layout.template) {
+            figure.layout.template = tables.template;  // left out of the exported files, it's the same everywhere
+        }
+        Plotly.react(id, figure.data, figure.layout, id === 'choropleth-with-hospitals' ? {scrollZoom: true} : {});
+    }
+
+    function show(id, key, build) {
+        exported(key).then(figure => plot(id, figure || build()));
+    }
+
+    // prototype figure (a real callback output without x/y) with this state's data and title
+    function fill(prototype, traces, title) {
+        const figure = JSON.parse(JSON.stringify(prototype));
+        figure.data.forEach((trace, i) => Object.assign(trace, traces[i]));
+        figure.layout.title.text = title;
+        return figure;
+    }
+
+    function years(prefix) {
+        const first = +document.getElementById(prefix + '_from').value;
+        const last = +document.getElementById(prefix + '_to').value;
+        return [Math.min(first, last), Math.max(first, last)];
+    }
+
+    // ---- stacked bar: region/year totals, regions in cube (sorted) order ----
+    function stackedBar(regions, first, last) {
+        if (!regions.length) {
+            return tables.prototypes.stacked_none;
+        }
+        const x = [], cases = [], deaths = [], casesHover = [], deathsHover = [];
+        tables.regions.forEach((region, i) => {
+            if (!regions.includes(region)) {
+                return;
+            }
+            const hospitals = tables.hospitals[i];
+            for (let year = first; year <= last; year++) {
+                const y = year - tables.first_year;
+                if (tables.yearly_rows[i][y] > 0) {
+                    const totals = tables.yearly[i][y];
+                    x.push(region);
+                    cases.push(totals[CASES] - totals[DEATHS]);
+                    deaths.push(totals[DEATHS]);
+                    casesHover.push([hospitals, hospitals > 0 ? totals[CASES] / hospitals : null]);
+                    deathsHover.push([hospitals, hospitals > 0 ? totals[DEATHS] / hospitals : null]);
+                }
+            }
+        });
+        if (!x.length) {
+            return tables.prototypes.stacked_nodata;
+        }
+        const title = regions.length <= 3
+            ? `Cases and Deaths in ${regions.join(', ')} from ${first} to ${last}`
+            : `Cases and Deaths in selected regions from ${first} to ${last}`;
+        return fill(tables.prototypes.stacked, [{x: x, y: cases, customdata: casesHover},
+                                                {x: x, y: deaths, customdata: deathsHover}], title);
+    }
+
+    // ---- region line: monthly totals of one region ----
+    function regionLine(region, first, last) {
+        if (!region) {
+            return tables.prototypes.specific_none;
+        }
+        const i = tables.regions.indexOf(region);
+        const x = [], cases = [], deaths = [], baseline = [];
+        const alerts = {x: [], y: [], customdata: []};
+        for (let m = (first - tables.first_year) * 12; i >= 0 && m < (last - tables.first_year + 1) * 12; m++) {
+            if (tables.monthly_rows[i][m] > 0) {
+                x.push(tables.dates[m]);
+                cases.push(tables.monthly[i][m][CASES]);
+                deaths.push(tables.monthly[i][m][DEATHS]);
+                baseline.push(tables.baseline[i][m]);
+                if (tables.alerts[i][m]) {
+                    alerts.x.push(tables.dates[m]);
+                    alerts.y.push(tables.monthly[i][m][CASES]);
+                    alerts.customdata.push(tables.alerts[i][m]);
+                }
+            }
+        }
+        if (!x.length) {
+            return tables.prototypes.specific_nodata;
+        }
+        return fill(tables.prototypes.specific, [{x: x, y: cases}, {x: x, y: deaths}, {x: x, y: baseline}, alerts],
+                    `Dengue Cases and Deaths Over Time in ${region}`);
+    }
+
+    // ---- controls ----
+    const selected = [];  // checked regions in click order, like dcc.Checklist's value
+
+    // regions as they go in the key, like stacked_regions in export_static.py: click order while the title lists
+    // them (3 or fewer), cube (sorted) order after that
+    function stackedRegions(regions) {
+        if (regions.length <= 3) {
+            return regions;
+        }
+        return tables.regions.filter(region => regions.includes(region));
+    }
+
+    function updateStacked() {
+        const [first, last] = years('stacked');
+        const key = `stacked/${stackedRegions(selected).join('|')}/${first}-${last}`;
+        show('region-graph', key, () => stackedBar(selected, first, last));
+    }
+
+    function updateSpecific() {
+        const region = document.getElementById('specific_dropdown').value;
+        const [first, last] = years('specific');
+        show('specific-region-graph', `specific/${region}/${first}-${last}`, () => regionLine(region, first, last));
+    }
+
+    function switchMetric(metric) {
+        document.getElementById('donut_title').textContent = `Dengue ${metric} per Island`;
+        document.getElementById('choro_title').textContent = `Dengue ${metric} by Region and Hospital Locations`;
+        show('pie-graph', `pie/${metric}`);
+        show('choropleth-with-hospitals', `map/${metric}`);
+    }
+
+    function yearSelect(prefix, onChange) {
+        ['_from', '_to'].forEach((suffix, end) => {
+            const select = document.getElementById(prefix + suffix);
+            for (let year = tables.first_year; year <= tables.last_year; year++) {
+                select.add(new Option(year, year, false, year === (end ? tables.last_year : tables.first_year)));
+            }
+            select.addEventListener('change', onChange);
+        });
+    }
+
+    document.title = document.getElementById('dashboard-title').textContent = tables.title;
+    Object.entries(tables.summary).forEach(([id, text]) => {
+        document.getElementById(id).textContent = text;
+    });
+
+    const checklist = document.getElementById('stacked_region');
+    const dropdown = document.getElementById('specific_dropdown');
+    tables.checklist_regions.forEach(region => {
+        const label = document.createElement('label');
+        const box = document.createElement('input');
+        box.type = 'checkbox';
+        box.addEventListener('change', () => {
+            if (box.checked) {
+                selected.push(region);
+            } else {
+                selected.splice(selected.indexOf(region), 1);
+            }
+            updateStacked();
+        });
+        label.append(box, region);
+        checklist.appendChild(label);
+        dropdown.add(new Option(region, region));
+    });
+    dropdown.addEventListener('change', updateSpecific);
+    yearSelect('stacked', updateStacked);
+    yearSelect('specific', updateSpecific);
+    document.getElementById('cases_button').addEventListener('click', () => switchMetric('Cases'));
+    document.getElementById('deaths_button').addEventListener('click', () => switchMetric('Deaths'));
+
+    show('total-cases-deaths-graph', 'total_per_year');
+    show('hospitals_donut', 'hospitals');
+    switchMetric('Cases');
+    updateStacked();
+    updateSpecific();
+})();
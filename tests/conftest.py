@@ -0,0 +1,15 @@
+# the app's modules are flat files in the repo root
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def data_file(name):
+    # the raw files are in Data/ on a working checkout, data/ in git
+    for folder in ('Data', 'data'):
+        path = os.path.join(ROOT, folder, name)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(name)
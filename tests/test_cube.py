@@ -0,0 +1,76 @@
+# RegionCube answers must match the pandas filter + groupby the callbacks used before it
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import data_file
+from cube import VALUES, RegionCube
+from schema import typed_frame
+
+
+@pytest.fixture(scope='module')
+def df():
+    return pd.read_csv(data_file('df_improved.csv'))
+
+
+@pytest.fixture(scope='module', params=['csv', 'typed'])
+def cube(request, df):
+    # built from the raw CSV frame and from the categorical frame build_bundle.py stores
+    return RegionCube(df if request.param == 'csv' else typed_frame(df, 'cases'))
+
+
+def region_sets(df):
+    regions = sorted(df['Region'].unique())
+    return [regions, regions[:1], regions[3:8], regions[::4], [regions[-1], 'Nowhere'], []]
+
+
+YEAR_RANGES = [(2016, 2020), (2016, 2016), (2018, 2019), (2020, 2020), (2010, 2017), (2019, 2030), (2030, 2031)]
+
+
+def test_totals(df, cube):
+    for regions in region_sets(df):
+        for first, last in YEAR_RANGES:
+            filtered = df[df['Region'].isin(regions) & df['Year'].between(first, last)]
+            expected = filtered.groupby('Region')[VALUES].sum()
+            idx, totals = cube.totals(regions, first, last)
+            assert list(cube.regions[idx]) == sorted(set(regions) & set(df['Region']))
+            assert totals.shape == (len(idx), len(VALUES))
+            # regions without rows in the range are 0 in the cube and missing from the groupby
+            nonzero = totals.any(axis=1)
+            assert list(cube.regions[idx][nonzero]) == list(expected.index[expected.any(axis=1)])
+            expected = expected.reindex(cube.regions[idx], fill_value=0)
+            np.testing.assert_array_equal(totals, expected.to_numpy())
+
+
+def test_totals_empty(cube):
+    idx, totals = cube.totals([], 2016, 2020)
+    assert len(idx) == 0 and totals.shape == (0, len(VALUES))
+    idx, totals = cube.totals(cube.regions, 2030, 2031)
+    assert len(idx) == len(cube.regions) and not totals.any()
+
+
+def expected_series(df, name):
+    # one row per month from January of the first year, one column per region (sorted like groupby)
+    monthly = df.groupby([pd.to_datetime(df['Date']), 'Region'])[name].sum().unstack(fill_value=0)
+    months = pd.date_range(f"{df['Year'].min()}-01-01", monthly.index.max(), freq='MS')
+    return monthly.reindex(index=months, columns=sorted(df['Region'].unique()), fill_value=0)
+
+
+@pytest.mark.parametrize('name', VALUES)
+def test_series(df, cube, name):
+    expected = expected_series(df, name)
+    series = cube.series(name)
+    assert series.shape == expected.shape
+    np.testing.assert_array_equal(series, expected.to_numpy())
+
+    # month windows (the last one empty)
+    for first, last in [('2016-01-01', '2016-12-01'), ('2017-06-01', '2018-02-01'), ('2020-12-01', '2020-12-01'),
+                        ('2019-03-01', '2019-02-01')]:
+        start, stop = cube.month_index([first, last])
+        window = df[pd.to_datetime(df['Date']).between(first, last)]
+        expected = window.groupby('Region')[name].sum().reindex(cube.regions, fill_value=0)
+        np.testing.assert_array_equal(series[start:stop + 1].sum(axis=0), expected.to_numpy())
+
+
+def test_grand_totals(df, cube):
+    np.testing.assert_array_equal(cube.grand_totals(), df[VALUES].sum().to_numpy())
@@ -0,0 +1,35 @@
+# VersionWatcher against a real bundle pointer (current.json) in a temp dir
+from data_bundle import current_version, set_current
+from data_version import VersionWatcher
+
+
+def watcher(bundle_dir, loaded, **kwargs):
+    return VersionWatcher(lambda: current_version(str(bundle_dir)), loaded.append, interval=3600, **kwargs)
+
+
+def test_swapped_before_start(tmp_path):
+    # the process loaded 'v1' at import, an ingest moved the pointer on before the watcher started
+    set_current(str(tmp_path), 'v1')
+    loaded = []
+    data_watcher = watcher(tmp_path, loaded, initial='v1')
+    set_current(str(tmp_path), 'v2')
+    data_watcher.start()
+    assert loaded == ['v2'] and data_watcher.version == 'v2'
+
+
+def test_unchanged_at_start(tmp_path):
+    set_current(str(tmp_path), 'v1')
+    loaded = []
+    data_watcher = watcher(tmp_path, loaded, initial='v1')
+    data_watcher.start()
+    assert loaded == [] and data_watcher.version == 'v1'
+    set_current(str(tmp_path), 'v2')
+    assert data_watcher.check() == 'v2' and loaded == ['v2']
+
+
+def test_no_initial_version(tmp_path):
+    # without the loaded version the first check can only record what it finds
+    set_current(str(tmp_path), 'v1')
+    loaded = []
+    data_watcher = watcher(tmp_path, loaded)
+    assert data_watcher.check() == 'v1' and loaded == []
@@ -0,0 +1,222 @@
+# The hand-built figure dicts (figures.py) must draw what the px/go figures they replaced drew: same traces,
+# names and x/y values (typed arrays decoded) and the same layout once each figure's template is applied.
+# Needs the data bundle (python build_bundle.py), run from the folder with Data/.
+import base64
+import json
+import os
+import re
+
+import numpy as np
+import pytest
+
+pytestmark = pytest.mark.skipif(not os.path.exists(os.path.join('Data', 'bundle', 'current.json')),
+                                reason="no data bundle in Data/ (python build_bundle.py)")
+
+REGION_SETS = [['NCR'], ['Region I', 'CAR', 'BARMM'], ['Region IV-A', 'Region VII', 'Region XI', 'CARAGA']]
+YEAR_RANGES = [[2016, 2020], [2016, 2016], [2018, 2019], [2020, 2020]]
+
+
+@pytest.fixture(scope='module')
+def app():
+    import app
+    return app
+
+
+@pytest.fixture(scope='module')
+def df(app):
+    # the frame as the CSV had it (the px figures were built from that): plain strings, dates as text
+    return app.df.astype({'Region': str, 'Island': str}).assign(Date=app.df['Date'].dt.strftime('%Y-%m-%d'))
+
+
+def decoded(value):
+    # typed arrays ({dtype, bdata}) back to lists, everything else as is
+    if isinstance(value, dict):
+        if set(value) == {'dtype', 'bdata'}:
+            return np.frombuffer(base64.b64decode(value['bdata']), dtype=value['dtype']).tolist()
+        return {key: decoded(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decoded(item) for item in value]
+    return value
+
+
+def plain(fig):
+    from plotly.utils import PlotlyJSONEncoder
+
+    fig = fig.to_plotly_json() if hasattr(fig, 'to_plotly_json') else fig
+    return decoded(json.loads(json.dumps(fig, cls=PlotlyJSONEncoder)))
+
+
+def merge(base, over):
+    if not isinstance(base, dict) or not isinstance(over, dict):
+        return over
+    return dict(base, **{key: merge(base.get(key), value) for key, value in over.items()})
+
+
+def effective_layout(fig):
+    # the layout with the template's layout under it (xaxis2/yaxis2 get the template's xaxis/yaxis), which is
+    # what plotly.js draws; the px figures keep the theme in the layout, the dicts in their template
+    layout = dict(fig['layout'])
+    defaults = (layout.pop('template', None) or {}).get('layout', {})
+    result = merge({key: value for key, value in defaults.items() if key not in ('xaxis', 'yaxis')}, layout)
+    for key in result:
+        axis = re.match(r'^([xy]axis)\d*$', key)
+        if axis and axis.group(1) in defaults:
+            result[key] = merge(defaults[axis.group(1)], result[key])
+    return result
+
+
+def assert_same_figure(old, new, added_traces=0, added_keys=()):
+    # added_traces / added_keys: what later requests put on top of the px figure (overlays, hover data)
+    old, new = plain(old), plain(new)
+    assert len(new['data']) == len(old['data']) + added_traces
+    for old_trace, new_trace in zip(old['data'], new['data']):
+        new_trace = {key: value for key, value in new_trace.items() if key not in added_keys}
+        assert new_trace.get('type', 'scatter') == old_trace.get('type', 'scatter')
+        assert new_trace.get('name') == old_trace.get('name')
+        assert new_trace.get('x') == old_trace.get('x')
+        assert new_trace.get('y') == old_trace.get('y')
+        assert {key: value for key, value in new_trace.items() if key != 'type'} == \
+               {key: value for key, value in old_trace.items() if key != 'type'}
+    old_layout, new_layout = effective_layout(old), effective_layout(new)
+    assert set(new_layout) == set(old_layout)
+    assert new_layout == old_layout
+
+
+# ---- the figures as they were built before figures.py ----
+def px_total_per_year(app, df):
+    import plotly.express as px
+
+    totals = df.groupby('Date')[['Dengue_Cases', 'Dengue_Deaths']].sum().reset_index()
+    fig = px.line(totals, x='Date', y=['Dengue_Cases', 'Dengue_Deaths'], labels={'value': 'Count', 'Date': 'Year'},
+                  color_discrete_map={'Dengue_Cases': '#C7E5FF', 'Dengue_Deaths': '#EC7777'})
+    fig.update_layout(
+        paper_bgcolor='#393D3F', plot_bgcolor='#393D3F', font=dict(color='#FFFFFF'),
+        xaxis=dict(tickformat="%Y", range=[f"{app.cube.first_year}-01-01", f"{app.cube.last_year}-12-31"],
+                   dtick="M12", linecolor='#FFFFFF', gridcolor='#60B3F7', zeroline=False,
+                   title=dict(text='Year', font=dict(color='#FFFFFF'))),
+        yaxis=dict(title=dict(text='Count', font=dict(color='#FFFFFF')), linecolor='#FFFFFF', gridcolor='#60B3F7',
+                   zeroline=False),
+        legend=dict(title=dict(text='Metric', font=dict(color='#FFFFFF')), font=dict(color='#FFFFFF')),
+        hovermode='x unified',
+    )
+    return fig
+
+
+def px_hospital_bar(app):
+    import plotly.express as px
+
+    islands = app.hospitals_per_island.astype({'Island': str})
+    fig = px.bar(islands, x="Hospital_Count", y="Island", orientation='h', color='Island',
+                 color_discrete_map={"Luzon": '#FFD700', "Visayas": "#FFD700", "Mindanao": "#FFD700"})
+    fig.update_traces(texttemplate='%{x}', textposition='outside')
+    fig.update_layout(
+        paper_bgcolor='#393D3F', plot_bgcolor='#393D3F', font=dict(color='#FFFFFF'),
+        title=dict(font=dict(size=20, color='#FFFFFF')),
+        yaxis=dict(title="Island", categoryorder="total ascending"),
+        xaxis=dict(title="Hospital Count", range=[0, max(islands['Hospital_Count']) + 50], autorange=False),
+        bargap=0.2, showlegend=False,
+    )
+    return fig
+
+
+def go_empty(title, x_title, y_title, zeroline=True):
+    import plotly.graph_objects as go
+
+    axis = dict(linecolor='#FFFFFF', gridcolor='#60B3F7', **({} if zeroline else {'zeroline': False}))
+    return go.Figure(data=[], layout=go.Layout(
+        title=title, paper_bgcolor='#393D3F', plot_bgcolor='#393D3F', font=dict(color='#FFFFFF'),
+        xaxis=dict(axis, title=x_title), yaxis=dict(axis, title=y_title)))
+
+
+def go_stacked_bar(df, regions, years):
+    import plotly.graph_objects as go
+
+    filtered = df[df['Region'].isin(regions) & df['Year'].between(years[0], years[1])]
+    if filtered.empty:
+        return go_empty("No Data Available for Selected Regions and Years", "Region", "Count", zeroline=False)
+    filtered = filtered.groupby(['Region', 'Year'], as_index=False)[['Dengue_Cases', 'Dengue_Deaths']].sum()
+    if len(regions) <= 3:
+        title = f"Cases and Deaths in {', '.join(regions)} from {years[0]} to {years[1]}"
+    else:
+        title = f"Cases and Deaths in selected regions from {years[0]} to {years[1]}"
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=filtered['Region'], y=filtered['Dengue_Cases'] - filtered['Dengue_Deaths'],
+                         name='Dengue Cases', marker_color='#C7E5FF', offsetgroup=0, yaxis='y1'))
+    fig.add_trace(go.Bar(x=filtered['Region'], y=filtered['Dengue_Deaths'], name='Dengue Deaths',
+                         marker_color='#EC7777', offsetgroup=1, yaxis='y2'))
+    fig.update_layout(
+        barmode='group', title=dict(text=title, font=dict(size=20, color='#FFFFFF'), x=0.5, xanchor='center'),
+        paper_bgcolor='#393D3F', plot_bgcolor='#393D3F', font=dict(color='#FFFFFF'),
+        xaxis=dict(title=dict(text="Region", font=dict(color='#FFFFFF')), linecolor='#FFFFFF', gridcolor='#60B3F7'),
+        yaxis=dict(title=dict(text="Count (Cases)", font=dict(color='#FFFFFF')), linecolor='#FFFFFF',
+                   gridcolor='#60B3F7'),
+        yaxis2=dict(title=dict(text="Count (Deaths)", font=dict(color='#FFFFFF')), linecolor='#FFFFFF',
+                    gridcolor='#f2a4a4', overlaying='y', side='right', tickmode="sync"),
+        legend=dict(font=dict(color='#FFFFFF'), x=1.1, y=1),
+        hovermode='x unified',
+    )
+    return fig
+
+
+def px_region_line(df, region, years):
+    import plotly.express as px
+
+    filtered = df[(df['Region'] == region) & df['Year'].between(years[0], years[1])]
+    if filtered.empty:
+        return go_empty("No Data Available for Selected Region and Years", "Date", "Number of Cases/Deaths")
+    monthly = filtered.groupby('Date', as_index=False)[['Dengue_Cases', 'Dengue_Deaths']].sum()
+    melted = monthly.melt(id_vars=['Date'], value_vars=['Dengue_Cases', 'Dengue_Deaths'], var_name='Metric',
+                          value_name='Count')
+    fig = px.line(melted, x='Date', y='Count', color='Metric',
+                  title=f'Dengue Cases and Deaths Over Time in {region}',
+                  color_discrete_map={'Dengue_Cases': '#C7E5FF', 'Dengue_Deaths': '#EC7777'})
+    fig.update_layout(
+        paper_bgcolor='#393D3F', plot_bgcolor='#393D3F', font=dict(color='#FFFFFF'),
+        title=dict(font=dict(size=20, color='#FFFFFF'), x=0.5, xanchor='center'),
+        xaxis=dict(title=dict(text="Date", font=dict(color='#FFFFFF')), linecolor='#FFFFFF', gridcolor='#60B3F7'),
+        yaxis=dict(title=dict(text="Number of Cases/Deaths", font=dict(color='#FFFFFF')), linecolor='#FFFFFF',
+                   gridcolor='#60B3F7'),
+        legend=dict(font=dict(color='#FFFFFF')),
+        hovermode='x unified',
+    )
+    return fig
+
+
+# ---- tests ----
+def test_total_per_year(app, df):
+    assert_same_figure(px_total_per_year(app, df), app.build_total_per_year_graph.__wrapped__())
+
+
+def test_hospital_bar(app):
+    assert_same_figure(px_hospital_bar(app), app.update_hospital_donut.__wrapped__(app.DATA_VERSION))
+
+
+@pytest.mark.parametrize('regions', REGION_SETS + ['all'])
+@pytest.mark.parametrize('years', YEAR_RANGES)
+def test_stacked_bar(app, df, regions, years):
+    regions = sorted(df['Region'].unique()) if regions == 'all' else regions
+    # the hospital numbers in the hover came later (spatial join)
+    assert_same_figure(go_stacked_bar(df, regions, years), app.update_stacked_bar(regions, years),
+                       added_keys=('customdata', 'hovertemplate'))
+
+
+def test_stacked_bar_empty(app):
+    import plotly.graph_objects as go
+
+    old = go_empty(None, "Region", "Count", zeroline=False)
+    old.update_layout(title=dict(text="No Region Selected", font=dict(size=20, color='#FFFFFF'), x=0.5,
+                                 xanchor='center'))
+    assert_same_figure(old, app.update_stacked_bar([], [2016, 2020]))
+
+
+@pytest.mark.parametrize('region', ['NCR', 'CAR', 'Region VII', 'BARMM'])
+@pytest.mark.parametrize('years', YEAR_RANGES)
+def test_region_line(app, df, region, years):
+    # the seasonal baseline and alert markers (outbreaks.py) came later, on top of the two px lines; no forecast
+    # without a forecast version
+    assert_same_figure(px_region_line(df, region, years), app.update_specific_region_graph(region, years),
+                       added_traces=2)
+
+
+def test_region_line_no_data(app, df):
+    assert_same_figure(px_region_line(df, 'Nowhere', [2016, 2020]), app.update_specific_region_graph('Nowhere', [2016, 2020]))
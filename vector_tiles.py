@@ -0,0 +1,210 @@
+# Mapbox Vector Tiles (MVT 2.1) for the region polygons, cut locally from the bundle's geometry tiers.
+# The map then only loads the tiles in view, and figures only carry per-region values instead of the
+# whole GeoJSON (which wouldn't scale to province/municipality boundaries).
+#
+# A full tile (every region in it, feature id = region id = row of the regions table) is cut once and kept in
+# an on-disk cache. Subsets of regions (one map layer per colour bin, see app.map_layers) are made from the
+# cached full tile by copying the encoded features, no re-cutting.
+# The protobuf encoding is done here by hand, the format is small and it saves a protobuf dependency.
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from hospital_index import mercator
+from startup import lazy_import
+
+shapely = lazy_import('shapely')  # imported when the first shapes are built, not with the app module
+
+EXTENT = 4096  # tile coordinates per tile side
+BUFFER = 64  # geometry kept outside the tile edge so fills/outlines join up
+LAYER = 'regions'
+
+
+# ---- protobuf helpers ----
+def varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def zigzag(value):
+    return (value << 1) ^ (value >> 31)
+
+
+def field(number, payload):
+    # length-delimited field (wire type 2)
+    return varint(number << 3 | 2) + varint(len(payload)) + payload
+
+
+def packed(number, values):
+    return field(number, b''.join(varint(v) for v in values))
+
+
+def read_varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return result, pos
+
+
+# ---- geometry -> MVT commands ----
+def ring_commands(coords, cursor):
+    # MoveTo first point, LineTo the rest, ClosePath (coords without the repeated closing point)
+    points = coords[:-1]
+    commands = [1 | 1 << 3]
+    for i, (x, y) in enumerate(points):
+        if i == 1:
+            commands.append(2 | (len(points) - 1) << 3)
+        commands += [zigzag(int(x - cursor[0])), zigzag(int(y - cursor[1]))]
+        cursor = (x, y)
+    commands.append(7 | 1 << 3)
+    return commands, cursor
+
+
+def polygon_commands(geometry):
+    # exterior rings with positive area in tile coordinates (y down), holes negative, per the MVT spec
+    commands = []
+    cursor = (0, 0)
+    for polygon in shapely.get_parts(geometry):
+        if polygon.geom_type != 'Polygon':
+            continue
+        polygon = shapely.geometry.polygon.orient(polygon, sign=1.0)
+        for ring in [polygon.exterior, *polygon.interiors]:
+            coords = np.asarray(ring.coords)
+            if len(coords) < 4:
+                continue
+            ring_cmds, cursor = ring_commands(coords, cursor)
+            commands += ring_cmds
+    return commands
+
+
+def encode_feature(region_id, geometry):
+    # id, tags (key 0 "id" -> value index region_id), type POLYGON, geometry
+    return field(2, varint(1 << 3) + varint(region_id)
+                 + packed(2, [0, region_id]) + varint(3 << 3) + varint(3)
+                 + packed(4, polygon_commands(geometry)))
+
+
+def encode_layer(features, n_regions):
+    # values table is every region id, so a feature's tags mean the same in any subset of features
+    values = b''.join(field(4, varint(4 << 3) + varint(i)) for i in range(n_regions))
+    return field(3, varint(15 << 3) + varint(2) + field(1, LAYER.encode()) + b''.join(features)
+                 + field(3, b'id') + values + varint(5 << 3) + varint(EXTENT))
+
+
+def split_features(tile):
+    # our own full tiles -> {region id: encoded feature field}, to build subsets without re-cutting
+    _, pos = read_varint(tile, 0)  # layer field
+    _, pos = read_varint(tile, pos)
+    features = {}
+    while pos < len(tile):
+        start = pos
+        key, pos = read_varint(tile, pos)
+        if key & 7 == 0:
+            _, pos = read_varint(tile, pos)
+            continue
+        length, body = read_varint(tile, pos)
+        pos = body + length
+        if key >> 3 == 2:
+            _, id_pos = read_varint(tile, body)
+            region_id, _ = read_varint(tile, id_pos)
+            features[region_id] = tile[start:pos]
+    return features
+
+
+def tile_bounds(z, x, y):
+    # lon/lat box of a tile
+    n = 2 ** z
+    lon = [x / n * 360.0 - 180.0, (x + 1) / n * 360.0 - 180.0]
+    lat = [np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * t / n)))) for t in (y + 1, y)]
+    return lon[0], lat[0], lon[1], lat[1]
+
+
+def region_shapes(geojson):
+    # bundle GeoJSON -> shapely geometries indexed by region id (the feature ids)
+    shapes = np.empty(len(geojson['features']), dtype=object)
+    for feature in geojson['features']:
+        shapes[int(feature['id'])] = shapely.from_geojson(json.dumps(feature['geometry']))
+    return shapes
+
+
+class RegionTiles:
+    def __init__(self, tiers, tier_for_zoom, cache_dir=None, memory_tiles=256):
+        # tiers: list of region geometry arrays (one per simplification tier, same region order)
+        self.tiers = tiers
+        self.tier_for_zoom = tier_for_zoom
+        self.cache_dir = cache_dir
+        self.n_regions = len(tiers[0])
+        self.boxes = [shapely.bounds(geometry) for geometry in tiers]
+        self.memory_tiles = memory_tiles
+        self._features = OrderedDict()  # (z, x, y) -> {region id: feature}
+        self._lock = threading.Lock()
+
+    def cut(self, z, x, y):
+        # full tile, every region that touches it
+        geometry = self.tiers[self.tier_for_zoom(z)]
+        boxes = self.boxes[self.tier_for_zoom(z)]
+        west, south, east, north = tile_bounds(z, x, y)
+        margin_lon = (east - west) * BUFFER / EXTENT
+        margin_lat = (north - south) * BUFFER / EXTENT
+        hits = np.flatnonzero((boxes[:, 0] <= east + margin_lon) & (boxes[:, 2] >= west - margin_lon)
+                              & (boxes[:, 1] <= north + margin_lat) & (boxes[:, 3] >= south - margin_lat))
+
+        def to_tile(coords):
+            wx, wy = mercator(coords[:, 1], coords[:, 0])
+            return np.column_stack([(wx * 2 ** z - x) * EXTENT, (wy * 2 ** z - y) * EXTENT])
+
+        features = []
+        for region_id in hits:
+            shape = shapely.transform(geometry[region_id], to_tile)
+            shape = shapely.clip_by_rect(shape, -BUFFER, -BUFFER, EXTENT + BUFFER, EXTENT + BUFFER)
+            shape = shapely.set_precision(shape, 1.0)  # integer tile coordinates
+            if not shape.is_empty:
+                features.append(encode_feature(int(region_id), shape))
+        return encode_layer(features, self.n_regions)
+
+    def full_tile(self, z, x, y):
+        path = os.path.join(self.cache_dir, str(z), str(x), f'{y}.pbf') if self.cache_dir else None
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                return f.read()
+        tile = self.cut(z, x, y)
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + f'.{os.getpid()}.tmp', 'wb') as f:
+                f.write(tile)
+            os.replace(path + f'.{os.getpid()}.tmp', path)  # other workers never see half a tile
+        return tile
+
+    def features(self, z, x, y):
+        key = (z, x, y)
+        with self._lock:
+            if key in self._features:
+                self._features.move_to_end(key)
+                return self._features[key]
+        features = split_features(self.full_tile(z, x, y))
+        with self._lock:
+            self._features[key] = features
+            while len(self._features) > self.memory_tiles:
+                self._features.popitem(last=False)
+        return features
+
+    def tile(self, z, x, y, regions=None):
+        # tile with only the given region ids (all regions when None)
+        if regions is None:
+            return self.full_tile(z, x, y)
+        features = self.features(z, x, y)
+        return encode_layer([features[r] for r in sorted(regions) if r in features], self.n_regions)
@@ -0,0 +1,6 @@
+# Production entry point: the Flask server behind the Dash app.
+#   gunicorn -c gunicorn.conf.py wsgi:server
+# (python app.py is still the single-process development server)
+from app import app
+
+server = app.server